@@ -0,0 +1,188 @@
+"""
+Comentario: valoración de listas completas de cartas (p. ej. un mazo de 50) en una sola solicitud.
+1. Deduplica las consultas por su clave normalizada.
+2. Responde desde la caché de precios lo que ya esté fresco.
+3. Agrupa el resto por nombre de carta: una sola búsqueda en TCGplayer devuelve todas las
+   variantes y sets de ese nombre con su precio de mercado, y cada consulta del grupo se resuelve
+   buscando su set / número de carta entre esos resultados.
+4. Lo que no se resuelve así (foils, sets que no aparecen) cae a la consulta de precio individual,
+   igual que los ítems con `card_number` o `product_id`, que ya apuntan a un producto concreto.
+   Los de `card_number` se resuelven antes a su ID de producto, que es la clave con la que su precio
+   queda en la caché.
+Las búsquedas corren en paralelo bajo un presupuesto de concurrencia y cada ítem lleva su propio error.
+`searches` cuenta solo lo que fue a TCGplayer, no lo que salió de las cachés.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from cache import Swr_cache, price_cache_key
+from models import (
+    Batch_price_item,
+    Batch_price_response,
+    Card_price,
+    Card_query,
+    Search_results_response,
+    Search_suggestion,
+)
+from price_history import product_id_from_url
+from upstream_governor import Upstream_unavailable
+
+logger = logging.getLogger(__name__)
+
+# Resultados por búsqueda agrupada: el máximo que admite /api/suggestions
+GROUP_SEARCH_PAGE_SIZE = 50
+
+
+def _normalize(value: str | None) -> str:
+    return " ".join((value or "").lower().split())
+
+
+def match_suggestion(query: Card_query, suggestions: list[Search_suggestion]) -> Search_suggestion | None:
+    """
+    Elige el resultado que corresponde a la consulta: el nombre debe contener el de la consulta y,
+    si hay set_name, debe coincidir con el número de carta (OP05-119), su código de set (OP05)
+    o el nombre del set (Kingdoms of Intrigue). Sin set_name se usa el primero con precio,
+    igual que /api/price.
+    """
+    card_name = _normalize(query.card_name)
+    set_name = _normalize(query.set_name)
+    for suggestion in suggestions:
+        if suggestion.market_price is None or card_name not in _normalize(suggestion.card_name):
+            continue
+        if not set_name:
+            return suggestion
+        card_number = _normalize(suggestion.card_number)
+        if card_number and (set_name == card_number or set_name == card_number.split("-")[0]):
+            return suggestion
+        if set_name == _normalize(suggestion.set_name):
+            return suggestion
+    return None
+
+
+def _error_item(query: Card_query, exc: Exception) -> Batch_price_item:
+    if isinstance(exc, ValueError):
+        return Batch_price_item(query=query, status=404, error=str(exc))
+    if isinstance(exc, Upstream_unavailable):
+        return Batch_price_item(query=query, status=503, error="TCGplayer no está disponible por ahora; reintenta más tarde.")
+    return Batch_price_item(
+        query=query,
+        status=502,
+        error="Error al comunicarse con TCGplayer o al procesar la respuesta.",
+    )
+
+
+async def price_batch(
+    queries: list[Card_query],
+    search: Callable[[str, int, int], Awaitable[Search_results_response]],
+    fetch_price: Callable[[Card_query], Awaitable[Card_price]],
+    price_cache: Swr_cache[Card_price],
+    resolve: Callable[[Card_query], Awaitable[Card_query]],
+    is_search_cached: Callable[[str, int, int], Awaitable[bool]],
+    concurrency: int = 4,
+) -> Batch_price_response:
+    """
+    Valora `queries` y devuelve un resultado por ítem en el mismo orden de entrada. `resolve` pasa
+    `card_number`/`variant` a `product_id`; `fetch_price` recibe la consulta ya resuelta.
+    """
+    unique: dict[str, Card_query] = {}
+    for query in queries:
+        unique.setdefault(price_cache_key(query), query)
+
+    resolved: dict[str, Batch_price_item] = {}
+    cache_hits = 0
+    searches = 0
+    groups: dict[str, list[tuple[str, Card_query]]] = {}
+    individual: list[tuple[str, Card_query]] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def resolve_product(key: str, query: Card_query) -> Card_query | None:
+        async with semaphore:
+            try:
+                return await resolve(query)
+            except Exception as exc:
+                logger.warning(f"Lote: no se pudo resolver la carta {query.card_number}: {exc}")
+                resolved[key] = _error_item(query, exc)
+                return None
+
+    # Clave de cada ítem único -> clave de la consulta que se valora (varios números pueden ser el mismo producto)
+    aliases = {key: key for key in unique}
+    targets = dict(unique)
+    pending = [(key, query) for key, query in unique.items() if query.card_number and query.product_id is None]
+    for (key, _), target in zip(pending, await asyncio.gather(*(resolve_product(*item) for item in pending))):
+        del targets[key]
+        if target is None:
+            del aliases[key]
+        else:
+            aliases[key] = price_cache_key(target)
+            targets.setdefault(aliases[key], target)
+
+    for key, query in targets.items():
+        cached = await price_cache.peek(key)
+        if cached is not None and cached[1] < price_cache.ttl:
+            resolved[key] = Batch_price_item(query=query, price=cached[0])
+            cache_hits += 1
+        elif query.is_foil or query.product_id is not None:
+            # La búsqueda agrupada no distingue foils (la consulta individual añade "foil") y los ítems
+            # con ID de producto se consultan directamente en ese producto
+            individual.append((key, query))
+        else:
+            groups.setdefault(_normalize(query.card_name), []).append((key, query))
+
+    async def resolve_individual(key: str, query: Card_query) -> None:
+        nonlocal searches
+        async with semaphore:
+            searches += 1
+            try:
+                resolved[key] = Batch_price_item(query=query, price=await fetch_price(query))
+            except Exception as exc:
+                logger.warning(f"Lote: no se pudo valorar '{query.card_name}': {exc}")
+                resolved[key] = _error_item(query, exc)
+
+    async def resolve_group(members: list[tuple[str, Card_query]]) -> None:
+        nonlocal searches
+        card_name = members[0][1].card_name
+        suggestions: list[Search_suggestion] = []
+        async with semaphore:
+            if not await is_search_cached(card_name, 1, GROUP_SEARCH_PAGE_SIZE):
+                searches += 1
+            try:
+                suggestions = (await search(card_name, 1, GROUP_SEARCH_PAGE_SIZE)).results
+            except Exception as exc:
+                logger.warning(f"Lote: búsqueda agrupada de '{card_name}' falló, se consulta ítem por ítem: {exc}")
+
+        leftovers = []
+        for key, query in members:
+            suggestion = match_suggestion(query, suggestions)
+            if suggestion is None:
+                leftovers.append((key, query))
+                continue
+            price = Card_price(
+                card_name=query.card_name,
+                set_name=query.set_name,
+                is_foil=query.is_foil,
+                market_price=suggestion.market_price,
+                source_url=suggestion.product_url or "",
+                product_id=product_id_from_url(suggestion.product_url),
+            )
+            await price_cache.put(key, price)
+            resolved[key] = Batch_price_item(query=query, price=price)
+        await asyncio.gather(*(resolve_individual(key, query) for key, query in leftovers))
+
+    await asyncio.gather(
+        *(resolve_group(members) for members in groups.values()),
+        *(resolve_individual(key, query) for key, query in individual),
+    )
+
+    for key, target_key in aliases.items():
+        resolved[key] = resolved[target_key]
+
+    logger.info(
+        f"Lote de {len(queries)} ítems: {len(unique)} únicos, {cache_hits} desde caché, {searches} búsquedas"
+    )
+    return Batch_price_response(
+        results=[resolved[price_cache_key(query)].model_copy(update={"query": query}) for query in queries],
+        unique_queries=len(unique),
+        cache_hits=cache_hits,
+        searches=searches,
+    )
@@ -0,0 +1,448 @@
+"""
+Comentario: benchmark del camino caliente contra fixtures locales, sin tocar TCGplayer. Levanta
+`stub_tcgplayer.py` (API JSON y vista de grid grabadas en `fixtures/tcgplayer/`), apunta el backend a
+él y mide cada escenario con la concurrencia pedida:
+
+- `price`: `POST /api/price` sobre la app completa (en proceso, sin uvicorn).
+- `suggestions`: `GET /api/suggestions` sobre la app completa.
+- `extract_price`: `extract_market_price_from_page_sync` sobre la vista de grid ya cargada (Chromium).
+- `parse_cards`: el análisis de tarjetas (`Product_card_parser`) sobre `grid_cards_luffy.json`, en Python puro.
+
+Por defecto se desactivan las cachés, el catálogo, el histórico y el planificador para medir siempre
+el camino completo, y cada solicitud usa una consulta distinta para que la coalescencia no la absorba
+(`--with-caches` y `--same-query` miden el caso contrario). El reporte trae p50/p95/p99, throughput,
+lanzamientos de navegador y memoria (RSS del proceso y de Chromium, solo en Linux):
+
+    python benchmark.py
+    python benchmark.py --scenarios price,suggestions --concurrency 8 --requests 200 --no-fast-path
+    python benchmark.py --json actual.json --baseline base.json --max-regression 0.2
+
+Con `--baseline` el proceso termina con código 1 si el p95 o el throughput de algún escenario
+empeoran más que `--max-regression` respecto del reporte base.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from memory_governor import MIB, descendant_pids, memory_supported, read_rss_bytes
+from stub_tcgplayer import DEFAULT_FIXTURES_DIR, start_stub_server
+
+logger = logging.getLogger(__name__)
+
+SCENARIOS = ("price", "suggestions", "extract_price", "parse_cards")
+PARSE_CARDS_FIXTURE = DEFAULT_FIXTURES_DIR / "grid_cards_luffy.json"
+MEMORY_SAMPLE_INTERVAL = 0.25
+
+
+@dataclass
+class Scenario_result:
+    name: str
+    concurrency: int
+    requests: int = 0
+    errors: int = 0
+    wall_seconds: float = 0.0
+    throughput: float = 0.0
+    p50_ms: float = 0.0
+    p95_ms: float = 0.0
+    p99_ms: float = 0.0
+    max_ms: float = 0.0
+    browser_launches: int | None = None
+    peak_rss_mb: float | None = None
+    peak_browser_rss_mb: float | None = None
+    skipped: str | None = None
+    latencies: list[float] = field(default_factory=list, repr=False)
+
+    def summarize(self, wall_seconds: float) -> None:
+        ordered = sorted(self.latencies)
+        self.requests = len(ordered) + self.errors
+        self.wall_seconds = round(wall_seconds, 3)
+        self.throughput = round(len(ordered) / wall_seconds, 2) if wall_seconds > 0 else 0.0
+        if ordered:
+            self.p50_ms = percentile_ms(ordered, 0.50)
+            self.p95_ms = percentile_ms(ordered, 0.95)
+            self.p99_ms = percentile_ms(ordered, 0.99)
+            self.max_ms = round(ordered[-1] * 1000, 2)
+
+    def to_report(self) -> dict[str, Any]:
+        report = asdict(self)
+        del report["latencies"]
+        return report
+
+
+def percentile_ms(ordered: list[float], fraction: float) -> float:
+    """Percentil por rango más cercano sobre latencias ya ordenadas (en segundos)."""
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))
+    return round(ordered[index] * 1000, 2)
+
+
+class Memory_sampler:
+    """
+    Muestrea en un hilo el RSS del proceso y la suma del de sus descendientes (Chromium y su
+    driver, y los procesos worker con `--workers`) y guarda los picos. La suma cuenta varias veces las páginas compartidas, así que es una
+    cota superior. Fuera de Linux (sin /proc) no mide nada.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = memory_supported()
+        self.peak_rss_mb: float | None = None
+        self.peak_children_rss_mb: float | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _sample(self) -> None:
+        own = read_rss_bytes(os.getpid())
+        children = sum(read_rss_bytes(pid) or 0 for pid in descendant_pids(os.getpid())) / MIB
+        if own is not None:
+            self.peak_rss_mb = max(self.peak_rss_mb or 0.0, own / MIB)
+        self.peak_children_rss_mb = max(self.peak_children_rss_mb or 0.0, children)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(MEMORY_SAMPLE_INTERVAL)
+
+    def __enter__(self) -> "Memory_sampler":
+        if self.enabled:
+            self._thread = threading.Thread(target=self._run, name="benchmark-memory", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._sample()
+
+    def apply(self, result: Scenario_result) -> None:
+        result.peak_rss_mb = round(self.peak_rss_mb, 1) if self.peak_rss_mb is not None else None
+        if self.enabled:
+            result.peak_browser_rss_mb = round(self.peak_children_rss_mb or 0.0, 1)
+
+
+def configure_environment(args: argparse.Namespace, stub_url: str, data_dir: Path) -> None:
+    """Apunta el backend al stub. Debe correr antes de importar `settings` (se lee al importarse)."""
+    os.environ["OPTCG_TCGPLAYER_API_URL"] = stub_url
+    os.environ["OPTCG_TCGPLAYER_SITE_URL"] = stub_url
+    os.environ["OPTCG_DATA_DIR"] = str(data_dir)
+    os.environ["OPTCG_FAST_PATH"] = "1" if args.fast_path else "0"
+    os.environ["OPTCG_WORKER_PROCESSES"] = str(args.workers)
+    # El stub no es TCGplayer: el límite de ritmo del regulador solo mediría su propia espera
+    os.environ["OPTCG_GOVERNOR"] = "0"
+    if not args.with_caches:
+        os.environ["OPTCG_PRICE_CACHE_TTL"] = "0"
+        os.environ["OPTCG_SEARCH_CACHE_TTL"] = "0"
+        os.environ["OPTCG_CATALOG"] = "0"
+        os.environ["OPTCG_PRICE_HISTORY"] = "0"
+        os.environ["OPTCG_SCHEDULER"] = "0"
+
+
+def browser_launches(engine_stats: dict[str, Any]) -> int:
+    pool_stats = engine_stats.get("pool") or {}
+    if "launches" in pool_stats:
+        return pool_stats["launches"]
+    # Pool síncrono: cada slot cuenta sus propios lanzamientos
+    return sum(slot.get("launches", 0) for slot in pool_stats.get("slots", []))
+
+
+async def _run_concurrently(
+    result: Scenario_result, requests: int, concurrency: int, make_request: Callable[[int], Awaitable[bool]]
+) -> float:
+    next_index = iter(range(requests))
+
+    async def worker() -> None:
+        for index in next_index:
+            started = time.perf_counter()
+            try:
+                ok = await make_request(index)
+            except Exception as e:
+                logger.debug(f"Solicitud {index} de '{result.name}' falló: {e}")
+                ok = False
+            if ok:
+                result.latencies.append(time.perf_counter() - started)
+            else:
+                result.errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+
+async def run_endpoint_scenarios(args: argparse.Namespace, names: list[str]) -> list[Scenario_result]:
+    """Escenarios que recorren la app completa con httpx en proceso (incluye el lifespan)."""
+    import httpx
+
+    import main
+
+    def price_body(index: int) -> dict[str, Any]:
+        set_name = "OP05-119" if args.same_query else f"OP05-{index % 1000:03d}"
+        return {"card_name": "Monkey.D.Luffy", "set_name": set_name, "is_foil": False}
+
+    def suggestions_params(index: int) -> dict[str, Any]:
+        return {"q": "luffy" if args.same_query else f"luffy {index}", "page": 1, "page_size": 24}
+
+    results = []
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=120.0) as client:
+            requests_by_scenario: dict[str, Callable[[int], Awaitable[bool]]] = {
+                "price": lambda index: _is_ok(client.post("/api/price", json=price_body(index))),
+                "suggestions": lambda index: _is_ok(client.get("/api/suggestions", params=suggestions_params(index))),
+            }
+            for name in names:
+                # Calentamiento: el primer scrape paga el arranque del navegador o del cliente HTTP
+                await requests_by_scenario[name](-1)
+                result = Scenario_result(name=name, concurrency=args.concurrency)
+                launches_before = browser_launches((await client.get("/api/stats")).json()["engine"])
+                with Memory_sampler() as sampler:
+                    wall_seconds = await _run_concurrently(
+                        result, args.requests, args.concurrency, requests_by_scenario[name]
+                    )
+                launches_after = browser_launches((await client.get("/api/stats")).json()["engine"])
+                result.summarize(wall_seconds)
+                result.browser_launches = launches_after - launches_before
+                sampler.apply(result)
+                results.append(result)
+    return results
+
+
+async def _is_ok(response: Awaitable[Any]) -> bool:
+    return (await response).status_code == 200
+
+
+def run_thread_scenario(
+    result: Scenario_result, requests: int, concurrency: int, worker: Callable[[Callable[[], int | None]], None]
+) -> float:
+    """Reparte `requests` iteraciones entre `concurrency` hilos; `worker` pide índices hasta recibir None."""
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+
+    def next_index() -> int | None:
+        with lock:
+            return next(remaining, None)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"benchmark-{result.name}") as executor:
+        for future in [executor.submit(worker, next_index) for _ in range(concurrency)]:
+            future.result()
+    return time.perf_counter() - started
+
+
+def run_parse_cards(args: argparse.Namespace) -> Scenario_result:
+    """Análisis de una página de tarjetas ya extraídas (el bucle de `_iter_extracted_cards`)."""
+    from scraper import Product_card_parser, _extracted_total_results, _iter_extracted_cards
+
+    recorded = json.loads(PARSE_CARDS_FIXTURE.read_text(encoding="utf-8"))
+    # Repetimos las tarjetas grabadas hasta llenar una página, con hrefs distintos para que no se descarten
+    cards = [
+        {**card, "href": f"{card['href']}-{copy_index}"}
+        for copy_index in range(-(-args.page_size // len(recorded["cards"])))
+        for card in recorded["cards"]
+    ][:args.page_size]
+    extracted = {"heading_text": recorded["heading_text"], "cards": cards}
+    result = Scenario_result(name="parse_cards", concurrency=args.concurrency)
+    results_lock = threading.Lock()
+
+    def worker(next_index: Callable[[], int | None]) -> None:
+        while next_index() is not None:
+            started = time.perf_counter()
+            _extracted_total_results(extracted)
+            parsed = list(_iter_extracted_cards(extracted, Product_card_parser(recorded["query_text"]), 1))
+            elapsed = time.perf_counter() - started
+            with results_lock:
+                if len(parsed) == len(cards):
+                    result.latencies.append(elapsed)
+                else:
+                    result.errors += 1
+
+    with Memory_sampler() as sampler:
+        wall_seconds = run_thread_scenario(result, args.requests, args.concurrency, worker)
+    result.summarize(wall_seconds)
+    result.browser_launches = 0
+    sampler.apply(result)
+    return result
+
+
+def run_extract_price(args: argparse.Namespace, stub_url: str) -> Scenario_result:
+    """Cascada de selectores de precio sobre la vista de grid grabada, un Chromium por hilo."""
+    result = Scenario_result(name="extract_price", concurrency=args.concurrency)
+    try:
+        from playwright.sync_api import sync_playwright
+    except ImportError as e:
+        result.skipped = f"Playwright no está instalado: {e}"
+        return result
+
+    from browser_pool import BROWSER_CONTEXT_OPTIONS, BROWSER_LAUNCH_ARGS
+    from readiness import wait_for_price_sync
+    from scraper import PRIMARY_PRICE_SELECTOR, extract_market_price_from_page_sync
+
+    grid_url = f"{stub_url}/search/all/product?q=Monkey.D.Luffy+OP05-119&view=grid"
+    results_lock = threading.Lock()
+    launches = 0
+
+    def worker(next_index: Callable[[], int | None]) -> None:
+        nonlocal launches
+        # La API síncrona de Playwright no se comparte entre hilos: cada hilo tiene la suya
+        with sync_playwright() as playwright:
+            browser = playwright.chromium.launch(headless=True, args=BROWSER_LAUNCH_ARGS)
+            with results_lock:
+                launches += 1
+            try:
+                page = browser.new_context(**BROWSER_CONTEXT_OPTIONS).new_page()
+                page.goto(grid_url, wait_until="domcontentloaded")
+                wait_for_price_sync(page, PRIMARY_PRICE_SELECTOR)
+                while next_index() is not None:
+                    started = time.perf_counter()
+                    try:
+                        extract_market_price_from_page_sync(page)
+                        ok = True
+                    except Exception as e:
+                        logger.debug(f"Extracción de precio falló: {e}")
+                        ok = False
+                    elapsed = time.perf_counter() - started
+                    with results_lock:
+                        if ok:
+                            result.latencies.append(elapsed)
+                        else:
+                            result.errors += 1
+            finally:
+                browser.close()
+
+    try:
+        with Memory_sampler() as sampler:
+            wall_seconds = run_thread_scenario(result, args.requests, args.concurrency, worker)
+    except Exception as e:
+        # Típicamente Chromium sin instalar (`playwright install chromium`)
+        result.skipped = f"No se pudo usar Chromium: {str(e).splitlines()[0]}"
+        return result
+    result.summarize(wall_seconds)
+    result.browser_launches = launches
+    sampler.apply(result)
+    return result
+
+
+def compare_with_baseline(results: list[Scenario_result], baseline: dict[str, Any], max_regression: float) -> list[str]:
+    """Escenarios cuyo p95 subió o cuyo throughput bajó más que `max_regression` (fracción)."""
+    regressions = []
+    for result in results:
+        base = baseline.get("scenarios", {}).get(result.name)
+        if result.skipped or not base or base.get("skipped"):
+            continue
+        if base["p95_ms"] > 0 and result.p95_ms > base["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{result.name}: p95 {base['p95_ms']}ms -> {result.p95_ms}ms")
+        if base["throughput"] > 0 and result.throughput < base["throughput"] * (1 - max_regression):
+            regressions.append(f"{result.name}: throughput {base['throughput']}/s -> {result.throughput}/s")
+    return regressions
+
+
+def _format_optional(value: float | int | None) -> str:
+    return "-" if value is None else f"{value:g}"
+
+
+def print_report(results: list[Scenario_result]) -> None:
+    header = (
+        f"{'escenario':<14}{'ok':>7}{'errores':>9}{'conc':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+        f"{'p99 ms':>10}{'max ms':>10}{'lanzam.':>9}{'rss MB':>9}{'chromium MB':>13}"
+    )
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        if result.skipped:
+            print(f"{result.name:<14}omitido: {result.skipped}")
+            continue
+        print(
+            f"{result.name:<14}{result.requests - result.errors:>7}{result.errors:>9}{result.concurrency:>6}"
+            f"{result.throughput:>10g}{result.p50_ms:>10g}{result.p95_ms:>10g}{result.p99_ms:>10g}"
+            f"{result.max_ms:>10g}{_format_optional(result.browser_launches):>9}"
+            f"{_format_optional(result.peak_rss_mb):>9}{_format_optional(result.peak_browser_rss_mb):>13}"
+        )
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark del backend contra fixtures locales de TCGplayer.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Separados por comas: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=4, help="Solicitudes (o hilos) simultáneos por escenario")
+    parser.add_argument("--requests", type=int, default=100, help="Solicitudes medidas por escenario")
+    parser.add_argument("--page-size", type=int, default=24, help="Tarjetas por página en parse_cards")
+    parser.add_argument("--no-fast-path", dest="fast_path", action="store_false", help="Forzar Playwright en los endpoints")
+    parser.add_argument("--workers", type=int, default=0, help="Procesos worker de scraping (OPTCG_WORKER_PROCESSES)")
+    parser.add_argument("--with-caches", action="store_true", help="Dejar activas cachés, catálogo, histórico y planificador")
+    parser.add_argument("--same-query", action="store_true", help="Repetir la misma consulta (mide coalescencia y cachés)")
+    parser.add_argument("--json", type=Path, help="Guardar el reporte en este archivo")
+    parser.add_argument("--baseline", type=Path, help="Reporte JSON anterior contra el que comparar")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Empeoramiento tolerado (0.2 = 20%%)")
+    parser.add_argument("--verbose", action="store_true", help="Mostrar los logs INFO del backend")
+    args = parser.parse_args(argv)
+    args.concurrency = max(1, args.concurrency)
+    args.requests = max(1, args.requests)
+    args.page_size = max(1, args.page_size)
+    args.workers = max(0, args.workers)
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Escenarios desconocidos: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    names = [name for name in SCENARIOS if name in args.scenarios.split(",")]
+
+    stub = start_stub_server()
+    stub_url = f"http://127.0.0.1:{stub.server_address[1]}"
+    results: list[Scenario_result] = []
+    try:
+        with tempfile.TemporaryDirectory(prefix="optcg-benchmark-") as data_dir:
+            configure_environment(args, stub_url, Path(data_dir))
+            endpoint_names = [name for name in names if name in ("price", "suggestions")]
+            if endpoint_names:
+                results += asyncio.run(run_endpoint_scenarios(args, endpoint_names))
+            if "extract_price" in names:
+                results.append(run_extract_price(args, stub_url))
+            if "parse_cards" in names:
+                results.append(run_parse_cards(args))
+    finally:
+        stub.shutdown()
+        stub.server_close()
+
+    print_report(results)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": sys.version.split()[0],
+            "fast_path": args.fast_path,
+            "workers": args.workers,
+            "with_caches": args.with_caches,
+            "same_query": args.same_query,
+            "requests": args.requests,
+        },
+        "scenarios": {result.name: result.to_report() for result in results},
+    }
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    if args.baseline:
+        regressions = compare_with_baseline(
+            results, json.loads(args.baseline.read_text(encoding="utf-8")), args.max_regression
+        )
+        for regression in regressions:
+            print(f"REGRESIÓN {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
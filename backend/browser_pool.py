@@ -0,0 +1,639 @@
+"""
+Comentario: pools de navegadores Chromium persistentes para no pagar el arranque del navegador
+(1-3 s y mucha CPU) en cada solicitud.
+
+- `Async_browser_pool`: navegadores de `playwright.async_api` que viven en el event loop de uvicorn.
+  Un mismo navegador atiende muchas páginas concurrentes.
+- `Browser_pool`: modo síncrono para Windows. La API síncrona de Playwright exige que cada navegador
+  se use siempre desde el hilo que lo creó, así que cada slot es un hilo dedicado con su propio
+  Playwright, navegador y contexto calientes.
+
+Los dos aceptan un `Memory_governor` (`memory_governor.py`) que mide el RSS de cada Chromium, recicla
+los que pasan del límite y frena las páginas nuevas con el presupuesto agotado, y un plazo por página
+(`page_deadline`) pasado el cual la página se cierra (asíncrono) o el navegador se mata (síncrono; si
+no se conoce su PID, el slot se reemplaza por uno nuevo y el viejo se cierra cuando su trabajo termine).
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable
+
+from playwright.async_api import async_playwright
+from playwright.sync_api import Error as PlaywrightError
+from playwright.sync_api import sync_playwright
+
+from memory_governor import Memory_governor
+from metrics import browser_launch_seconds
+from resource_blocking import Blocking_profile, Blocking_stats, install_blocking, install_blocking_sync
+
+logger = logging.getLogger(__name__)
+
+# Argumentos de lanzamiento compartidos por todos los navegadores del backend
+BROWSER_LAUNCH_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--disable-dev-shm-usage",
+    "--no-sandbox",
+]
+
+# Contexto con viewport y user agent realista. Los service workers se bloquean para que la
+# intercepción del perfil liviano vea todas las solicitudes de la página.
+BROWSER_CONTEXT_OPTIONS = {
+    "viewport": {"width": 1920, "height": 1080},
+    "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "service_workers": "block",
+}
+
+
+class Browser_pool_closed_error(RuntimeError):
+    """Se lanza al intentar alquilar una página de un pool que se está drenando o ya está cerrado."""
+
+
+class Browser_slot:
+    """
+    Un navegador caliente atado a su propio hilo. Todos los métodos con prefijo `_` se ejecutan
+    dentro del hilo del slot; desde fuera solo se usa `executor`.
+    """
+
+    def __init__(
+        self, slot_id: int, max_pages: int, blocking: Blocking_stats, memory: Memory_governor | None = None
+    ) -> None:
+        self.slot_id = slot_id
+        self.max_pages = max_pages
+        self.blocking = blocking
+        self.memory = memory
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"browser-slot-{slot_id}")
+        self.pages_served = 0
+        self.launches = 0
+        self.recycles = 0
+        self.crashes = 0
+        self._playwright = None
+        self._browser = None
+        self._context = None
+        # Marcador del navegador actual en el regulador de memoria y cuándo se pidió reciclarlo por memoria
+        self.memory_key: str | None = None
+        self.memory_recycle_requested_at: float | None = None
+        # Reemplazado por superar el plazo de página: al terminar su trabajo se cierra y no vuelve al pool
+        self.abandoned = False
+
+    def _is_healthy(self) -> bool:
+        return self._browser is not None and self._browser.is_connected()
+
+    def _launch(self) -> None:
+        started = time.perf_counter()
+        if self._playwright is None:
+            self._playwright = sync_playwright().start()
+        launch_args = BROWSER_LAUNCH_ARGS
+        if self.memory is not None:
+            self.memory_key, marker_args = self.memory.launch_args()
+            launch_args = BROWSER_LAUNCH_ARGS + marker_args
+        self._browser = self._playwright.chromium.launch(headless=True, args=launch_args)
+        # El contexto se mantiene entre solicitudes para conservar cookies (p. ej. el banner aceptado)
+        self._context = self._browser.new_context(**BROWSER_CONTEXT_OPTIONS)
+        browser_launch_seconds.observe(time.perf_counter() - started, "sync")
+        if self.memory is not None:
+            self.memory.register(self.memory_key)
+        self.pages_served = 0
+        self.launches += 1
+        logger.info(f"Slot {self.slot_id}: navegador lanzado (lanzamiento #{self.launches})")
+
+    def _close_browser(self) -> None:
+        for resource in (self._context, self._browser):
+            if resource is None:
+                continue
+            try:
+                resource.close()
+            except Exception as e:
+                logger.debug(f"Slot {self.slot_id}: error cerrando recurso del navegador: {e}")
+        self._context = None
+        self._browser = None
+        self.pages_served = 0
+        if self.memory is not None and self.memory_key is not None:
+            self.memory.unregister(self.memory_key)
+        self.memory_key = None
+        self.memory_recycle_requested_at = None
+
+    def _recycle_for_memory(self) -> None:
+        # Se encola en el hilo del slot detrás del trabajo en curso: recicla apenas termina
+        if self._browser is not None and self.memory_recycle_requested_at is not None:
+            self._recycle("memoria por encima del límite")
+
+    def _recycle(self, reason: str) -> None:
+        logger.info(f"Slot {self.slot_id}: reciclando navegador ({reason})")
+        self._close_browser()
+        self.recycles += 1
+
+    def _run_job(self, job: Callable[..., Any], args: tuple) -> Any:
+        if not self._is_healthy():
+            if self._browser is not None:
+                self.crashes += 1
+                self._recycle("navegador desconectado")
+            self._launch()
+
+        browser_page = self._context.new_page()
+        counters = install_blocking_sync(browser_page, self.blocking.profile)
+        try:
+            return job(browser_page, *args)
+        except PlaywrightError:
+            # Si el navegador murió durante el trabajo, lo descartamos para que el siguiente alquiler arranque limpio
+            if not self._is_healthy():
+                self.crashes += 1
+                self._recycle("caída durante el scraping")
+            raise
+        finally:
+            if self._browser is not None:
+                try:
+                    browser_page.close()
+                except Exception:
+                    pass
+                self.blocking.add(counters)
+                self.pages_served += 1
+                if self.pages_served >= self.max_pages:
+                    self._recycle(f"{self.max_pages} páginas servidas")
+
+    def _health_check(self) -> bool:
+        if self._browser is None:
+            # Nunca lanzado o ya reciclado: se lanzará en el próximo alquiler
+            return True
+        if self._is_healthy():
+            return True
+        self.crashes += 1
+        self._recycle("health check fallido")
+        self._launch()
+        return False
+
+    def _shutdown(self) -> None:
+        self._close_browser()
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            except Exception as e:
+                logger.debug(f"Slot {self.slot_id}: error deteniendo Playwright: {e}")
+            self._playwright = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "slot_id": self.slot_id,
+            "pages_served": self.pages_served,
+            "launches": self.launches,
+            "recycles": self.recycles,
+            "crashes": self.crashes,
+        }
+
+
+class Browser_pool:
+    """
+    Comentario: pool de `size` slots de navegador. `run(job, *args)` espera un slot libre, ejecuta
+    `job(browser_page, *args)` en el hilo del slot y devuelve el resultado al event loop.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_pages: int = 200,
+        health_check_interval: float = 30.0,
+        blocking_profile: Blocking_profile | None = None,
+        memory: Memory_governor | None = None,
+        page_deadline: float = 0.0,
+    ) -> None:
+        self.size = size
+        self.max_pages = max_pages
+        self.health_check_interval = health_check_interval
+        self.blocking = Blocking_stats(blocking_profile or Blocking_profile())
+        self.memory = memory
+        self.page_deadline = page_deadline
+        self.deadline_exceeded = 0
+        self.slot_restarts = 0
+        self._slots = [Browser_slot(slot_id, max_pages, self.blocking, memory) for slot_id in range(size)]
+        self._idle: asyncio.Queue[Browser_slot] | None = None
+        self._health_task: asyncio.Task | None = None
+        self._closing = False
+
+    async def start(self, warm: bool = True) -> None:
+        """Prepara la cola de slots libres y, opcionalmente, lanza los navegadores por adelantado."""
+        self._closing = False
+        self._idle = asyncio.Queue()
+        for slot in self._slots:
+            self._idle.put_nowait(slot)
+
+        if warm:
+            loop = asyncio.get_running_loop()
+            results = await asyncio.gather(
+                *(loop.run_in_executor(slot.executor, slot._launch) for slot in self._slots),
+                return_exceptions=True,
+            )
+            for slot, result in zip(self._slots, results):
+                if isinstance(result, Exception):
+                    # No bloqueamos el arranque: el slot reintentará el lanzamiento en su primer alquiler
+                    logger.warning(f"Slot {slot.slot_id}: no se pudo precalentar el navegador: {result}")
+
+        if self.health_check_interval > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+        if self.memory is not None:
+            await self.memory.start(self._on_memory_over_limit)
+        logger.info(f"Pool de navegadores iniciado con {self.size} slots")
+
+    async def run(self, job: Callable[..., Any], *args: Any) -> Any:
+        """Alquila un slot, ejecuta `job(browser_page, *args)` en su hilo y libera el slot."""
+        if self._closing or self._idle is None:
+            raise Browser_pool_closed_error("El pool de navegadores no está disponible.")
+        if self.memory is not None:
+            await self.memory.admit()
+
+        slot = await self._idle.get()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(slot.executor, slot._run_job, job, args)
+        deadline = (
+            loop.call_later(self.page_deadline, lambda: asyncio.ensure_future(self._expire_job(slot, future)))
+            if self.page_deadline > 0
+            else None
+        )
+        # El slot se libera cuando el hilo termina de verdad, aunque quien esperaba se haya cancelado
+        idle = self._idle
+
+        def release(_) -> None:
+            if deadline is not None:
+                deadline.cancel()
+            if slot.abandoned:
+                # Su lugar ya lo ocupa otro slot: se cierra en su hilo cuando el trabajo termine
+                slot.executor.submit(slot._shutdown)
+                slot.executor.shutdown(wait=False)
+                return
+            idle.put_nowait(slot)
+
+        future.add_done_callback(release)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if slot.abandoned and future.cancelled():
+                raise PlaywrightError(f"El trabajo superó el plazo de página de {self.page_deadline:.0f}s") from None
+            raise
+
+    async def _expire_job(self, slot: Browser_slot, future: asyncio.Future) -> None:
+        """
+        La API síncrona no se puede interrumpir desde otro hilo: si el trabajo pasa del plazo se mata
+        el navegador del slot, su llamada en curso falla al instante y el slot relanza en el siguiente
+        alquiler. Sin PID para matarlo, el slot se reemplaza por uno nuevo y quien esperaba falla ya.
+        """
+        if future.done():
+            return
+        self.deadline_exceeded += 1
+        reason = f"página de más de {self.page_deadline:.0f}s"
+        memory_key = slot.memory_key
+        if self.memory is not None and memory_key is not None and await self.memory.kill(memory_key, reason):
+            return
+        if future.done() or self._closing:
+            return
+        logger.warning(f"Slot {slot.slot_id}: trabajo de más de {self.page_deadline:.0f}s sin PID para cortarlo; reemplazando el slot")
+        slot.abandoned = True
+        replacement = Browser_slot(slot.slot_id, self.max_pages, self.blocking, self.memory)
+        self._slots[self._slots.index(slot)] = replacement
+        self.slot_restarts += 1
+        self._idle.put_nowait(replacement)
+        future.cancel()
+
+    async def _on_memory_over_limit(self, key: str, seconds: float) -> None:
+        slot = next((candidate for candidate in self._slots if candidate.memory_key == key), None)
+        if slot is None:
+            return
+        if slot.memory_recycle_requested_at is None:
+            slot.memory_recycle_requested_at = time.monotonic()
+            self.memory.note_recycle()
+            future = asyncio.get_running_loop().run_in_executor(slot.executor, slot._recycle_for_memory)
+            future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        elif self.page_deadline > 0 and time.monotonic() - slot.memory_recycle_requested_at > self.page_deadline:
+            # El trabajo en curso no terminó ni con el plazo de una página: se corta por lo sano
+            await self.memory.kill(key, "sigue por encima del límite de memoria")
+
+    async def _health_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while not self._closing:
+            await asyncio.sleep(self.health_check_interval)
+            for slot in self._slots:
+                # El executor del slot tiene un solo hilo, así que el chequeo se intercala entre trabajos
+                try:
+                    healthy = await loop.run_in_executor(slot.executor, slot._health_check)
+                    if not healthy:
+                        logger.warning(f"Slot {slot.slot_id}: navegador relanzado por health check")
+                except Exception as e:
+                    logger.warning(f"Slot {slot.slot_id}: health check falló: {e}")
+
+    async def stop(self) -> None:
+        """Drena el pool: deja de aceptar trabajos, espera a los que están en curso y cierra los navegadores."""
+        if self._idle is None:
+            return
+        self._closing = True
+        if self.memory is not None:
+            await self.memory.stop()
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+        # Recuperar todos los slots garantiza que no queda ningún trabajo en curso
+        for _ in range(self.size):
+            await self._idle.get()
+
+        loop = asyncio.get_running_loop()
+        for slot in self._slots:
+            await loop.run_in_executor(slot.executor, slot._shutdown)
+            slot.executor.shutdown(wait=True)
+        self._idle = None
+        logger.info("Pool de navegadores drenado y cerrado")
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize() if self._idle is not None else 0,
+            "closing": self._closing,
+            "page_deadline_seconds": self.page_deadline,
+            "deadline_exceeded": self.deadline_exceeded,
+            "slot_restarts": self.slot_restarts,
+            "memory": self.memory.stats() if self.memory is not None else None,
+            "resource_blocking": self.blocking.stats(),
+            "slots": [slot.stats() for slot in self._slots],
+        }
+
+
+class Async_browser:
+    """Un navegador asíncrono con su contexto caliente y los contadores que usa el pool para reciclarlo."""
+
+    def __init__(self, browser_id: int, browser, context, memory_key: str | None = None) -> None:
+        self.browser_id = browser_id
+        self.browser = browser
+        self.context = context
+        self.memory_key = memory_key
+        self.active_pages = 0
+        self.pages_served = 0
+        self.retiring = False
+
+    def is_healthy(self) -> bool:
+        return self.browser.is_connected()
+
+    async def close(self) -> None:
+        for resource in (self.context, self.browser):
+            try:
+                await resource.close()
+            except Exception as e:
+                logger.debug(f"Navegador {self.browser_id}: error cerrando recurso: {e}")
+
+
+class Async_browser_pool:
+    """
+    Comentario: pool de `size` navegadores asíncronos. `page()` entrega una página nueva del
+    navegador menos cargado; los navegadores que llegan a `max_pages` se retiran (el reemplazo se
+    lanza de inmediato en segundo plano y el retirado se cierra cuando terminan sus páginas
+    activas) y los caídos se relanzan.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_pages: int = 200,
+        health_check_interval: float = 30.0,
+        blocking_profile: Blocking_profile | None = None,
+        memory: Memory_governor | None = None,
+        page_deadline: float = 0.0,
+    ) -> None:
+        self.size = size
+        self.max_pages = max_pages
+        self.health_check_interval = health_check_interval
+        self.blocking = Blocking_stats(blocking_profile or Blocking_profile())
+        self.memory = memory
+        self.page_deadline = page_deadline
+        self.deadline_exceeded = 0
+        self.launches = 0
+        self.recycles = 0
+        self.crashes = 0
+        self._playwright = None
+        self._browsers: list[Async_browser] = []
+        self._retired: list[Async_browser] = []
+        self._launch_lock = asyncio.Lock()
+        self._health_task: asyncio.Task | None = None
+        self._fill_task: asyncio.Task | None = None
+        self._in_flight = 0
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._closing = False
+
+    async def _launch(self) -> Async_browser:
+        started = time.perf_counter()
+        memory_key, launch_args = None, BROWSER_LAUNCH_ARGS
+        if self.memory is not None:
+            memory_key, marker_args = self.memory.launch_args()
+            launch_args = BROWSER_LAUNCH_ARGS + marker_args
+        browser = await self._playwright.chromium.launch(headless=True, args=launch_args)
+        # El contexto se mantiene entre solicitudes para conservar cookies (p. ej. el banner aceptado)
+        context = await browser.new_context(**BROWSER_CONTEXT_OPTIONS)
+        browser_launch_seconds.observe(time.perf_counter() - started, "async")
+        self.launches += 1
+        entry = Async_browser(self.launches, browser, context, memory_key)
+        if self.memory is not None:
+            self.memory.register(memory_key)
+        logger.info(f"Navegador asíncrono {entry.browser_id} lanzado")
+        return entry
+
+    async def _fill(self) -> None:
+        """Completa el pool hasta `size` navegadores sanos, descartando los caídos."""
+        async with self._launch_lock:
+            for entry in [b for b in self._browsers if not b.is_healthy()]:
+                logger.warning(f"Navegador asíncrono {entry.browser_id} desconectado, relanzando")
+                self.crashes += 1
+                self._browsers.remove(entry)
+                await self._close_browser(entry)
+            while len(self._browsers) < self.size:
+                self._browsers.append(await self._launch())
+
+    async def start(self, warm: bool = True) -> None:
+        """Arranca Playwright y, opcionalmente, lanza los navegadores por adelantado."""
+        self._closing = False
+        self._playwright = await async_playwright().start()
+        if warm:
+            try:
+                await self._fill()
+            except Exception as e:
+                # No bloqueamos el arranque: se reintentará en la primera solicitud
+                logger.warning(f"No se pudo precalentar el pool asíncrono: {e}")
+        if self.health_check_interval > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+        if self.memory is not None:
+            await self.memory.start(self._on_memory_over_limit)
+        logger.info(f"Pool de navegadores asíncrono iniciado con {self.size} navegadores")
+
+    async def _acquire_browser(self) -> Async_browser:
+        if not self._browsers or any(not b.is_healthy() for b in self._browsers):
+            await self._fill()
+        elif len(self._browsers) < self.size:
+            self._schedule_fill()
+        return min(self._browsers, key=lambda b: b.active_pages)
+
+    def _schedule_fill(self) -> None:
+        """Lanza en segundo plano los navegadores que faltan, sin demorar a quien retiró o pidió uno."""
+        if self._closing or (self._fill_task is not None and not self._fill_task.done()):
+            return
+        self._fill_task = asyncio.create_task(self._background_fill())
+
+    async def _background_fill(self) -> None:
+        try:
+            await self._fill()
+        except Exception as e:
+            # El siguiente alquiler o el health check lo vuelven a intentar
+            logger.warning(f"No se pudo reemplazar un navegador del pool asíncrono: {e}")
+
+    async def _retire(self, entry: Async_browser, reason: str | None = None) -> None:
+        entry.retiring = True
+        self.recycles += 1
+        if entry in self._browsers:
+            self._browsers.remove(entry)
+        self._retired.append(entry)
+        logger.info(
+            f"Navegador asíncrono {entry.browser_id}: reciclando {reason or f'tras {entry.pages_served} páginas'}"
+        )
+        self._schedule_fill()
+        await self._close_retired()
+
+    async def _close_retired(self) -> None:
+        for entry in [b for b in self._retired if b.active_pages == 0]:
+            self._retired.remove(entry)
+            await self._close_browser(entry)
+
+    async def _close_browser(self, entry: Async_browser) -> None:
+        await entry.close()
+        if self.memory is not None and entry.memory_key is not None:
+            self.memory.unregister(entry.memory_key)
+
+    async def _on_memory_over_limit(self, key: str, seconds: float) -> None:
+        entry = next((b for b in self._browsers if b.memory_key == key), None)
+        if entry is not None:
+            # Las páginas nuevas van a otro navegador; este se cierra cuando terminan las suyas
+            self.memory.note_recycle()
+            await self._retire(entry, "por memoria por encima del límite")
+            return
+        if self.page_deadline > 0 and seconds > self.page_deadline:
+            # Retirado y con páginas vivas más allá del plazo: se corta por lo sano
+            await self.memory.kill(key, "sigue por encima del límite de memoria")
+
+    async def _expire_page(self, browser_page) -> None:
+        self.deadline_exceeded += 1
+        logger.warning(f"Página cerrada por superar el plazo de {self.page_deadline:.0f}s")
+        try:
+            await browser_page.close()
+        except Exception:
+            pass
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[Any]:
+        """Entrega una página nueva de un navegador caliente y la cierra al salir del bloque."""
+        if self._closing or self._playwright is None:
+            raise Browser_pool_closed_error("El pool de navegadores no está disponible.")
+
+        self._in_flight += 1
+        self._drained.clear()
+        entry = None
+        browser_page = None
+        counters = None
+        deadline = None
+        try:
+            if self.memory is not None:
+                await self.memory.admit()
+            entry = await self._acquire_browser()
+            entry.active_pages += 1
+            browser_page = await entry.context.new_page()
+            if self.page_deadline > 0:
+                # Cerrar la página hace fallar al instante cualquier espera pendiente sobre ella
+                deadline = asyncio.get_running_loop().call_later(
+                    self.page_deadline, lambda page=browser_page: asyncio.ensure_future(self._expire_page(page))
+                )
+            counters = await install_blocking(browser_page, self.blocking.profile)
+            yield browser_page
+        finally:
+            if deadline is not None:
+                deadline.cancel()
+            if browser_page is not None:
+                try:
+                    await browser_page.close()
+                except Exception:
+                    pass
+            if counters is not None:
+                self.blocking.add(counters)
+            if entry is not None:
+                entry.active_pages -= 1
+                entry.pages_served += 1
+                if not entry.is_healthy() and entry in self._browsers:
+                    # Caída durante el scraping: se relanza en segundo plano
+                    self.crashes += 1
+                    self._browsers.remove(entry)
+                    await self._close_browser(entry)
+                    self._schedule_fill()
+                elif entry.pages_served >= self.max_pages and not entry.retiring:
+                    await self._retire(entry)
+                elif entry.retiring:
+                    await self._close_retired()
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._drained.set()
+
+    async def _health_loop(self) -> None:
+        while not self._closing:
+            await asyncio.sleep(self.health_check_interval)
+            try:
+                await self._fill()
+            except Exception as e:
+                logger.warning(f"Health check del pool asíncrono falló: {e}")
+
+    async def stop(self) -> None:
+        """Drena el pool: deja de aceptar páginas, espera las que están en curso y cierra todo."""
+        if self._playwright is None:
+            return
+        self._closing = True
+        if self.memory is not None:
+            await self.memory.stop()
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        if self._fill_task is not None:
+            self._fill_task.cancel()
+            try:
+                await self._fill_task
+            except asyncio.CancelledError:
+                pass
+            self._fill_task = None
+
+        await self._drained.wait()
+        for entry in self._browsers + self._retired:
+            await self._close_browser(entry)
+        self._browsers = []
+        self._retired = []
+        await self._playwright.stop()
+        self._playwright = None
+        logger.info("Pool de navegadores asíncrono drenado y cerrado")
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "size": self.size,
+            "in_flight": self._in_flight,
+            "closing": self._closing,
+            "launches": self.launches,
+            "recycles": self.recycles,
+            "crashes": self.crashes,
+            "page_deadline_seconds": self.page_deadline,
+            "deadline_exceeded": self.deadline_exceeded,
+            "memory": self.memory.stats() if self.memory is not None else None,
+            "resource_blocking": self.blocking.stats(),
+            "browsers": [
+                {
+                    "browser_id": b.browser_id,
+                    "active_pages": b.active_pages,
+                    "pages_served": b.pages_served,
+                }
+                for b in self._browsers
+            ],
+        }
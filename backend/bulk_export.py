@@ -0,0 +1,607 @@
+"""
+Comentario: exportación completa del catálogo de One Piece Card Game con sus precios de mercado, para
+guardar una foto nocturna de todas las cartas. En lugar de recorrer `/api/suggestions` página por
+página, pide al API JSON de TCGplayer la lista de sets (agregación `setName` de una búsqueda vacía) y
+recorre los sets en paralelo con el mismo filtro de set que usa la vista de grid:
+
+    python bulk_export.py
+    python bulk_export.py --format parquet --concurrency 6 --rate 4
+    python bulk_export.py --snapshot 2026-10-16        # reanuda la corrida de ese día
+
+- Todo el tráfico pasa por un `Upstream_governor` propio (límite de ritmo, concurrencia adaptativa y
+  circuit breaker) configurado como el del backend; `--rate` lo baja si el backend corre a la vez.
+- Cada página se guarda, junto con el avance de su set, en una sola transacción de un checkpoint
+  SQLite (`optcg-prices-<snapshot>.checkpoint.sqlite3`). Si el proceso muere, volver a correrlo con
+  el mismo `--snapshot` sigue desde la página siguiente de cada set sin repetir lo ya guardado.
+- Las cartas se deduplican por ID de producto (un mismo producto puede aparecer en más de un set).
+- Cada set se pide ordenado por nombre, no por relevancia, para que sus páginas no se solapen. Al
+  llegar a la última página se comparan las cartas distintas guardadas con el total que informa
+  TCGplayer; si faltan (el set cambió a mitad de camino), el set se recorre de nuevo desde la primera
+  página hasta `MAX_SET_RECRAWLS` veces y, si siguen faltando, queda fallido.
+- Al terminar todos los sets se escribe `optcg-prices-<snapshot>.csv.gz`, o `.parquet` si está
+  instalado `pyarrow`, y se borra el checkpoint. Con sets fallidos no se escribe nada y el proceso
+  termina con código 1: la próxima corrida reintenta solo esos.
+- Cada `--progress-interval` segundos se registra el avance: sets, cartas, cartas/s y ETA.
+
+Por defecto las páginas también alimentan el catálogo local y el histórico de precios, igual que
+una búsqueda en vivo (`--no-local-stores` lo evita).
+"""
+import argparse
+import asyncio
+import contextlib
+import csv
+import gzip
+import logging
+import os
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator
+
+from catalog import Card_catalog
+from models import Search_results_response
+from price_history import Price_history_store, product_id_from_url
+from settings import App_settings, load_settings
+from tcgplayer_api import Tcgplayer_api_client, Tcgplayer_api_error
+from upstream_governor import Upstream_governor, Upstream_throttled, Upstream_unavailable
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pyarrow es opcional: sin él solo se exporta CSV.gz
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("csv.gz", "parquet")
+EXPORT_COLUMNS = (
+    "product_id",
+    "card_name",
+    "set_name",
+    "card_number",
+    "rarity",
+    "card_type",
+    "color",
+    "market_price",
+    "product_url",
+    "observed_at",
+)
+# Tamaño de página del filtro de set (el máximo que usa la vista de grid)
+SET_PAGE_SIZE = 50
+# Espera antes del primer reintento de una página; se duplica en cada uno
+RETRY_BASE_SECONDS = 2.0
+# Recorridos extra de un set cuyas cartas no cuadran con el total de TCGplayer
+MAX_SET_RECRAWLS = 2
+
+SET_PENDING = "pending"
+SET_DONE = "done"
+SET_FAILED = "failed"
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS export_sets (
+        set_name TEXT PRIMARY KEY,
+        expected INTEGER NOT NULL,
+        next_page INTEGER NOT NULL DEFAULT 1,
+        cards INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL DEFAULT 'pending',
+        error TEXT,
+        recrawls INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS export_cards (
+        product_id INTEGER PRIMARY KEY,
+        card_name TEXT NOT NULL,
+        set_name TEXT,
+        card_number TEXT,
+        rarity TEXT,
+        card_type TEXT,
+        color TEXT,
+        market_price REAL,
+        product_url TEXT,
+        observed_at TEXT NOT NULL
+    )
+    """,
+    # Qué productos trajo cada set, para comparar con su total aunque un producto esté en varios sets
+    """
+    CREATE TABLE IF NOT EXISTS export_set_cards (
+        set_name TEXT NOT NULL,
+        product_id INTEGER NOT NULL,
+        PRIMARY KEY (set_name, product_id)
+    )
+    """,
+)
+
+
+@dataclass
+class Set_progress:
+    set_name: str
+    expected: int
+    next_page: int = 1
+    cards: int = 0
+    status: str = SET_PENDING
+    error: str | None = None
+    recrawls: int = 0
+
+
+class Export_checkpoint:
+    """Estado de una exportación en SQLite: los sets con su próxima página y las cartas ya guardadas."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path))
+        for statement in SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+
+    def sets(self) -> list[Set_progress]:
+        rows = self._conn.execute(
+            "SELECT set_name, expected, next_page, cards, status, error, recrawls FROM export_sets ORDER BY set_name"
+        ).fetchall()
+        return [Set_progress(*row) for row in rows]
+
+    def add_sets(self, sets: list[tuple[str, int]]) -> None:
+        with self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO export_sets (set_name, expected) VALUES (?, ?)", sets)
+
+    def save_page(self, progress: Set_progress, rows: list[tuple]) -> None:
+        """Guarda las cartas de una página y el avance de su set en la misma transacción.
+
+        `progress.cards` queda con las cartas distintas que lleva el set, contando las de recorridos anteriores.
+        """
+        with self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO export_cards ({', '.join(EXPORT_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in EXPORT_COLUMNS)})",
+                rows,
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO export_set_cards (set_name, product_id) VALUES (?, ?)",
+                [(progress.set_name, row[0]) for row in rows],
+            )
+            progress.cards = self._conn.execute(
+                "SELECT COUNT(*) FROM export_set_cards WHERE set_name = ?", (progress.set_name,)
+            ).fetchone()[0]
+            self._update_set(progress)
+
+    def save_set(self, progress: Set_progress) -> None:
+        with self._conn:
+            self._update_set(progress)
+
+    def _update_set(self, progress: Set_progress) -> None:
+        self._conn.execute(
+            "UPDATE export_sets SET expected = ?, next_page = ?, cards = ?, status = ?, error = NULL, recrawls = ? "
+            "WHERE set_name = ?",
+            (
+                progress.expected,
+                progress.next_page,
+                progress.cards,
+                progress.status,
+                progress.recrawls,
+                progress.set_name,
+            ),
+        )
+
+    def mark_failed(self, progress: Set_progress) -> None:
+        with self._conn:
+            self._conn.execute(
+                "UPDATE export_sets SET status = ?, error = ? WHERE set_name = ?",
+                (SET_FAILED, progress.error, progress.set_name),
+            )
+
+    def card_count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM export_cards").fetchone()[0]
+
+    def rows(self) -> Iterator[tuple]:
+        return self._conn.execute(
+            f"SELECT {', '.join(EXPORT_COLUMNS)} FROM export_cards ORDER BY set_name, card_number, product_id"
+        )
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class Export_progress:
+    """Avance de la corrida: lo ya guardado (incluido lo de corridas anteriores) y el ritmo de esta."""
+
+    def __init__(self, sets: list[Set_progress], saved_cards: int) -> None:
+        self.sets = sets
+        self.saved_cards = saved_cards
+        self.fetched_cards = 0
+        self.pages = 0
+        self.started = time.monotonic()
+
+    def expected_cards(self) -> int:
+        # Un set terminado ya no es una estimación: cuenta lo que realmente trajo
+        return sum(
+            progress.cards if progress.status == SET_DONE else max(progress.expected, progress.cards)
+            for progress in self.sets
+        )
+
+    def line(self) -> str:
+        done = sum(progress.status == SET_DONE for progress in self.sets)
+        failed = sum(progress.status == SET_FAILED for progress in self.sets)
+        elapsed = time.monotonic() - self.started
+        rate = self.fetched_cards / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, self.expected_cards() - sum(progress.cards for progress in self.sets))
+        eta = _format_duration(remaining / rate) if rate > 0 else "?"
+        return (
+            f"Sets {done}/{len(self.sets)}{f' ({failed} fallidos)' if failed else ''} · "
+            f"{self.saved_cards} cartas guardadas de ~{self.expected_cards()} · "
+            f"{self.pages} páginas · {rate:.1f} cartas/s · ETA {eta}"
+        )
+
+
+class Bulk_exporter:
+    """Recorre todos los sets con `concurrency` tareas y guarda cada página en el checkpoint."""
+
+    def __init__(
+        self,
+        client: Tcgplayer_api_client,
+        checkpoint: Export_checkpoint,
+        governor: Upstream_governor | None = None,
+        concurrency: int = 4,
+        page_size: int = SET_PAGE_SIZE,
+        retries: int = 4,
+        catalog: Card_catalog | None = None,
+        price_history: Price_history_store | None = None,
+    ) -> None:
+        self.client = client
+        self.checkpoint = checkpoint
+        self.governor = governor
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.retries = retries
+        self.catalog = catalog
+        self.price_history = price_history
+        self.progress: Export_progress | None = None
+
+    def _permit(self):
+        return self.governor.permit() if self.governor is not None else contextlib.nullcontext()
+
+    async def _call(self, description: str, call) -> Any:
+        """Llama a TCGplayer a través del regulador, reintentando con espera creciente."""
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._permit():
+                    return await call()
+            except Upstream_unavailable as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"{description}: {e}; reintento en {e.retry_after:.0f}s")
+                await asyncio.sleep(e.retry_after)
+            except (Tcgplayer_api_error, Upstream_throttled) as e:
+                if attempt == self.retries:
+                    raise
+                delay = RETRY_BASE_SECONDS * 2 ** attempt
+                logger.warning(f"{description}: {e}; reintento en {delay:.0f}s")
+                await asyncio.sleep(delay)
+
+    async def discover_sets(self) -> list[Set_progress]:
+        """Sets del checkpoint; la primera vez se piden a TCGplayer y quedan fijos para toda la corrida."""
+        sets = self.checkpoint.sets()
+        if not sets:
+            discovered = await self._call("Lista de sets", self.client.list_sets)
+            if not discovered:
+                raise Tcgplayer_api_error("TCGplayer no devolvió ningún set de One Piece Card Game.")
+            self.checkpoint.add_sets(discovered)
+            sets = self.checkpoint.sets()
+            logger.info(f"{len(sets)} sets por exportar (~{sum(progress.expected for progress in sets)} cartas)")
+        return sets
+
+    async def run(self, progress_interval: float = 10.0) -> Export_progress:
+        sets = await self.discover_sets()
+        self.progress = Export_progress(sets, self.checkpoint.card_count())
+        # Los sets grandes primero, para que no quede uno largo corriendo solo al final
+        pending = sorted(
+            (progress for progress in sets if progress.status != SET_DONE),
+            key=lambda progress: progress.expected,
+            reverse=True,
+        )
+        for progress in pending:
+            progress.status, progress.error, progress.recrawls = SET_PENDING, None, 0
+        if self.progress.saved_cards:
+            logger.info(
+                f"Reanudando: {len(sets) - len(pending)} sets completos y {self.progress.saved_cards} cartas ya guardadas"
+            )
+
+        queue: asyncio.Queue[Set_progress] = asyncio.Queue()
+        for progress in pending:
+            queue.put_nowait(progress)
+        reporter = asyncio.create_task(self._report_loop(progress_interval))
+        try:
+            await asyncio.gather(*(self._worker(queue) for _ in range(max(1, min(self.concurrency, len(pending))))))
+        finally:
+            reporter.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await reporter
+        logger.info(self.progress.line())
+        return self.progress
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while not queue.empty():
+            progress = queue.get_nowait()
+            try:
+                await self._crawl_set(progress)
+            except (Tcgplayer_api_error, Upstream_throttled, Upstream_unavailable) as e:
+                progress.status, progress.error = SET_FAILED, str(e)
+                self.checkpoint.mark_failed(progress)
+                logger.error(f"Set '{progress.set_name}' fallido en la página {progress.next_page}: {e}")
+
+    async def _crawl_set(self, progress: Set_progress) -> None:
+        while progress.status != SET_DONE:
+            page = progress.next_page
+            response: Search_results_response = await self._call(
+                f"Set '{progress.set_name}' página {page}",
+                lambda: self.client.search_set(progress.set_name, page, self.page_size),
+            )
+            observed_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+            rows = []
+            for suggestion in response.results:
+                product_id = product_id_from_url(suggestion.product_url)
+                if product_id is None:
+                    continue
+                rows.append((
+                    product_id,
+                    suggestion.card_name,
+                    suggestion.set_name,
+                    suggestion.card_number,
+                    suggestion.rarity,
+                    suggestion.card_type,
+                    suggestion.color,
+                    suggestion.market_price,
+                    suggestion.product_url,
+                    observed_at,
+                ))
+
+            progress.expected = response.total_results
+            progress.next_page = page + 1
+            before = self.checkpoint.card_count()
+            self.checkpoint.save_page(progress, rows)
+            self.progress.saved_cards += self.checkpoint.card_count() - before
+            self.progress.fetched_cards += len(rows)
+            self.progress.pages += 1
+            self._feed_local_stores(response)
+            # Una página vacía antes de tiempo (el set cambió durante la corrida) también lo termina
+            if page >= response.total_pages or not response.results:
+                self._finish_set(progress)
+
+    def _finish_set(self, progress: Set_progress) -> None:
+        """Da el set por terminado si trajo todas sus cartas; si no, lo vuelve a recorrer desde la primera página.
+
+        El set se marca como terminado en una transacción aparte de su última página: si el proceso muere
+        en medio, al reanudar se pide la página siguiente, que llega vacía, y se vuelve a verificar aquí.
+        """
+        if progress.cards >= progress.expected:
+            progress.status = SET_DONE
+        elif progress.recrawls >= MAX_SET_RECRAWLS:
+            raise Tcgplayer_api_error(
+                f"{progress.cards} de {progress.expected} cartas tras {progress.recrawls + 1} recorridos del set"
+            )
+        else:
+            progress.recrawls += 1
+            progress.next_page = 1
+            logger.warning(
+                f"Set '{progress.set_name}': {progress.cards} de {progress.expected} cartas; "
+                f"se recorre de nuevo ({progress.recrawls}/{MAX_SET_RECRAWLS})"
+            )
+        self.checkpoint.save_set(progress)
+
+    def _feed_local_stores(self, response: Search_results_response) -> None:
+        try:
+            if self.catalog is not None:
+                self.catalog.upsert(response.results)
+            if self.price_history is not None:
+                self.price_history.record_suggestions(response.results)
+        except sqlite3.Error as e:
+            logger.warning(f"No se pudo actualizar el catálogo o el histórico local: {e}")
+
+    async def _report_loop(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            logger.info(self.progress.line())
+
+
+def write_csv_gz(rows: Iterator[tuple], path: Path) -> int:
+    """Escribe la foto como CSV comprimido con gzip; devuelve cuántas cartas escribió."""
+    count = 0
+    with gzip.open(path, "wt", encoding="utf-8", newline="", compresslevel=6) as output:
+        writer = csv.writer(output)
+        writer.writerow(EXPORT_COLUMNS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def write_parquet(rows: Iterator[tuple], path: Path) -> int:
+    """Escribe la foto como Parquet (columnar, comprimido con zstd); devuelve cuántas cartas escribió."""
+    schema = pyarrow.schema([
+        ("product_id", pyarrow.int64()),
+        ("card_name", pyarrow.string()),
+        ("set_name", pyarrow.string()),
+        ("card_number", pyarrow.string()),
+        ("rarity", pyarrow.string()),
+        ("card_type", pyarrow.string()),
+        ("color", pyarrow.string()),
+        ("market_price", pyarrow.float64()),
+        ("product_url", pyarrow.string()),
+        ("observed_at", pyarrow.timestamp("s", tz="UTC")),
+    ])
+    columns: list[list[Any]] = [[] for _ in EXPORT_COLUMNS]
+    for row in rows:
+        for column, value in zip(columns, row):
+            column.append(value)
+    observed_at = EXPORT_COLUMNS.index("observed_at")
+    columns[observed_at] = [datetime.fromisoformat(value) for value in columns[observed_at]]
+    pyarrow.parquet.write_table(pyarrow.table(columns, schema=schema), path, compression="zstd")
+    return len(columns[0])
+
+
+def write_snapshot(checkpoint: Export_checkpoint, path: Path, export_format: str) -> int:
+    # Escritura atómica: una foto a medias nunca queda con el nombre final
+    temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        writer = write_parquet if export_format == "parquet" else write_csv_gz
+        count = writer(checkpoint.rows(), temp_path)
+        os.replace(temp_path, path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+    return count
+
+
+def create_governor(app_settings: App_settings, concurrency: int, rate_per_second: float) -> Upstream_governor | None:
+    """Regulador como el del backend (salvo que OPTCG_GOVERNOR=0), con el ritmo y la concurrencia de la exportación."""
+    if not app_settings.governor_enabled:
+        return None
+    return Upstream_governor(
+        rate_per_second=rate_per_second,
+        burst=app_settings.governor_burst,
+        max_concurrency=concurrency,
+        latency_target=app_settings.governor_latency_target,
+        max_queue_wait=app_settings.governor_max_queue_wait,
+        failure_ratio=app_settings.breaker_failure_ratio,
+        window=app_settings.breaker_window,
+        open_seconds=app_settings.breaker_open_seconds,
+    )
+
+
+async def run_export(args: argparse.Namespace, app_settings: App_settings) -> int:
+    extension = "parquet" if args.format == "parquet" else "csv.gz"
+    output_path = args.out / f"optcg-prices-{args.snapshot}.{extension}"
+    checkpoint_path = args.out / f"optcg-prices-{args.snapshot}.checkpoint.sqlite3"
+    if args.restart:
+        checkpoint_path.unlink(missing_ok=True)
+        output_path.unlink(missing_ok=True)
+    if output_path.exists():
+        logger.warning(f"La foto {output_path} ya existe (usa --restart para rehacerla)")
+        return 0
+
+    checkpoint = Export_checkpoint(checkpoint_path)
+    client = Tcgplayer_api_client(
+        app_settings.tcgplayer_api_url,
+        timeout=app_settings.http_timeout,
+        max_connections=max(args.concurrency, 1),
+    )
+    catalog = None
+    price_history = None
+    if args.local_stores and app_settings.catalog_enabled:
+        catalog = Card_catalog(app_settings.data_dir / "catalog.sqlite3")
+    if args.local_stores and app_settings.price_history_enabled:
+        price_history = Price_history_store(
+            app_settings.data_dir / "price_history.sqlite3",
+            min_interval=app_settings.price_history_min_interval,
+        )
+    exporter = Bulk_exporter(
+        client,
+        checkpoint,
+        governor=create_governor(app_settings, args.concurrency, args.rate),
+        concurrency=args.concurrency,
+        page_size=args.page_size,
+        retries=args.retries,
+        catalog=catalog,
+        price_history=price_history,
+    )
+    await client.start()
+    try:
+        try:
+            progress = await exporter.run(args.progress_interval)
+        except (Tcgplayer_api_error, Upstream_throttled, Upstream_unavailable) as e:
+            # Solo llega aquí si falla la lista de sets; los errores de cada set quedan en su checkpoint
+            logger.error(f"No se pudo obtener la lista de sets de TCGplayer: {e}")
+            return 1
+        failed = [set_progress for set_progress in progress.sets if set_progress.status == SET_FAILED]
+        if failed:
+            logger.error(
+                f"{len(failed)} sets fallidos ({', '.join(set_progress.set_name for set_progress in failed)}); "
+                f"vuelve a correr con --snapshot {args.snapshot} para reintentarlos"
+            )
+            return 1
+        started = time.monotonic()
+        count = write_snapshot(checkpoint, output_path, args.format)
+        fetched = sum(set_progress.cards for set_progress in progress.sets)
+        logger.info(
+            f"Foto escrita en {output_path}: {count} cartas ({fetched - count} duplicadas entre sets), "
+            f"{output_path.stat().st_size / 1024:.0f} KB en {time.monotonic() - started:.1f}s; "
+            f"exportación completa en {_format_duration(time.monotonic() - progress.started)}"
+        )
+    finally:
+        await client.stop()
+        checkpoint.close()
+        if catalog is not None:
+            catalog.close()
+        if price_history is not None:
+            price_history.close()
+    if not args.keep_checkpoint:
+        checkpoint_path.unlink(missing_ok=True)
+    return 0
+
+
+def parse_args(argv: list[str] | None, app_settings: App_settings) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Exporta todas las cartas de One Piece Card Game con su precio de mercado.")
+    parser.add_argument("--out", type=Path, default=app_settings.data_dir / "exports", help="Directorio de las fotos y checkpoints")
+    parser.add_argument(
+        "--snapshot",
+        default=datetime.now(timezone.utc).strftime("%Y-%m-%d"),
+        help="Nombre de la foto (por defecto la fecha UTC); repetirlo reanuda una corrida interrumpida",
+    )
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv.gz", help="csv.gz o parquet (requiere pyarrow)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Sets recorridos en paralelo")
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=app_settings.governor_rate_per_second,
+        help="Solicitudes por segundo hacia TCGplayer (por defecto OPTCG_GOVERNOR_RATE_PER_SECOND)",
+    )
+    parser.add_argument("--page-size", type=int, default=SET_PAGE_SIZE, help="Cartas por página de cada set")
+    parser.add_argument("--retries", type=int, default=4, help="Reintentos de una página antes de dar su set por fallido")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="Segundos entre reportes de avance")
+    parser.add_argument("--restart", action="store_true", help="Descartar el checkpoint y la foto de este --snapshot")
+    parser.add_argument("--keep-checkpoint", action="store_true", help="No borrar el checkpoint al terminar")
+    parser.add_argument(
+        "--no-local-stores",
+        dest="local_stores",
+        action="store_false",
+        help="No actualizar el catálogo local ni el histórico de precios",
+    )
+    parser.add_argument("--verbose", action="store_true", help="Mostrar también los logs de httpx")
+    args = parser.parse_args(argv)
+    args.concurrency = max(1, args.concurrency)
+    args.rate = max(0.01, args.rate)
+    args.page_size = max(1, min(args.page_size, SET_PAGE_SIZE))
+    args.retries = max(0, args.retries)
+    args.progress_interval = max(0.5, args.progress_interval)
+    if args.format == "parquet" and pyarrow is None:
+        parser.error("--format parquet requiere pyarrow (pip install pyarrow)")
+    return args
+
+
+def main(argv: list[str] | None = None) -> int:
+    app_settings = load_settings()
+    args = parse_args(argv, app_settings)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if not args.verbose:
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+    try:
+        return asyncio.run(run_export(args, app_settings))
+    except KeyboardInterrupt:
+        logger.warning(f"Exportación interrumpida; vuelve a correr con --snapshot {args.snapshot} para reanudarla")
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
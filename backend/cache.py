@@ -0,0 +1,353 @@
+"""
+Comentario: caché en proceso con TTL, LRU acotado y stale-while-revalidate para no repetir
+scrapes de las mismas cartas populares. El almacenamiento es enchufable (`Cache_backend`):
+memoria por defecto, o SQLite / archivos locales cuando se quiere compartir la caché entre
+procesos o conservarla entre reinicios. Los backends que tocan disco se consultan desde un
+hilo (`asyncio.to_thread`) para no bloquear el event loop.
+"""
+import abc
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Generic, TypeVar
+
+from pydantic import BaseModel
+
+from models import Card_query
+
+logger = logging.getLogger(__name__)
+
+Model_type = TypeVar("Model_type", bound=BaseModel)
+
+
+def _normalize_text(value: str | None) -> str:
+    return " ".join((value or "").lower().split())
+
+
+def price_cache_key(query: Card_query) -> str:
+    """Clave normalizada de un `Card_query`: sin mayúsculas ni espacios repetidos."""
+    if query.product_id is not None:
+        return f"price|product:{query.product_id}|{int(query.is_foil)}"
+    if query.card_number:
+        return f"price|number:{_normalize_text(query.card_number)}|{_normalize_text(query.variant)}|{int(query.is_foil)}"
+    return f"price|{_normalize_text(query.card_name)}|{_normalize_text(query.set_name)}|{int(query.is_foil)}"
+
+
+def search_cache_key(query_text: str, page: int, page_size: int) -> str:
+    """Clave normalizada de una página de búsqueda de sugerencias."""
+    return f"search|{_normalize_text(query_text)}|{page}|{page_size}"
+
+
+class Cache_backend(abc.ABC):
+    """
+    Interfaz de almacenamiento de la caché. Guarda payloads JSON-serializables junto con el
+    momento en que se guardaron; la política de frescura la decide `Swr_cache`.
+    `blocking` indica que las operaciones hacen I/O de disco y deben correr fuera del event loop.
+    """
+
+    evictions = 0
+    blocking = False
+
+    @abc.abstractmethod
+    def get(self, key: str) -> tuple[Any, float] | None: ...
+
+    @abc.abstractmethod
+    def set(self, key: str, payload: Any, stored_at: float) -> None: ...
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None: ...
+
+    @abc.abstractmethod
+    def __len__(self) -> int: ...
+
+    def close(self) -> None:
+        pass
+
+
+class Memory_cache_backend(Cache_backend):
+    """LRU en memoria sobre un OrderedDict."""
+
+    def __init__(self, max_entries: int = 1000) -> None:
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+
+    def get(self, key: str) -> tuple[Any, float] | None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, payload: Any, stored_at: float) -> None:
+        self._entries[key] = (payload, stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class Sqlite_cache_backend(Cache_backend):
+    """LRU persistente en SQLite; varios procesos pueden abrir el mismo archivo."""
+
+    blocking = True
+
+    def __init__(self, path: Path, max_entries: int = 1000) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.evictions = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            "key TEXT PRIMARY KEY, payload TEXT NOT NULL, stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_entries_accessed ON cache_entries (accessed_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> tuple[Any, float] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, stored_at FROM cache_entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE cache_entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, payload: Any, stored_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, payload, stored_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(payload), stored_at, time.time()),
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM cache_entries WHERE key IN "
+                    "(SELECT key FROM cache_entries ORDER BY accessed_at LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()
+        return count
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class File_cache_backend(Cache_backend):
+    """
+    Un archivo JSON por entrada; el mtime del archivo hace de marca de último acceso para el LRU.
+    El número de entradas se lleva en un contador; solo se lista el directorio al arrancar y al
+    desbordarse, y entonces se desalojan de una vez `evict_batch` entradas de más para que la
+    siguiente escritura no vuelva a listarlo.
+    """
+
+    blocking = True
+
+    def __init__(self, directory: Path, max_entries: int = 1000) -> None:
+        self.directory = directory
+        self.max_entries = max_entries
+        self.evict_batch = max(1, max_entries // 10)
+        self.evictions = 0
+        directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._count = sum(1 for _ in directory.glob("*.json"))
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.json"
+
+    def get(self, key: str) -> tuple[Any, float] | None:
+        path = self._path(key)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            path.touch()
+        except (OSError, ValueError):
+            return None
+        return data["payload"], data["stored_at"]
+
+    def set(self, key: str, payload: Any, stored_at: float) -> None:
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_text(json.dumps({"payload": payload, "stored_at": stored_at}), encoding="utf-8")
+        with self._lock:
+            is_new = not path.exists()
+            tmp_path.replace(path)
+            if is_new:
+                self._count += 1
+            if self._count > self.max_entries:
+                self._evict()
+
+    def _evict(self) -> None:
+        files = list(self.directory.glob("*.json"))
+        overflow = max(0, len(files) - max(1, self.max_entries - self.evict_batch))
+        files.sort(key=lambda f: f.stat().st_mtime)
+        for old in files[:overflow]:
+            old.unlink(missing_ok=True)
+        self.evictions += overflow
+        self._count = len(files) - overflow
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                return
+            self._count -= 1
+
+    def __len__(self) -> int:
+        return self._count
+
+
+def create_cache_backend(kind: str, path: Path, max_entries: int) -> Cache_backend:
+    """Crea el backend indicado por configuración: "memory", "sqlite" o "file"."""
+    if kind == "memory":
+        return Memory_cache_backend(max_entries)
+    if kind == "sqlite":
+        return Sqlite_cache_backend(path.with_suffix(".sqlite3"), max_entries)
+    if kind == "file":
+        return File_cache_backend(path, max_entries)
+    raise ValueError(f"Backend de caché desconocido: '{kind}' (usa 'memory', 'sqlite' o 'file')")
+
+
+class Swr_cache(Generic[Model_type]):
+    """
+    Comentario: caché de modelos Pydantic con stale-while-revalidate.
+    - Entrada con edad < `ttl`: hit fresco.
+    - Entrada con edad < `ttl + stale_ttl`: se devuelve al instante y se refresca en segundo plano.
+    - Más vieja o ausente: miss, se espera a `fetch` y se guarda el resultado.
+    Los errores de `fetch` no se guardan. Si `fetch` falla (salvo `ValueError`, que significa "no
+    existe") y hay una entrada con edad < `ttl + stale_if_error`, se sirve esa (stale-if-error).
+    """
+
+    def __init__(
+        self,
+        backend: Cache_backend,
+        model: type[Model_type],
+        ttl: float,
+        stale_ttl: float,
+        stale_if_error: float = 0.0,
+    ) -> None:
+        self.backend = backend
+        self.model = model
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.stale_if_error = stale_if_error
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.stale_on_error = 0
+        self._refreshing: dict[str, asyncio.Task] = {}
+
+    async def _call_backend(self, method: Callable[..., Any], *args: Any) -> Any:
+        if self.backend.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def peek(self, key: str) -> tuple[Model_type, float] | None:
+        """Devuelve el valor guardado y su edad en segundos, sin contar hit ni miss."""
+        entry = await self._call_backend(self.backend.get, key)
+        if entry is None:
+            return None
+        payload, stored_at = entry
+        return self.model.model_validate(payload), time.time() - stored_at
+
+    async def put(self, key: str, value: Model_type) -> None:
+        await self._call_backend(self.backend.set, key, value.model_dump(mode="json"), time.time())
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Model_type]]) -> Model_type:
+        cached = await self.peek(key) if self.ttl > 0 else None
+        if cached is not None:
+            value, age = cached
+            if age < self.ttl:
+                self.hits += 1
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._schedule_refresh(key, fetch)
+                return value
+
+        self.misses += 1
+        try:
+            value = await fetch()
+        except ValueError:
+            raise
+        except Exception as e:
+            if cached is not None and cached[1] < self.ttl + self.stale_if_error:
+                self.stale_on_error += 1
+                logger.warning(f"Sirviendo '{key}' vencido hace {cached[1] - self.ttl:.0f}s porque falló el fetch: {e}")
+                return cached[0]
+            raise
+        await self.put(key, value)
+        return value
+
+    def _schedule_refresh(self, key: str, fetch: Callable[[], Awaitable[Model_type]]) -> None:
+        if key in self._refreshing:
+            return
+
+        async def refresh() -> None:
+            try:
+                await self.put(key, await fetch())
+                self.refreshes += 1
+            except Exception as e:
+                self.refresh_failures += 1
+                logger.warning(f"No se pudo refrescar la entrada de caché '{key}': {e}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(refresh())
+
+    async def close(self) -> None:
+        """Cancela los refrescos en segundo plano pendientes y cierra el backend."""
+        tasks = list(self._refreshing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.backend.close()
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "ttl_seconds": self.ttl,
+            "stale_ttl_seconds": self.stale_ttl,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.backend.evictions,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "refreshing": len(self._refreshing),
+            "stale_if_error_seconds": self.stale_if_error,
+            "stale_on_error": self.stale_on_error,
+            "hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,250 @@
+"""
+Comentario: análisis en Python puro de las tarjetas de producto extraídas de la vista de grid de
+TCGplayer (los textos crudos que devuelve `EXTRACT_SEARCH_PAGE_SCRIPT`). Todo lo que no depende de
+la tarjeta se prepara una sola vez al importar el módulo:
+
+- expresiones regulares precompiladas;
+- tablas de palabras clave por prioridad (rareza, tipo, color, variantes) como tuplas constantes;
+- el texto de cada tarjeta se parte en líneas y se pasa a minúsculas/mayúsculas una sola vez.
+
+`Card_text_parser(query_text)` guarda lo que depende de la consulta y analiza tarjetas sueltas
+(`parse`) o lotes (`parse_many`). El resultado es el mismo que daba el análisis anterior en
+`scraper.py`, verificado con los casos de `fixtures/card_parser/golden.json`:
+
+    python card_parser.py            # verifica los casos golden y mide µs por tarjeta
+    python card_parser.py --rounds 5000
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+from models import Search_suggestion
+
+GOLDEN_CASES_PATH = Path(__file__).resolve().parent / "fixtures" / "card_parser" / "golden.json"
+
+PRODUCT_ID_PATTERN = re.compile(r"/product/(\d+)/")
+PRICE_PATTERN = re.compile(r"\$?(\d+\.?\d*)")
+# Número de carta: formato estándar (#OP06-118, #ST02-009) y, si no, cualquier código tras '#'
+CARD_NUMBER_PATTERN = re.compile(r"#([A-Z]{2}\d{2}-\d{3})")
+CARD_NUMBER_FALLBACK_PATTERN = re.compile(r"#([A-Z0-9/-]+)")
+CARD_NUMBER_PREFIX_PATTERN = re.compile(r"[A-Z]{2}\d{2}-\d{3}")
+
+ONE_PIECE_PRODUCT_LINE = "One Piece Card Game"
+PRODUCT_URL_PREFIX = "https://www.tcgplayer.com"
+IMAGE_URL_TEMPLATE = "https://tcgplayer-cdn.tcgplayer.com/product/{product_id}_in_200x200.jpg"
+
+# Tablas por prioridad: gana la primera palabra de la tabla que aparezca en el texto, no la
+# primera que aparezca en el texto (por eso "Secret Rare" se clasifica como "Rare")
+RARITY_KEYWORDS = ("Common", "Rare", "Super Rare", "Secret Rare", "Uncommon", "Leader", "Promo", "P", "C", "U")
+RARITY_KEYWORD_SET = frozenset(RARITY_KEYWORDS)
+CARD_TYPE_KEYWORDS = ("Leader", "Character", "Event", "Stage")
+COLOR_KEYWORDS = ("RED", "BLUE", "GREEN", "PURPLE", "YELLOW", "BLACK")
+COLOR_URL_KEYWORDS = tuple((color.lower(), color) for color in COLOR_KEYWORDS)
+# "Parallel" ya cubre "(Parallel)", así que basta con las variantes sin paréntesis
+VARIANT_KEYWORDS = ("Parallel", "Alternate Art", "Manga", "Gold", "Full Art", "Reprint", "Jolly Roger Foil")
+
+
+def first_keyword(text: str, keywords: tuple[str, ...]) -> str | None:
+    """Primera palabra de la tabla contenida en `text` (búsqueda de subcadenas en C, sin regex)."""
+    for keyword in keywords:
+        if keyword in text:
+            return keyword
+    return None
+
+
+def has_variant(line: str) -> bool:
+    for keyword in VARIANT_KEYWORDS:
+        if keyword in line:
+            return True
+    return False
+
+
+def parse_price_text(price_text: str | None) -> float | None:
+    if not price_text:
+        return None
+    match = PRICE_PATTERN.search(price_text.strip().replace(",", ""))
+    if match is None:
+        return None
+    try:
+        return float(match.group(1))
+    except ValueError:
+        return None
+
+
+class Card_text_parser:
+    """Analiza tarjetas de producto para una consulta; reutilizable para todas las tarjetas de una página."""
+
+    def __init__(self, query_text: str) -> None:
+        self.query_text = query_text
+        self.query_lower = query_text.lower()
+
+    def parse(self, raw: dict[str, Any]) -> Search_suggestion | None:
+        """
+        `raw` trae: href, text, title_text, img_src, img_alt (None si no hay <img>), price_text y
+        heading_text. Devuelve None si la tarjeta no es un producto de One Piece Card Game.
+        """
+        product_href = raw["href"]
+        product_id_match = PRODUCT_ID_PATTERN.search(product_href)
+        if product_id_match is None:
+            return None
+        href_lower = product_href.lower()
+        if "one-piece" not in href_lower:
+            return None
+
+        product_id = product_id_match.group(1)
+        product_url = f"{PRODUCT_URL_PREFIX}{product_href}" if product_href.startswith("/") else product_href
+        img_src = raw.get("img_src")
+        image_url = img_src if img_src and "tcgplayer-cdn" in img_src else IMAGE_URL_TEMPLATE.format(product_id=product_id)
+
+        card_text = raw["text"].strip()
+        lines = [line for line in map(str.strip, card_text.split("\n")) if line]
+
+        # El heading (h4) trae el nombre completo del set; si no está, probamos con la primera línea
+        heading_text = raw.get("heading_text")
+        set_name = heading_text.strip() if heading_text is not None else None
+        if not set_name and lines:
+            first_line = lines[0]
+            if (
+                not first_line.startswith("#")
+                and first_line not in RARITY_KEYWORD_SET
+                and len(first_line) > 2
+                and not CARD_NUMBER_PREFIX_PATTERN.match(first_line)
+            ):
+                set_name = first_line
+
+        card_number = None
+        card_number_match = CARD_NUMBER_PATTERN.search(card_text) or CARD_NUMBER_FALLBACK_PATTERN.search(card_text)
+        if card_number_match is not None:
+            card_number = card_number_match.group(1)
+            # Sin heading ni primera línea útil, el prefijo del número (OP06) hace de set
+            if not set_name and "-" in card_number:
+                set_name = card_number.split("-")[0]
+
+        color = first_keyword(card_text.upper(), COLOR_KEYWORDS)
+        if color is None:
+            color = next((color for keyword, color in COLOR_URL_KEYWORDS if keyword in href_lower), None)
+
+        return Search_suggestion(
+            text=card_text[:100],
+            card_name=self._card_name(raw, lines, card_number),
+            set_name=set_name,
+            product_line=ONE_PIECE_PRODUCT_LINE,
+            image_url=image_url,
+            product_url=product_url,
+            market_price=parse_price_text(raw.get("price_text")),
+            rarity=first_keyword(card_text, RARITY_KEYWORDS),
+            card_number=card_number,
+            card_type=first_keyword(card_text, CARD_TYPE_KEYWORDS),
+            color=color,
+        )
+
+    def _card_name(self, raw: dict[str, Any], lines: list[str], card_number: str | None) -> str:
+        """Nombre con variantes: alt de la imagen, luego título, luego texto de la tarjeta."""
+        query_text = self.query_text
+        query_lower = self.query_lower
+        card_name = query_text
+
+        img_alt = raw.get("img_alt")
+        title_text = (raw.get("title_text") or "").strip()
+        if img_alt and query_lower in img_alt.lower():
+            card_name = img_alt.strip()
+        elif title_text:
+            # El título suele tener el formato completo: "Trafalgar Law (047) (Parallel)"
+            for line in title_text.split("\n"):
+                line = line.strip()
+                if line and (query_lower in line.lower() or (card_number and card_number in line)):
+                    card_name = line
+                    break
+        if card_name != query_text:
+            return card_name
+
+        # Líneas que contienen la consulta; si no traen la variante, puede venir en las 3 siguientes
+        for index, line in enumerate(lines):
+            if query_lower not in line.lower():
+                continue
+            card_name = line
+            if has_variant(line):
+                break
+            for next_line in lines[index + 1:index + 4]:
+                if has_variant(next_line):
+                    card_name = f"{line} {next_line}"
+                    break
+            if card_name != query_text:
+                break
+
+        # Si no, el nombre suele estar justo después del número de carta
+        if card_name == query_text and card_number:
+            for index, line in enumerate(lines[:-1]):
+                if card_number not in line:
+                    continue
+                potential_name = lines[index + 1]
+                if len(potential_name) > 2 and potential_name not in RARITY_KEYWORD_SET:
+                    card_name = potential_name
+                    for next_line in lines[index + 2:index + 4]:
+                        if has_variant(next_line):
+                            card_name = f"{potential_name} {next_line}"
+                            break
+                    break
+        return card_name
+
+    def parse_many(self, raws: Iterable[dict[str, Any]]) -> Iterator[Search_suggestion]:
+        """Analiza un lote de tarjetas y emite solo los productos de One Piece Card Game."""
+        for raw in raws:
+            suggestion = self.parse(raw)
+            if suggestion is not None:
+                yield suggestion
+
+
+def parse_product_card(raw: dict[str, Any], query_text: str) -> Search_suggestion | None:
+    """Atajo para una tarjeta suelta; para una página entera conviene reutilizar `Card_text_parser`."""
+    return Card_text_parser(query_text).parse(raw)
+
+
+def load_golden_cases(path: Path = GOLDEN_CASES_PATH) -> list[dict[str, Any]]:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def check_golden_cases(cases: list[dict[str, Any]]) -> list[str]:
+    """Compara el análisis de cada caso con el resultado esperado. Devuelve las diferencias."""
+    failures = []
+    for case in cases:
+        suggestion = parse_product_card(case["raw"], case["query_text"])
+        actual = suggestion.model_dump() if suggestion is not None else None
+        if actual != case["expected"]:
+            failures.append(f"{case['name']}: esperado {case['expected']}, obtenido {actual}")
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Verifica los casos golden del parser de tarjetas y lo mide.")
+    parser.add_argument("--golden", type=Path, default=GOLDEN_CASES_PATH)
+    parser.add_argument("--rounds", type=int, default=2000, help="Pasadas sobre todos los casos en la medición")
+    args = parser.parse_args()
+
+    cases = load_golden_cases(args.golden)
+    failures = check_golden_cases(cases)
+    for failure in failures:
+        print(f"FALLA {failure}")
+    print(f"Casos golden: {len(cases) - len(failures)}/{len(cases)} correctos")
+
+    by_query: dict[str, list[dict[str, Any]]] = {}
+    for case in cases:
+        by_query.setdefault(case["query_text"], []).append(case["raw"])
+    parsers = [(Card_text_parser(query_text), raws) for query_text, raws in by_query.items()]
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        for card_parser, raws in parsers:
+            for _ in card_parser.parse_many(raws):
+                pass
+    elapsed = time.perf_counter() - started
+    cards = args.rounds * len(cases)
+    print(f"{cards} tarjetas en {elapsed:.3f}s: {elapsed / cards * 1e6:.2f} µs por tarjeta, {cards / elapsed:,.0f} tarjetas/s")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,422 @@
+"""
+Comentario: catálogo local de cartas para responder /api/suggestions sin ir a TCGplayer.
+El catálogo de One Piece (sets, números como OP06-118, rarezas, colores, tipos, variantes) solo
+cambia cuando sale un set nuevo, así que cada `Search_suggestion` obtenido por scraping se guarda
+en SQLite con un índice FTS5 (con prefijos) y las búsquedas siguientes se contestan en milisegundos.
+
+- `Card_catalog`: el almacén (tabla `cards` + índice `cards_fts` + estado por consulta).
+- `Catalog_search`: responde desde el catálogo. Un hit se devuelve al instante y, si la consulta o
+  sus precios están viejos, se refresca en segundo plano; en un miss el endpoint busca en vivo.
+  Toda búsqueda en vivo (también las de lotes y streaming) alimenta el catálogo con `learn`.
+
+Los filtros y facetas de /api/suggestions (`search_filters.py`) se calculan sobre las columnas de
+todas las cartas locales de la consulta. Para que una página filtrada no dependa de qué páginas se
+buscaron antes, una consulta filtrada completa el catálogo en segundo plano con hasta
+`fill_pages` páginas de 50 resultados.
+"""
+import asyncio
+import json
+import logging
+import math
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from models import Search_facets, Search_filters, Search_results_response, Search_suggestion
+from search_filters import Compiled_filters, compute_facets
+
+logger = logging.getLogger(__name__)
+
+# Tamaño de página (el máximo del API) con el que se completa el catálogo de una consulta filtrada
+FILL_PAGE_SIZE = 50
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS cards ("
+    "id INTEGER PRIMARY KEY, product_url TEXT NOT NULL UNIQUE, card_name TEXT NOT NULL, set_name TEXT, "
+    "card_number TEXT, rarity TEXT, card_type TEXT, color TEXT, market_price REAL, "
+    "payload TEXT NOT NULL, updated_at REAL NOT NULL)",
+    # Índice con prefijos de 2 a 4 caracteres para que "luf" o "op0" respondan sin recorrer la tabla
+    "CREATE VIRTUAL TABLE IF NOT EXISTS cards_fts USING fts5("
+    "card_name, set_name, card_number, rarity, card_type, color, "
+    "content='cards', content_rowid='id', prefix='2 3 4')",
+    "CREATE TRIGGER IF NOT EXISTS cards_ai AFTER INSERT ON cards BEGIN "
+    "INSERT INTO cards_fts (rowid, card_name, set_name, card_number, rarity, card_type, color) "
+    "VALUES (new.id, new.card_name, new.set_name, new.card_number, new.rarity, new.card_type, new.color); END",
+    "CREATE TRIGGER IF NOT EXISTS cards_ad AFTER DELETE ON cards BEGIN "
+    "INSERT INTO cards_fts (cards_fts, rowid, card_name, set_name, card_number, rarity, card_type, color) "
+    "VALUES ('delete', old.id, old.card_name, old.set_name, old.card_number, old.rarity, old.card_type, old.color); END",
+    "CREATE TRIGGER IF NOT EXISTS cards_au AFTER UPDATE ON cards BEGIN "
+    "INSERT INTO cards_fts (cards_fts, rowid, card_name, set_name, card_number, rarity, card_type, color) "
+    "VALUES ('delete', old.id, old.card_name, old.set_name, old.card_number, old.rarity, old.card_type, old.color); "
+    "INSERT INTO cards_fts (rowid, card_name, set_name, card_number, rarity, card_type, color) "
+    "VALUES (new.id, new.card_name, new.set_name, new.card_number, new.rarity, new.card_type, new.color); END",
+    # Búsqueda exacta por número de carta (OP05-119) para resolver el producto en /api/price
+    "CREATE INDEX IF NOT EXISTS cards_card_number ON cards (card_number COLLATE NOCASE)",
+    # Último total conocido en TCGplayer para cada consulta y cuándo se refrescó
+    "CREATE TABLE IF NOT EXISTS catalog_queries ("
+    "query_text TEXT PRIMARY KEY, total_results INTEGER NOT NULL, refreshed_at REAL NOT NULL)",
+]
+
+
+def normalize_query(query_text: str) -> str:
+    return " ".join(query_text.lower().split())
+
+
+def build_match_expression(query_text: str) -> str | None:
+    """'Monkey.D.Luffy OP05-119' -> '"monkey"* "d"* "luffy"* "op05"* "119"*' (todas las palabras, por prefijo)."""
+    tokens = re.findall(r"\w+", query_text.lower())
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+class Card_catalog:
+    """Catálogo persistente en SQLite con FTS5; varios procesos pueden abrir el mismo archivo."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for statement in SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+
+    def upsert(self, suggestions: list[Search_suggestion]) -> int:
+        """Guarda o actualiza las cartas (clave: URL del producto). Devuelve cuántas se escribieron."""
+        now = time.time()
+        rows = [
+            (
+                suggestion.product_url,
+                suggestion.card_name,
+                suggestion.set_name,
+                suggestion.card_number,
+                suggestion.rarity,
+                suggestion.card_type,
+                suggestion.color,
+                suggestion.market_price,
+                suggestion.model_dump_json(),
+                now,
+            )
+            for suggestion in suggestions
+            if suggestion.product_url
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO cards (product_url, card_name, set_name, card_number, rarity, card_type, color, "
+                "market_price, payload, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (product_url) DO UPDATE SET card_name = excluded.card_name, "
+                "set_name = excluded.set_name, card_number = excluded.card_number, rarity = excluded.rarity, "
+                "card_type = excluded.card_type, color = excluded.color, market_price = excluded.market_price, "
+                "payload = excluded.payload, updated_at = excluded.updated_at",
+                rows,
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def record_query(self, query_text: str, total_results: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO catalog_queries (query_text, total_results, refreshed_at) VALUES (?, ?, ?)",
+                (normalize_query(query_text), total_results, time.time()),
+            )
+            self._conn.commit()
+
+    def query_state(self, query_text: str) -> tuple[int, float] | None:
+        """(total conocido en TCGplayer, momento del último refresco) o None si nunca se buscó en vivo."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT total_results, refreshed_at FROM catalog_queries WHERE query_text = ?",
+                (normalize_query(query_text),),
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def search(
+        self, query_text: str, page: int, page_size: int, filters: Search_filters | None = None
+    ) -> tuple[list[Search_suggestion], int, float | None]:
+        """
+        Página de resultados locales ordenada por relevancia (bm25). Devuelve las cartas, el total
+        local (después de aplicar `filters`) y el `updated_at` más viejo de la página (None si está vacía).
+        """
+        match_expression = build_match_expression(query_text)
+        if match_expression is None:
+            return [], 0, None
+        if filters is not None and not filters.is_empty():
+            return self._filtered_search(match_expression, page, page_size, Compiled_filters(filters))
+        with self._lock:
+            (total,) = self._conn.execute(
+                "SELECT COUNT(*) FROM cards_fts WHERE cards_fts MATCH ?", (match_expression,)
+            ).fetchone()
+            rows = self._conn.execute(
+                "SELECT cards.payload, cards.updated_at FROM cards_fts JOIN cards ON cards.id = cards_fts.rowid "
+                "WHERE cards_fts MATCH ? ORDER BY bm25(cards_fts), cards.card_name LIMIT ? OFFSET ?",
+                (match_expression, page_size, (page - 1) * page_size),
+            ).fetchall()
+        results = [Search_suggestion.model_validate(json.loads(payload)) for payload, _ in rows]
+        oldest = min((updated_at for _, updated_at in rows), default=None)
+        return results, total, oldest
+
+    def _facet_rows(self, match_expression: str) -> list[tuple]:
+        """(id, rareza, set, tipo, color, precio) de todas las cartas de la consulta, por relevancia."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT cards.id, cards.rarity, cards.set_name, cards.card_type, cards.color, cards.market_price "
+                "FROM cards_fts JOIN cards ON cards.id = cards_fts.rowid "
+                "WHERE cards_fts MATCH ? ORDER BY bm25(cards_fts), cards.card_name",
+                (match_expression,),
+            ).fetchall()
+
+    def _filtered_search(
+        self, match_expression: str, page: int, page_size: int, compiled: Compiled_filters
+    ) -> tuple[list[Search_suggestion], int, float | None]:
+        # Se filtra sobre las columnas (sin decodificar el JSON) y solo se leen los payloads de la página
+        matching_ids = [row[0] for row in self._facet_rows(match_expression) if compiled.matches(row[1:])]
+        page_ids = matching_ids[(page - 1) * page_size:page * page_size]
+        if not page_ids:
+            return [], len(matching_ids), None
+        placeholders = ", ".join("?" for _ in page_ids)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, payload, updated_at FROM cards WHERE id IN ({placeholders})", page_ids
+            ).fetchall()
+        by_id = {card_id: (payload, updated_at) for card_id, payload, updated_at in rows}
+        results = [Search_suggestion.model_validate(json.loads(by_id[card_id][0])) for card_id in page_ids if card_id in by_id]
+        oldest = min((updated_at for _, updated_at in by_id.values()), default=None)
+        return results, len(matching_ids), oldest
+
+    def facets(self, query_text: str, filters: Search_filters | None = None) -> Search_facets:
+        """Facetas de todas las cartas locales de la consulta (ver `search_filters.compute_facets`)."""
+        match_expression = build_match_expression(query_text)
+        rows = self._facet_rows(match_expression) if match_expression is not None else []
+        return compute_facets((row[1:] for row in rows), filters)
+
+    def count(self, query_text: str) -> int:
+        """Cartas locales de la consulta, sin filtros."""
+        match_expression = build_match_expression(query_text)
+        if match_expression is None:
+            return 0
+        with self._lock:
+            (total,) = self._conn.execute(
+                "SELECT COUNT(*) FROM cards_fts WHERE cards_fts MATCH ?", (match_expression,)
+            ).fetchone()
+        return total
+
+    def cards_by_number(self, card_number: str) -> list[Search_suggestion]:
+        """Todas las variantes locales de un número de carta (base, Parallel, Alternate Art...)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT payload FROM cards WHERE card_number = ? COLLATE NOCASE", (card_number,)
+            ).fetchall()
+        return [Search_suggestion.model_validate(json.loads(payload)) for (payload,) in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM cards").fetchone()
+        return count
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class Catalog_search:
+    """
+    Comentario: /api/suggestions sobre el catálogo local. `ttl` es la edad máxima del total conocido
+    de una consulta y `price_ttl` la de los precios de la página; pasado cualquiera de los dos, el
+    hit se sirve igual y se refresca en vivo en segundo plano. `live_search` debe llamar a `learn`
+    con lo que obtiene, así el catálogo crece con cualquier búsqueda en vivo. Las consultas
+    filtradas completan el catálogo con hasta `fill_pages` páginas mientras `is_busy` no lo impida.
+    """
+
+    def __init__(
+        self,
+        catalog: Card_catalog,
+        live_search: Callable[[str, int, int], Awaitable[Search_results_response]],
+        ttl: float,
+        price_ttl: float,
+        fill_pages: int = 0,
+        is_busy: Callable[[], bool] | None = None,
+    ) -> None:
+        self.catalog = catalog
+        self.live_search = live_search
+        self.ttl = ttl
+        self.price_ttl = price_ttl
+        self.fill_pages = fill_pages
+        self.is_busy = is_busy
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.filled_pages = 0
+        self._refreshing: dict[str, asyncio.Task] = {}
+        # Cuándo se completó cada consulta: no se vuelve a completar hasta pasado `ttl`
+        self._filled_at: dict[str, float] = {}
+
+    def learn(self, query_text: str, response: Search_results_response) -> None:
+        """Incorpora al catálogo lo obtenido en vivo para `query_text`."""
+        try:
+            self.catalog.upsert(response.results)
+            self.catalog.record_query(query_text, response.total_results)
+        except sqlite3.Error as e:
+            logger.warning(f"No se pudo actualizar el catálogo con '{query_text}': {e}")
+
+    async def is_known(self, query_text: str) -> bool:
+        """Si la consulta ya se buscó en vivo alguna vez."""
+        return await asyncio.to_thread(self.catalog.query_state, query_text) is not None
+
+    async def facets(self, query_text: str, filters: Search_filters | None = None) -> Search_facets:
+        return await asyncio.to_thread(self.catalog.facets, query_text, filters)
+
+    async def cached(
+        self,
+        query_text: str,
+        page: int,
+        page_size: int,
+        filters: Search_filters | None = None,
+        with_facets: bool = False,
+    ) -> Search_results_response | None:
+        """
+        Respuesta desde el catálogo o None si la consulta nunca se buscó en vivo o si la página pedida
+        no tiene resultados locales. Con filtros, None solo si la consulta no tiene ninguna carta local:
+        una página filtrada vacía es una respuesta válida.
+        """
+        hit = await self.lookup(query_text, page, page_size, filters, with_facets)
+        return hit[0] if hit is not None else None
+
+    async def lookup(
+        self,
+        query_text: str,
+        page: int,
+        page_size: int,
+        filters: Search_filters | None = None,
+        with_facets: bool = False,
+    ) -> tuple[Search_results_response, float] | None:
+        """Como `cached`, junto con los segundos de frescura que le quedan al hit (negativo si está vencido)."""
+        # El FTS5, los conteos y las facetas son SQLite bloqueante: corren en un hilo, fuera del event loop
+        found = await asyncio.to_thread(self._read_page, query_text, page, page_size, filters, with_facets)
+        if found is None:
+            self.misses += 1
+            return None
+        state, results, local_total, oldest, local_count, facets = found
+        self.hits += 1
+
+        now = time.time()
+        fresh_for = self.ttl - (now - state[1])
+        if oldest is not None:
+            fresh_for = min(fresh_for, self.price_ttl - (now - oldest))
+        if fresh_for < 0:
+            self._schedule_refresh(query_text, page, page_size)
+
+        if local_count is not None:
+            # El total filtrado solo se conoce sobre las cartas locales; si TCGplayer tiene más, se
+            # completan en segundo plano y las solicitudes siguientes ya las cuentan
+            total_results = local_total
+            if state[0] > local_count:
+                self._schedule_fill(query_text, state[0])
+        else:
+            # Si TCGplayer conoce más resultados que el catálogo, anunciamos su total: las páginas sin
+            # resultados locales serán misses y se buscarán en vivo
+            total_results = max(local_total, state[0])
+        total_pages = math.ceil(total_results / page_size) if total_results > 0 else 0
+        response = Search_results_response(
+            results=results,
+            total_results=total_results,
+            page=page,
+            page_size=page_size,
+            total_pages=total_pages,
+            has_next_page=page < total_pages,
+            has_previous_page=page > 1,
+            facets=facets,
+        )
+        return response, fresh_for
+
+    def _read_page(
+        self,
+        query_text: str,
+        page: int,
+        page_size: int,
+        filters: Search_filters | None,
+        with_facets: bool,
+    ) -> tuple | None:
+        """
+        Todas las lecturas de `lookup` en una llamada. Devuelve (estado de la consulta, resultados, total
+        local, precio más viejo, cartas locales de la consulta o None sin filtros, facetas o None), o
+        None si es un miss.
+        """
+        # Sin una búsqueda en vivo no sabemos cuántos resultados tiene TCGplayer: las cartas locales que
+        # coinciden por casualidad (p. ej. "luffy" tras buscar "monkey d luffy") no son la respuesta
+        state = self.catalog.query_state(query_text)
+        if state is None:
+            return None
+        filtered = filters is not None and not filters.is_empty()
+        results, local_total, oldest = self.catalog.search(query_text, page, page_size, filters)
+        local_count = self.catalog.count(query_text) if filtered else None
+        if not results and (not filtered or local_count == 0):
+            return None
+        facets = self.catalog.facets(query_text, filters) if with_facets else None
+        return state, results, local_total, oldest, local_count, facets
+
+    def _schedule_fill(self, query_text: str, upstream_total: int) -> None:
+        normalized = normalize_query(query_text)
+        key = f"{normalized}|fill"
+        if self.fill_pages <= 0 or key in self._refreshing:
+            return
+        if time.time() - self._filled_at.get(normalized, 0.0) < self.ttl:
+            return
+
+        async def fill() -> None:
+            try:
+                pages = min(self.fill_pages, math.ceil(upstream_total / FILL_PAGE_SIZE))
+                for page in range(1, pages + 1):
+                    if self.is_busy is not None and self.is_busy():
+                        return
+                    response = await self.live_search(query_text, page, FILL_PAGE_SIZE)
+                    self.filled_pages += 1
+                    if not response.has_next_page:
+                        break
+                self._filled_at[normalized] = time.time()
+            except Exception as e:
+                logger.warning(f"No se pudo completar el catálogo para '{query_text}': {e}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(fill())
+
+    def _schedule_refresh(self, query_text: str, page: int, page_size: int) -> None:
+        key = f"{normalize_query(query_text)}|{page}|{page_size}"
+        if key in self._refreshing:
+            return
+
+        async def refresh() -> None:
+            try:
+                await self.live_search(query_text, page, page_size)
+                self.refreshes += 1
+            except Exception as e:
+                logger.warning(f"Refresco del catálogo para '{query_text}' falló: {e}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(refresh())
+
+    async def close(self) -> None:
+        """Cancela los refrescos pendientes y cierra el catálogo."""
+        tasks = list(self._refreshing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.catalog.close()
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "cards": len(self.catalog),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "background_refreshes": self.refreshes,
+            "filled_pages": self.filled_pages,
+            "refreshing": len(self._refreshing),
+        }
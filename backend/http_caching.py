@@ -0,0 +1,193 @@
+"""
+Comentario: compresión y validación condicional de las respuestas del API, para que el navegador y
+un proxy inverso local absorban las solicitudes repetidas:
+
+- `conditional_json_response`: serializa la respuesta una sola vez y le pone un ETag fuerte (hash del
+  contenido) y un `Cache-Control` según la frescura de la caché de origen. Si el `If-None-Match`
+  de un GET coincide, responde `304 Not Modified` sin cuerpo.
+- `Compression_middleware`: comprime con brotli (si está instalado el paquete `brotli`) o gzip según
+  `Accept-Encoding`. No toca los streams (NDJSON y SSE), que tienen que llegar evento por evento, ni
+  las imágenes, que ya vienen comprimidas. La versión comprimida lleva el ETag con el sufijo de la
+  codificación (`"abc-gzip"`), como corresponde a otra representación; el `If-None-Match` acepta
+  ambas formas.
+"""
+import gzip
+import hashlib
+from email.utils import parsedate_to_datetime
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él se ofrece solo gzip
+    brotli = None
+
+NO_STORE = "no-store"
+# Respuestas que se envían a medida que se generan o que ya vienen comprimidas
+UNCOMPRESSED_CONTENT_TYPES = ("application/x-ndjson", "text/event-stream", "image/")
+# Codificaciones en orden de preferencia a igual calidad en `Accept-Encoding`
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def strong_etag(body: bytes) -> str:
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def _strip_encoding_suffix(tag: str) -> str:
+    for coding in ("br", "gzip"):
+        suffix = f'-{coding}"'
+        if tag.endswith(suffix):
+            return tag[: -len(suffix)] + '"'
+    return tag
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Comparación débil de `If-None-Match` (la que pide el estándar para GET), con o sin sufijo de codificación."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        _strip_encoding_suffix(tag.strip().removeprefix("W/")) == etag for tag in if_none_match.split(",")
+    )
+
+
+def not_modified(request: Request, etag: str, last_modified: float) -> bool:
+    """
+    Si la copia del cliente sigue vigente según `If-None-Match` o, si no lo trae, según
+    `If-Modified-Since` (fechas HTTP con resolución de segundos).
+    """
+    if request.method not in ("GET", "HEAD"):
+        return False
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if not if_modified_since:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return int(last_modified) <= since
+
+
+def cache_control(max_age: float, stale_while_revalidate: float = 0, stale_if_error: float = 0) -> str:
+    directives = ["public", f"max-age={max(0, int(max_age))}"]
+    if stale_while_revalidate > 0:
+        directives.append(f"stale-while-revalidate={int(stale_while_revalidate)}")
+    if stale_if_error > 0:
+        directives.append(f"stale-if-error={int(stale_if_error)}")
+    return ", ".join(directives)
+
+
+def conditional_json_response(request: Request, model: BaseModel, cache_control_value: str) -> Response:
+    """Respuesta JSON con ETag fuerte y `Cache-Control`; 304 si el GET trae un `If-None-Match` que coincide."""
+    body = model.model_dump_json().encode("utf-8")
+    etag = strong_etag(body)
+    headers = {"ETag": etag, "Cache-Control": cache_control_value}
+    # En otros métodos un If-None-Match que coincide no significa "usa tu copia" (RFC 9110, 13.1.2)
+    if request.method in ("GET", "HEAD") and etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    """La codificación soportada con mayor calidad en `Accept-Encoding`; None para enviar sin comprimir."""
+    qualities: dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip()] = quality
+    wildcard = qualities.get("*", 0.0)
+    best = None
+    best_quality = 0.0
+    for coding in SUPPORTED_ENCODINGS:
+        quality = qualities.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(body: bytes, coding: str, gzip_level: int = 6, brotli_quality: int = 5) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+def _echo_validated_etag(message: Message, if_none_match: str, coding: str) -> None:
+    """En un 304, el ETag de la representación comprimida si es la que el cliente revalidó."""
+    headers = MutableHeaders(raw=message["headers"])
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/") and f'{etag[:-1]}-{coding}"' in if_none_match:
+        headers["ETag"] = f'{etag[:-1]}-{coding}"'
+
+
+class Compression_middleware:
+    """Middleware ASGI de compresión para respuestas de al menos `minimum_size` bytes."""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1000, gzip_level: int = 6, brotli_quality: int = 5) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        coding = choose_encoding(request_headers.get("accept-encoding", ""))
+        start_message: Message | None = None
+        body_parts: list[bytes] = []
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if (
+                    "content-encoding" in headers
+                    or headers.get("content-type", "").startswith(UNCOMPRESSED_CONTENT_TYPES)
+                    or message["status"] in (204, 304)
+                    or message["status"] < 200
+                ):
+                    passthrough = True
+                    if message["status"] == 304 and coding is not None:
+                        _echo_validated_etag(message, request_headers.get("if-none-match", ""), coding)
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body_parts.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(body_parts)
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if coding is not None and len(body) >= self.minimum_size:
+                body = compress(body, coding, self.gzip_level, self.brotli_quality)
+                headers["Content-Encoding"] = coding
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = f'{etag[:-1]}-{coding}"'
+            headers["Content-Length"] = str(len(body))
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
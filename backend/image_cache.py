@@ -0,0 +1,245 @@
+"""
+Comentario: proxy local de las imágenes de las cartas. Cada grid de resultados pide 24-50 miniaturas
+al CDN de TCGplayer (`tcgplayer-cdn.tcgplayer.com/product/{id}_in_200x200.jpg`), casi siempre de
+las mismas pocas cientos de cartas populares; con `/api/images/{product_id}` el navegador las pide a
+este backend y solo la primera vez de cada carta sale una solicitud al CDN.
+
+Las imágenes se guardan en disco (`data/images/{product_id}.jpg`) en una caché LRU acotada en bytes:
+el orden de uso vive en memoria y se reconstruye al arrancar a partir de la fecha de acceso de los
+archivos, que se actualiza en cada acierto. Las descargas usan un `httpx.AsyncClient` con
+conexiones keep-alive, y las de una misma carta pedidas a la vez comparten una sola (`Single_flight`).
+Un producto que el CDN no tiene se recuerda un rato para no volver a pedirlo en cada render.
+Las imágenes entregadas en los últimos `EVICTION_GRACE_SECONDS` no se descartan aunque la caché pase
+del límite: `FileResponse` abre el archivo después de que `get` devuelve su ruta.
+
+Los archivos se sirven con `FileResponse` (rangos, `ETag` y `Last-Modified`); ver `/api/images` en
+`main.py`. No es zero-copy: uvicorn no usa `sendfile` y lee el archivo en bloques. Lo que se ahorra es
+el viaje al CDN; toda la E/S de disco de la caché corre en un hilo, fuera del event loop.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from single_flight import Single_flight
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SUFFIX = ".jpg"
+# Miniatura que usan los resultados de búsqueda (mismo tamaño que IMAGE_URL_TEMPLATE de card_parser)
+THUMBNAIL_PATH = "/product/{product_id}_in_200x200.jpg"
+# Productos sin imagen recordados como máximo (se olvidan primero los más viejos)
+MAX_MISSING_ENTRIES = 5000
+# Ventana en la que una imagen recién entregada todavía puede estar por abrirse o enviarse
+EVICTION_GRACE_SECONDS = 30.0
+
+
+class Image_not_found(LookupError):
+    """El CDN no tiene imagen para el producto (o respondió algo que no es una imagen)."""
+
+
+class Image_cache:
+    """Caché LRU en disco, acotada en bytes, de las miniaturas del CDN de TCGplayer."""
+
+    def __init__(
+        self,
+        directory: Path,
+        max_bytes: int,
+        cdn_url: str = "https://tcgplayer-cdn.tcgplayer.com",
+        timeout: float = 10.0,
+        max_connections: int = 20,
+        missing_ttl: float = 3600.0,
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.cdn_url = cdn_url.rstrip("/")
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.missing_ttl = missing_ttl
+        self.hits = 0
+        self.misses = 0
+        self.not_found = 0
+        self.errors = 0
+        self.evictions = 0
+        self.total_bytes = 0
+        self._entries: OrderedDict[int, int] = OrderedDict()
+        # Último uso de cada entrada (reloj monótono), en el mismo orden que `_entries`
+        self._used_at: dict[int, float] = {}
+        self._missing: dict[int, float] = {}
+        self._single_flight = Single_flight()
+        self._client: httpx.AsyncClient | None = None
+
+    async def start(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        await asyncio.to_thread(self._load_index)
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+            ),
+            headers={
+                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+                "Accept": "image/avif,image/webp,image/*,*/*;q=0.8",
+                "Referer": "https://www.tcgplayer.com/",
+            },
+        )
+
+    async def stop(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _load_index(self) -> None:
+        """Reconstruye el orden LRU con la fecha de acceso de los archivos (la más vieja primero)."""
+        files = []
+        for path in self.directory.glob(f"*{IMAGE_SUFFIX}"):
+            if not path.stem.isdigit():
+                continue
+            try:
+                stat_result = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat_result.st_atime, int(path.stem), stat_result.st_size))
+        self._entries.clear()
+        self._used_at.clear()
+        self.total_bytes = 0
+        for _, product_id, size in sorted(files):
+            self._entries[product_id] = size
+            self.total_bytes += size
+        self._unlink(self._evict())
+        logger.info(f"Caché de imágenes: {len(self._entries)} archivos, {self.total_bytes} bytes")
+
+    def path_for(self, product_id: int) -> Path:
+        return self.directory / f"{product_id}{IMAGE_SUFFIX}"
+
+    async def get(self, product_id: int) -> tuple[Path, os.stat_result]:
+        """
+        Ruta y `stat` de la miniatura en disco, descargándola si hace falta. Lanza Image_not_found si
+        el CDN no la tiene y `httpx.HTTPError` si el CDN falla.
+        """
+        if product_id in self._entries:
+            path = self.path_for(product_id)
+            try:
+                stat_result = await asyncio.to_thread(self._stat_and_touch, path)
+            except FileNotFoundError:
+                # Otro proceso de uvicorn que comparte el directorio lo descartó
+                self._forget(product_id)
+            else:
+                self._touch(product_id)
+                self.hits += 1
+                return path, stat_result
+
+        missing_since = self._missing.get(product_id)
+        if missing_since is not None:
+            if time.monotonic() - missing_since < self.missing_ttl:
+                raise Image_not_found(f"El CDN no tiene imagen para el producto {product_id}.")
+            del self._missing[product_id]
+
+        path = await self._single_flight.do(f"image|{product_id}", lambda: self._download(product_id))
+        try:
+            return path, await asyncio.to_thread(path.stat)
+        except FileNotFoundError:
+            # Otro proceso de uvicorn la descartó justo después de escribirla: se vuelve a descargar
+            self._forget(product_id)
+            path = await self._single_flight.do(f"image|{product_id}", lambda: self._download(product_id))
+            return path, await asyncio.to_thread(path.stat)
+
+    async def _download(self, product_id: int) -> Path:
+        if self._client is None:
+            raise RuntimeError("La caché de imágenes no está iniciada.")
+        self.misses += 1
+        try:
+            response = await self._client.get(self.cdn_url + THUMBNAIL_PATH.format(product_id=product_id))
+        except httpx.HTTPError:
+            self.errors += 1
+            raise
+        content_type = response.headers.get("content-type", "")
+        if response.status_code in (403, 404) or (response.is_success and not content_type.startswith("image/")):
+            self.not_found += 1
+            self._missing[product_id] = time.monotonic()
+            while len(self._missing) > MAX_MISSING_ENTRIES:
+                del self._missing[next(iter(self._missing))]
+            raise Image_not_found(f"El CDN no tiene imagen para el producto {product_id}.")
+        if not response.is_success:
+            self.errors += 1
+            response.raise_for_status()
+
+        path = self.path_for(product_id)
+        await asyncio.to_thread(self._write, path, response.content)
+        if product_id in self._entries:
+            self.total_bytes -= self._entries[product_id]
+        self._entries[product_id] = len(response.content)
+        self._touch(product_id)
+        self.total_bytes += len(response.content)
+        evicted = self._evict()
+        if evicted:
+            await asyncio.to_thread(self._unlink, evicted)
+        return path
+
+    @staticmethod
+    def _stat_and_touch(path: Path) -> os.stat_result:
+        stat_result = path.stat()
+        # La fecha de acceso deja persistido el orden LRU para el próximo arranque; la de
+        # modificación no se toca porque de ella salen el ETag y el Last-Modified
+        os.utime(path, (time.time(), stat_result.st_mtime))
+        return stat_result
+
+    @staticmethod
+    def _write(path: Path, body: bytes) -> None:
+        # Escritura atómica: quien sirve el archivo nunca ve una imagen a medias
+        temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        temp_path.write_bytes(body)
+        os.replace(temp_path, path)
+        # Misma fuente de tiempo que los aciertos, para que el orden LRU del próximo arranque sea exacto
+        os.utime(path, (time.time(), path.stat().st_mtime))
+
+    def _touch(self, product_id: int) -> None:
+        self._entries.move_to_end(product_id)
+        self._used_at[product_id] = time.monotonic()
+
+    def _forget(self, product_id: int) -> None:
+        size = self._entries.pop(product_id, None)
+        self._used_at.pop(product_id, None)
+        if size is not None:
+            self.total_bytes -= size
+
+    def _evict(self) -> list[Path]:
+        """Saca del índice las entradas que sobran y devuelve sus archivos, que borra quien llama."""
+        # Nunca se descarta la última entrada, que es la que se acaba de pedir. El orden LRU es el de
+        # uso, así que si la más vieja se entregó hace poco, todas las demás también
+        grace_start = time.monotonic() - EVICTION_GRACE_SECONDS
+        evicted = []
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            product_id = next(iter(self._entries))
+            if self._used_at.get(product_id, float("-inf")) > grace_start:
+                break
+            self._forget(product_id)
+            self.evictions += 1
+            evicted.append(self.path_for(product_id))
+        return evicted
+
+    @staticmethod
+    def _unlink(paths: list[Path]) -> None:
+        for path in paths:
+            path.unlink(missing_ok=True)
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "not_found": self.not_found,
+            "errors": self.errors,
+            "evictions": self.evictions,
+            "in_flight": self._single_flight.stats()["in_flight"],
+        }
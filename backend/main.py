@@ -1,13 +1,41 @@
-from typing import Any
+from contextlib import asynccontextmanager
+from typing import Annotated, Any, AsyncIterator
 import asyncio
+import json
 import logging
-from concurrent.futures import ThreadPoolExecutor
-from urllib.parse import quote_plus
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Path, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from playwright.sync_api import sync_playwright
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
+
+from batch_pricing import price_batch
+from cache import Swr_cache, create_cache_backend, price_cache_key, search_cache_key
+from catalog import Card_catalog, Catalog_search
+from http_caching import NO_STORE, Compression_middleware, cache_control, conditional_json_response, not_modified
+from image_cache import THUMBNAIL_PATH, Image_cache, Image_not_found
+from memory_governor import MIB
+from metrics import METRICS_CONTENT_TYPE, Metric_family, metrics_registry
+from models import (
+    Batch_price_request,
+    Batch_price_response,
+    Card_price,
+    Card_query,
+    Price_history_response,
+    Search_filters,
+    Search_results_response,
+    Search_stream_summary,
+)
+from prefetch import Search_prefetcher
+from product_index import Product_index
+from price_history import Price_history_store
+from readiness import readiness_stats
+from refresh_scheduler import Refresh_scheduler
+from scrape_engine import create_scrape_engine
+from scraper import empty_search_results
+from search_filters import compute_facets, facet_row, filter_results
+from settings import settings
+from single_flight import Single_flight
+from upstream_governor import BREAKER_CLOSED, Upstream_unavailable
 
 # Configurar logging para debugging
 logging.basicConfig(
@@ -16,43 +44,225 @@ logging.basicConfig(
 )
 
 
-class Card_query(BaseModel):
-    card_name: str = Field(..., max_length=120)
-    set_name: str = Field("", max_length=120)  # Ahora es opcional
-    is_foil: bool = False
+# Comentario: motor de scraping compartido por ambos endpoints. Por defecto usa Playwright
+# asíncrono sobre el event loop de uvicorn con un semáforo de concurrencia; con
+# OPTCG_SCRAPE_ENGINE=sync usa el pool de hilos con la API síncrona (opción para Windows).
+_scrape_engine = create_scrape_engine(settings)
+
+# Comentario: caché de precios con stale-while-revalidate. Las cartas populares se sirven al
+# instante y se refrescan en segundo plano cuando vencen; si TCGplayer falla o el circuito está
+# abierto, se sirve el último precio conocido hasta `stale_if_error` segundos más.
+_price_cache: Swr_cache[Card_price] = Swr_cache(
+    create_cache_backend(
+        settings.price_cache_backend,
+        settings.data_dir / "price_cache",
+        settings.price_cache_max_entries,
+    ),
+    Card_price,
+    ttl=settings.price_cache_ttl,
+    stale_ttl=settings.price_cache_stale_ttl,
+    stale_if_error=settings.stale_if_error,
+)
+
+
+# Comentario: caché de páginas de búsqueda en vivo (clave: texto, página y tamaño). Evita repetir
+# búsquedas idénticas y es donde el prefetch deja las páginas siguientes.
+_search_cache: Swr_cache[Search_results_response] = Swr_cache(
+    create_cache_backend(
+        settings.price_cache_backend,
+        settings.data_dir / "search_cache",
+        settings.search_cache_max_entries,
+    ),
+    Search_results_response,
+    ttl=settings.search_cache_ttl,
+    stale_ttl=0,
+    stale_if_error=settings.stale_if_error,
+)
+
+# Comentario: coalescencia de scrapes idénticos concurrentes (misma carta o misma búsqueda y página)
+_single_flight = Single_flight()
+
+
+def upstream_degraded() -> bool:
+    """Verdadero si el circuito hacia TCGplayer no está cerrado: no conviene generar tráfico opcional."""
+    governor_stats = _scrape_engine.stats().get("governor")
+    return governor_stats is not None and governor_stats["breaker_state"] != BREAKER_CLOSED
+
+
+def engine_under_pressure() -> bool:
+    """
+    Verdadero si el motor tiene toda su capacidad ocupada (en curso + en cola), si sus navegadores
+    agotaron el presupuesto de memoria o si TCGplayer está fallando.
+    """
+    engine_stats = _scrape_engine.stats()
+    if upstream_degraded():
+        return True
+    memory_stats = (engine_stats.get("pool") or {}).get("memory")
+    if memory_stats is not None and memory_stats["over_budget"]:
+        return True
+    return engine_stats["queued"] + engine_stats["in_flight"] >= engine_stats["concurrency"]
+
+
+# Comentario: histórico de todos los precios observados en scrapes, por producto y foil
+_price_history: Price_history_store | None = None
+if settings.price_history_enabled:
+    _price_history = Price_history_store(
+        settings.data_dir / "price_history.sqlite3",
+        min_interval=settings.price_history_min_interval,
+    )
+
+
+async def record_search_results(query_text: str, response: Search_results_response) -> None:
+    """Alimenta el catálogo, el mapa de números de carta y el histórico de precios con una búsqueda hecha en vivo."""
+    _product_index.learn(response.results)
+    await asyncio.to_thread(store_search_results, query_text, response)
+
+
+def store_search_results(query_text: str, response: Search_results_response) -> None:
+    """Escrituras SQLite de `record_search_results`: corre en un hilo, con una transacción por tabla y página."""
+    if _catalog_search is not None:
+        _catalog_search.learn(query_text, response)
+    if _price_history is not None:
+        try:
+            _price_history.record_suggestions(response.results)
+        except Exception as exc:
+            logging.getLogger(__name__).warning(f"No se pudo guardar el histórico de '{query_text}': {exc}")
+
+
+async def fetch_search_from_tcgplayer(query_text: str, page: int, page_size: int) -> Search_results_response:
+    """
+    Búsqueda en vivo: si esa página se está precargando espera ese scrape; si no, las búsquedas
+    idénticas simultáneas comparten uno solo. El resultado alimenta el catálogo y el histórico.
+    """
+    key = search_cache_key(query_text, page, page_size)
+    prefetch_task = _search_prefetcher.join(key) if _search_prefetcher is not None else None
+    if prefetch_task is not None:
+        return await asyncio.shield(prefetch_task)
+    if _search_prefetcher is not None and engine_under_pressure():
+        # El tráfico real tiene prioridad sobre la especulación
+        _search_prefetcher.shed()
+    response = await _single_flight.do(key, lambda: _scrape_engine.search(query_text, page, page_size))
+    await record_search_results(query_text, response)
+    return response
+
+
+async def get_search_suggestions(query_text: str, page: int = 1, page_size: int = 24) -> Search_results_response:
+    """Wrapper asíncrono para obtener sugerencias con paginación, pasando por la caché de búsquedas."""
+    key = search_cache_key(query_text, page, page_size)
+    if _search_prefetcher is not None:
+        _search_prefetcher.note_lookup(key)
+    return await _search_cache.get_or_fetch(key, lambda: fetch_search_from_tcgplayer(query_text, page, page_size))
+
+
+async def note_catalog_page(query_text: str, page: int, page_size: int, total_pages: int) -> None:
+    """
+    Página servida desde el catálogo: las precargadas también lo alimentan, así que llegan por aquí.
+    Si era un prefetch cuenta como usado y se sigue precargando la siguiente, igual que en vivo.
+    """
+    if _search_prefetcher is None:
+        return
+    if _search_prefetcher.note_lookup(search_cache_key(query_text, page, page_size)):
+        await _search_prefetcher.after_served(query_text, page, page_size, total_pages)
+
+
+async def store_prefetched_page(query_text: str, page: int, page_size: int, response: Search_results_response) -> None:
+    await _search_cache.put(search_cache_key(query_text, page, page_size), response)
+    await record_search_results(query_text, response)
+
+
+async def is_search_cached(key: str) -> bool:
+    cached = await _search_cache.peek(key)
+    return cached is not None and cached[1] < _search_cache.ttl
+
+
+# Comentario: prefetch especulativo de las páginas siguientes de una búsqueda servida en vivo
+_search_prefetcher: Search_prefetcher | None = None
+if settings.prefetch_depth > 0 and settings.search_cache_ttl > 0:
+    _search_prefetcher = Search_prefetcher(
+        fetch_page=lambda query_text, page, page_size: _scrape_engine.search(query_text, page, page_size),
+        store=store_prefetched_page,
+        is_cached=is_search_cached,
+        is_under_pressure=engine_under_pressure,
+        ttl=settings.search_cache_ttl,
+        depth=settings.prefetch_depth,
+        concurrency=settings.prefetch_concurrency,
+    )
+
+
+# Comentario: catálogo local de cartas con índice de texto completo. /api/suggestions responde desde
+# aquí en milisegundos y solo va a TCGplayer en los misses o para refrescar en segundo plano.
+_catalog_search: Catalog_search | None = None
+if settings.catalog_enabled:
+    _catalog_search = Catalog_search(
+        Card_catalog(settings.data_dir / "catalog.sqlite3"),
+        live_search=get_search_suggestions,
+        ttl=settings.catalog_ttl,
+        price_ttl=settings.catalog_price_ttl,
+        fill_pages=settings.catalog_fill_pages,
+        is_busy=engine_under_pressure,
+    )
 
+# Comentario: número de carta (OP05-119) y variante -> ID de producto de TCGplayer, para que
+# /api/price consulte exactamente ese producto en una sola solicitud
+_product_index = Product_index(
+    search=get_search_suggestions,
+    catalog=_catalog_search.catalog if _catalog_search is not None else None,
+)
 
-class Search_suggestion(BaseModel):
-    text: str
-    card_name: str
-    set_name: str | None = None
-    product_line: str | None = None
-    image_url: str | None = None
-    product_url: str | None = None
-    market_price: float | None = None
-    rarity: str | None = None
-    card_number: str | None = None
-    card_type: str | None = None  # Leader, Character, Event, Stage, etc.
-    color: str | None = None  # RED, BLUE, GREEN, PURPLE, YELLOW, BLACK
+
+# Comentario: proxy local de las miniaturas de las cartas, con caché LRU en disco acotada en bytes
+_image_cache: Image_cache | None = None
+if settings.image_cache_enabled:
+    _image_cache = Image_cache(
+        settings.data_dir / "images",
+        max_bytes=settings.image_cache_max_mb * 1024 * 1024,
+        cdn_url=settings.image_cdn_url,
+        timeout=settings.http_timeout,
+        max_connections=settings.http_max_connections,
+    )
 
 
-class Search_results_response(BaseModel):
-    results: list[Search_suggestion]
-    total_results: int
-    page: int
-    page_size: int
-    total_pages: int
-    has_next_page: bool
-    has_previous_page: bool
+# Comentario: refresco proactivo de las cartas y búsquedas más pedidas antes de que venzan, para que
+# las solicitudes en vivo encuentren datos frescos. Cede el paso si el motor tiene scrapes en cola
+# o si el circuito hacia TCGplayer está abierto.
+# Fracción del TTL tras la que una entrada se refresca: antes de que la caché la dé por vencida
+SCHEDULER_REFRESH_FRACTION = 0.8
+_refresh_scheduler: Refresh_scheduler | None = None
+if settings.scheduler_enabled and settings.price_cache_ttl > 0:
+    _refresh_scheduler = Refresh_scheduler(
+        workers=settings.scheduler_workers,
+        rate_per_minute=settings.scheduler_rate_per_minute,
+        interval=settings.scheduler_interval,
+        max_entries=settings.scheduler_max_entries,
+        half_life=settings.scheduler_half_life,
+        is_busy=lambda: upstream_degraded() or _scrape_engine.stats()["queued"] > 0,
+    )
 
 
-class Card_price(BaseModel):
-    card_name: str
-    set_name: str
-    is_foil: bool
-    market_price: float
-    currency: str = "USD"
-    source_url: str
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Arranca el motor de scraping al iniciar el servidor; al apagarlo cancela los refrescos de caché y drena los navegadores."""
+    await _scrape_engine.start()
+    if _image_cache is not None:
+        await _image_cache.start()
+    if _refresh_scheduler is not None:
+        await _refresh_scheduler.start()
+    try:
+        yield
+    finally:
+        if _refresh_scheduler is not None:
+            await _refresh_scheduler.stop()
+        if _search_prefetcher is not None:
+            await _search_prefetcher.close()
+        await _price_cache.close()
+        await _search_cache.close()
+        if _catalog_search is not None:
+            await _catalog_search.close()
+        if _price_history is not None:
+            _price_history.close()
+        if _image_cache is not None:
+            await _image_cache.stop()
+        await _scrape_engine.stop()
 
 
 app = FastAPI(
@@ -62,6 +272,7 @@ app = FastAPI(
         "API para consultar precios de cartas de One Piece TCG desde TCGplayer, "
         "utilizando Playwright para navegar la web."
     ),
+    lifespan=lifespan,
 )
 
 # Comentario: habilitamos CORS para permitir que el frontend de Angular (localhost:4200)
@@ -74,645 +285,556 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    # El frontend lee el ETag para revalidar con If-None-Match
+    expose_headers=["ETag"],
 )
 
+# Comentario: compresión gzip/brotli de las respuestas; los streams y las imágenes se envían tal cual
+if settings.compression_enabled:
+    app.add_middleware(Compression_middleware, minimum_size=settings.compression_min_size)
+
 
-def extract_market_price_from_page_sync(page) -> float:
+async def fetch_card_price_from_tcgplayer(query: Card_query) -> Card_price:
     """
-    Comentario: esta función encapsula la lógica de scraping para facilitar ajustes
-    cuando cambie la estructura de TCGplayer. Primero intentamos leer el precio de mercado
-    directamente desde la tarjeta de producto en la vista de grid.
-    Basado en pruebas con MCP de Playwright que confirmaron el selector exacto.
+    Comentario: wrapper asíncrono que delega en el motor de scraping configurado.
+    El motor limita la concurrencia y registra la espera en cola de cada solicitud; las
+    consultas idénticas simultáneas comparten un único scrape.
     """
-    import re
-    import logging
-
-    logger = logging.getLogger(__name__)
+    price = await _single_flight.do(
+        price_cache_key(query),
+        lambda: _scrape_engine.fetch_card_price(query),
+    )
+    if _price_history is not None:
+        try:
+            await asyncio.to_thread(_price_history.record_price, price)
+        except Exception as exc:
+            logging.getLogger(__name__).warning(f"No se pudo guardar el histórico de '{query.card_name}': {exc}")
+    return price
 
-    # Esperamos a que aparezcan las tarjetas de producto primero (más confiable)
-    # Luego esperamos específicamente el selector del precio
-    try:
-        logger.info("Esperando tarjetas de producto...")
-        page.wait_for_selector('[class*="product-card"]', timeout=15000)
-        logger.info("Tarjetas de producto encontradas")
-        
-        # Ahora esperamos específicamente el selector del precio
-        logger.info("Esperando selector de precio...")
-        page.wait_for_selector(".product-card__market-price--value", timeout=10000)
-        logger.info("Selector de precio encontrado")
-    except Exception as e:
-        # Si no aparece, esperamos un poco más y continuamos
-        logger.warning(f"Timeout esperando selectores: {e}, esperando 5s más...")
-        page.wait_for_timeout(5000)
-
-    # 1) Selector principal descubierto con MCP de Playwright para Monkey.D.Luffy OP05-119
-    # Confirmado: existe y funciona, formato: <span class="product-card__market-price--value">$3.78</span>
-    primary_selector = ".product-card__market-price--value"
-    
-    price_element = page.query_selector(primary_selector)
-    if price_element:
-        text = price_element.inner_text() or ""
-        logger.info(f"Texto encontrado con selector principal: '{text}'")
-        if "$" in text:
-            cleaned = text.replace("$", "").replace(",", "").strip()
-            price_match = re.search(r"(\d+\.?\d*)", cleaned)
-            if price_match:
-                try:
-                    price_val = float(price_match.group(1))
-                    if 0.01 <= price_val <= 100000:  # Rango ampliado para cartas raras
-                        logger.info(f"Precio extraído exitosamente: ${price_val}")
-                        return price_val
-                except ValueError as e:
-                    logger.warning(f"Error al convertir precio '{cleaned}': {e}")
-
-    # Fallback: selector alternativo con contexto completo
-    fallback_selector = "section.product-card__market-price span.product-card__market-price--value"
-    price_element = page.query_selector(fallback_selector)
-    if price_element:
-        text = price_element.inner_text() or ""
-        logger.info(f"Texto encontrado con selector fallback: '{text}'")
-        if "$" in text:
-            cleaned = text.replace("$", "").replace(",", "").strip()
-            price_match = re.search(r"(\d+\.?\d*)", cleaned)
-            if price_match:
-                try:
-                    price_val = float(price_match.group(1))
-                    if 0.01 <= price_val <= 100000:
-                        logger.info(f"Precio extraído con fallback: ${price_val}")
-                        return price_val
-                except ValueError as e:
-                    logger.warning(f"Error al convertir precio fallback '{cleaned}': {e}")
-
-    # Fallback adicional: buscar cualquier span con la clase (hay múltiples resultados)
-    price_elements = page.query_selector_all("span.product-card__market-price--value")
-    logger.info(f"Encontrados {len(price_elements)} elementos de precio en la página")
-    for idx, element in enumerate(price_elements):
-        text = element.inner_text() or ""
-        if "$" in text:
-            cleaned = text.replace("$", "").replace(",", "").strip()
-            price_match = re.search(r"(\d+\.?\d*)", cleaned)
-            if price_match:
-                try:
-                    price_val = float(price_match.group(1))
-                    if 0.01 <= price_val <= 100000:
-                        logger.info(f"Precio extraído del elemento #{idx + 1}: ${price_val}")
-                        return price_val
-                except ValueError as e:
-                    logger.warning(f"Error al convertir precio del elemento #{idx + 1} '{cleaned}': {e}")
-                    continue
-
-    # Último fallback: buscar patrones de precio en toda la página
-    page_text = page.inner_text("body")
-    price_patterns = [
-        r"\$(\d+\.?\d*)",  # $12.50
-        r"(\d+\.?\d*)\s*USD",  # 12.50 USD
-    ]
 
-    for pattern in price_patterns:
-        matches = re.findall(pattern, page_text)
-        logger.info(f"Patrón '{pattern}' encontró {len(matches)} coincidencias")
-        for match in matches:
-            try:
-                price_val = float(match)
-                if 0.01 <= price_val <= 100000:
-                    logger.info(f"Precio extraído con patrón regex: ${price_val}")
-                    return price_val
-            except (ValueError, IndexError) as e:
-                logger.warning(f"Error al procesar match '{match}': {e}")
-                continue
-
-    # Si llegamos aquí, no encontramos ningún precio válido
-    logger.error("No se pudo extraer ningún precio de la página")
-    raise ValueError(
-        "No se encontró un precio de mercado reconocible en la página de resultados."
+async def get_cached_card_price(query: Card_query) -> Card_price:
+    """Precio de una carta pasando por la caché de precios (stale-while-revalidate)."""
+    return await _price_cache.get_or_fetch(
+        price_cache_key(query),
+        lambda: fetch_card_price_from_tcgplayer(query),
     )
 
 
-def fetch_card_price_from_tcgplayer_sync(query: Card_query) -> Card_price:
-    """
-    Comentario: esta función abre la vista de grid de productos de One Piece TCG en TCGplayer
-    y extrae el precio de mercado directamente de la primera tarjeta de producto que coincida
-    con el criterio de búsqueda.
-    """
-    import logging
+async def refresh_card_price(query: Card_query) -> float:
+    """Vuelve a scrapear el precio y lo guarda en la caché (usado por el planificador)."""
+    price = await fetch_card_price_from_tcgplayer(query)
+    await _price_cache.put(price_cache_key(query), price)
+    return price.market_price
 
-    logger = logging.getLogger(__name__)
 
-    # Comentario: usamos la búsqueda general de TCGplayer que es más efectiva
-    # basado en la exploración con MCP de Playwright para Monkey.D.Luffy OP05-119
-    base_url = "https://www.tcgplayer.com/search/all/product"
-    
-    # Construir términos de búsqueda: si hay set_name, incluirlo; si no, solo el nombre
-    if query.set_name and query.set_name.strip():
-        search_terms = f"{query.card_name} {query.set_name}"
-    else:
-        search_terms = query.card_name
-    
-    if query.is_foil:
-        search_terms += " foil"
-
-    # Formato de URL descubierto con MCP: ?q=nombre+set&view=grid
-    search_url = f"{base_url}?q={quote_plus(search_terms)}&view=grid"
-    logger.info(f"Buscando carta: {query.card_name} - {query.set_name or '(sin set)'} (foil: {query.is_foil})")
-    logger.info(f"URL de búsqueda: {search_url}")
-
-    with sync_playwright() as p:
-        # Usar un contexto de navegador con configuración más permisiva
-        browser = p.chromium.launch(
-            headless=True,
-            args=[
-                "--disable-blink-features=AutomationControlled",
-                "--disable-dev-shm-usage",
-                "--no-sandbox",
-            ]
+async def refresh_search(query_text: str, page: int, page_size: int) -> None:
+    """Vuelve a buscar en vivo; el resultado actualiza la caché de búsquedas y el catálogo (usado por el planificador)."""
+    response = await fetch_search_from_tcgplayer(query_text, page, page_size)
+    await _search_cache.put(search_cache_key(query_text, page, page_size), response)
+
+
+def observe_card_price(query: Card_query, price: Card_price) -> None:
+    if _refresh_scheduler is not None:
+        _refresh_scheduler.observe(
+            price_cache_key(query),
+            lambda: refresh_card_price(query),
+            refresh_after=settings.price_cache_ttl * SCHEDULER_REFRESH_FRACTION,
+            price=price.market_price,
         )
-        try:
-            # Crear contexto con viewport y user agent realista
-            context = browser.new_context(
-                viewport={"width": 1920, "height": 1080},
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-            )
-            page = context.new_page()
-            
-            logger.info("Navegando a TCGplayer...")
-            page.goto(search_url, wait_until="domcontentloaded", timeout=30000)
-            
-            # Esperar a que aparezca el contenido de productos (más confiable que networkidle)
-            logger.info("Esperando a que cargue el contenido de productos...")
-            try:
-                # Esperar a que aparezcan las tarjetas de producto
-                page.wait_for_selector('[class*="product-card"]', timeout=15000)
-                logger.info("Tarjetas de producto detectadas")
-            except Exception as e:
-                logger.warning(f"Timeout esperando tarjetas de producto: {e}")
-            
-            # Esperar un poco más para que JavaScript termine de renderizar los precios
-            page.wait_for_timeout(2000)
-            
-            # Intentar cerrar banner de cookies si aparece
-            try:
-                cookie_button = page.query_selector('button:has-text("Allow All"), button:has-text("Accept")')
-                if cookie_button:
-                    logger.info("Cerrando banner de cookies...")
-                    cookie_button.click()
-                    page.wait_for_timeout(1000)
-            except Exception:
-                pass  # Si no hay banner, continuar
-            
-            logger.info("Extrayendo precio...")
-            market_price = extract_market_price_from_page_sync(page)
-
-            logger.info(f"Precio encontrado: ${market_price}")
-            return Card_price(
-                card_name=query.card_name,
-                set_name=query.set_name,
-                is_foil=query.is_foil,
-                market_price=market_price,
-                source_url=search_url,
-            )
-        finally:
-            context.close()
-            browser.close()
-            logger.info("Navegador cerrado")
 
 
-# Comentario: creamos un thread pool executor para ejecutar Playwright de forma síncrona
-# sin bloquear el event loop de asyncio. Esto evita problemas con ProactorEventLoop en Windows.
-_executor = ThreadPoolExecutor(max_workers=2)
+async def observe_search(query_text: str, page: int, page_size: int) -> None:
+    # Sin catálogo no hay dónde guardar una búsqueda refrescada; los prefijos que solo se sirvieron
+    # desde el catálogo tampoco se siguen, para no scrapear cada tecla
+    if _refresh_scheduler is not None and _catalog_search is not None and await _catalog_search.is_known(query_text):
+        _refresh_scheduler.observe(
+            search_cache_key(query_text, page, page_size),
+            lambda: refresh_search(query_text, page, page_size),
+            refresh_after=settings.catalog_price_ttl * SCHEDULER_REFRESH_FRACTION,
+        )
 
 
-async def fetch_card_price_from_tcgplayer(query: Card_query) -> Card_price:
-    """
-    Comentario: wrapper asíncrono que ejecuta la función síncrona de Playwright en un thread pool.
-    Esto resuelve el problema de NotImplementedError con asyncio en Windows.
-    """
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(_executor, fetch_card_price_from_tcgplayer_sync, query)
+# Página en vivo que se busca para una consulta filtrada que el catálogo no conoce (el máximo del API)
+FILTER_SOURCE_PAGE_SIZE = 50
 
 
-def get_search_suggestions_sync(query_text: str, page: int = 1, page_size: int = 24) -> Search_results_response:
+async def get_filtered_suggestions(
+    query_text: str, page: int, page_size: int, filters: Search_filters, with_facets: bool
+) -> tuple[Search_results_response, float]:
     """
-    Obtiene sugerencias de búsqueda de TCGplayer extrayendo información completa
-    de las tarjetas de producto incluyendo imágenes, precios y detalles.
-    Implementa paginación para devolver siempre la misma cantidad de resultados.
+    Consulta filtrada sin cartas locales: busca en vivo una página grande y filtra sobre el catálogo
+    que acaba de aprender; sin catálogo, filtra en memoria lo que trajo esa página. Devuelve también
+    los segundos de frescura que le quedan a la respuesta.
     """
-    import logging
-    import re
-    import math
-    logger = logging.getLogger(__name__)
-    
-    if not query_text or len(query_text.strip()) < 2:
-        return Search_results_response(
-            results=[],
-            total_results=0,
-            page=page,
-            page_size=page_size,
-            total_pages=0,
-            has_next_page=False,
-            has_previous_page=False
-        )
-    
-    # Usar la URL específica de One Piece Card Game para obtener los mismos resultados que TCGplayer
-    base_url = "https://www.tcgplayer.com/search/one-piece-card-game/product"
-    # TCGplayer usa parámetro ?page=N para paginación
-    search_url = f"{base_url}?q={quote_plus(query_text)}&view=grid&page={page}"
-    
-    suggestions = []
-    total_results_from_page = None  # Variable para almacenar el total extraído del heading
-    
-    with sync_playwright() as p:
-        browser = p.chromium.launch(
-            headless=True,
-            args=[
-                "--disable-blink-features=AutomationControlled",
-                "--disable-dev-shm-usage",
-                "--no-sandbox",
-            ]
-        )
-        try:
-            context = browser.new_context(
-                viewport={"width": 1920, "height": 1080},
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-            )
-            browser_page = context.new_page()
-            
-            browser_page.goto(search_url, wait_until="domcontentloaded", timeout=20000)
-            
-            # Esperar a que aparezcan las tarjetas de producto
-            try:
-                browser_page.wait_for_selector('a[href*="/product/"]', timeout=10000)
-            except Exception:
-                pass
-            
-            # Intentar cerrar banner de cookies
-            try:
-                cookie_button = browser_page.query_selector('button:has-text("Allow All"), button:has-text("Accept")')
-                if cookie_button:
-                    cookie_button.click()
-                    browser_page.wait_for_timeout(1000)
-            except Exception:
-                pass
-            
-            # Esperar un poco más para que las imágenes se carguen
-            browser_page.wait_for_timeout(2000)
-            
-            # Intentar extraer el total de resultados desde el heading
-            try:
-                heading_element = browser_page.query_selector('h1')
-                if heading_element:
-                    heading_text = heading_element.inner_text()
-                    # Buscar patrón como "111 results for: "law" in One Piece Card Game"
-                    match = re.search(r'(\d+)\s+results', heading_text)
-                    if match:
-                        total_results_from_page = int(match.group(1))
-                        logger.info(f"Total de resultados encontrado en la página: {total_results_from_page}")
-            except Exception as e:
-                logger.debug(f"No se pudo extraer el total de resultados del heading: {e}")
-            
-            # Hacer scroll para cargar más contenido dinámico (lazy loading)
-            # TCGplayer carga contenido mientras haces scroll
-            browser_page.evaluate("""
-                () => {
-                    window.scrollTo(0, document.body.scrollHeight);
-                }
-            """)
-            browser_page.wait_for_timeout(2000)  # Esperar a que cargue contenido adicional
-            
-            # Scroll hacia arriba para asegurar que todo esté visible
-            browser_page.evaluate("""
-                () => {
-                    window.scrollTo(0, 0);
-                }
-            """)
-            browser_page.wait_for_timeout(1000)
-            
-            # Buscar tarjetas de producto (no sugerencias del autocompletado, sino resultados reales)
-            # Obtener TODAS las tarjetas de producto primero
-            all_product_cards = browser_page.query_selector_all('a[href*="/product/"]')
-            
-            # Filtrar solo las de One Piece Card Game
-            product_cards = [card for card in all_product_cards if 'one-piece' in (card.get_attribute('href') or '').lower()]
-            
-            logger.info(f"Encontradas {len(product_cards)} tarjetas de One Piece en la página {page} (de {len(all_product_cards)} totales)")
-            
-            seen_products = set()
-            # Procesar TODOS los resultados de One Piece encontrados (sin límite artificial)
-            for card in product_cards:
-                try:
-                    # Extraer URL del producto
-                    product_href = card.get_attribute('href')
-                    if not product_href or product_href in seen_products:
-                        continue
-                    
-                    # Extraer ID del producto de la URL (ej: /product/615592/...)
-                    product_id_match = re.search(r'/product/(\d+)/', product_href)
-                    if not product_id_match:
-                        continue
-                    
-                    product_id = product_id_match.group(1)
-                    seen_products.add(product_href)
-                    
-                    # Construir URL completa del producto
-                    product_url = f"https://www.tcgplayer.com{product_href}" if product_href.startswith('/') else product_href
-                    
-                    # Construir URL de la imagen (formato descubierto con MCP)
-                    image_url = f"https://tcgplayer-cdn.tcgplayer.com/product/{product_id}_in_200x200.jpg"
-                    
-                    # Extraer información del texto de la tarjeta
-                    card_text = card.inner_text().strip()
-                    
-                    # También obtener el texto del título/heading para capturar mejor las variantes
-                    title_element = card.query_selector('h4, h3, .product-card__title, [class*="title"]')
-                    title_text = title_element.inner_text().strip() if title_element else ""
-                    
-                    # Buscar imagen dentro de la tarjeta para verificar y obtener alt
-                    img_element = card.query_selector('img')
-                    img_alt = None
-                    if img_element:
-                        img_src = img_element.get_attribute('src')
-                        if img_src and 'tcgplayer-cdn' in img_src:
-                            image_url = img_src
-                        img_alt = img_element.get_attribute('alt') or img_element.get_attribute('title') or ""
-                    
-                    # Extraer precio de mercado
-                    price_element = card.query_selector('.product-card__market-price--value')
-                    market_price = None
-                    if price_element:
-                        price_text = price_element.inner_text().strip()
-                        price_match = re.search(r'\$?(\d+\.?\d*)', price_text.replace(',', ''))
-                        if price_match:
-                            try:
-                                market_price = float(price_match.group(1))
-                            except ValueError:
-                                pass
-                    
-                    # Extraer información del texto completo
-                    # Formato típico: "Set Name\nRarity,\n#OP06-118\nCard Name\n..."
-                    lines = [line.strip() for line in card_text.split('\n') if line.strip()]
-                    
-                    card_name = query_text  # Por defecto
-                    set_name = None
-                    rarity = None
-                    card_number = None
-                    product_line = None
-                    
-                    # Detectar el juego/product line desde la URL
-                    if 'one-piece' in product_href.lower():
-                        product_line = "One Piece Card Game"
-                    elif 'magic' in product_href.lower() or 'mtg' in product_href.lower():
-                        product_line = "Magic: The Gathering"
-                    elif 'yugioh' in product_href.lower() or 'yugioh' in product_href.lower():
-                        product_line = "Yu-Gi-Oh!"
-                    elif 'pokemon' in product_href.lower():
-                        product_line = "Pokémon"
-                    elif 'universus' in product_href.lower():
-                        product_line = "UniVersus"
-                    elif 'weiss-schwarz' in product_href.lower() or 'weiss schwarz' in product_href.lower():
-                        product_line = "Weiß Schwarz"
-                    # Agregar más juegos según sea necesario
-                    
-                    # Extraer el nombre del set desde el heading de la tarjeta (h4)
-                    # El heading contiene el nombre completo del set (ej: "Romance Dawn")
-                    heading_element = card.query_selector('h4')
-                    if heading_element:
-                        set_name = heading_element.inner_text().strip()
-                        logger.debug(f"Set name extraído del heading: {set_name}")
-                    
-                    # Si no encontramos el heading, intentar extraerlo de la primera línea del texto
-                    if not set_name and len(lines) > 0:
-                        # La primera línea suele ser el nombre del set
-                        potential_set = lines[0]
-                        # Verificar que no sea un número de carta, rareza, o nombre de carta
-                        if (not potential_set.startswith('#') and 
-                            potential_set not in rarity_keywords and
-                            len(potential_set) > 2 and
-                            not re.match(r'^[A-Z]{2}\d{2}-\d{3}', potential_set)):
-                            set_name = potential_set
-                    
-                    # Buscar número de carta (formato: #OP06-118, #ST02-009, etc.)
-                    card_num_match = re.search(r'#([A-Z]{2}\d{2}-\d{3})', card_text)
-                    if not card_num_match:
-                        # Intentar otros formatos de número de carta
-                        card_num_match = re.search(r'#([A-Z0-9/-]+)', card_text)
-                    
-                    if card_num_match:
-                        card_number = card_num_match.group(1)
-                        # Si no encontramos el set_name del heading, usar el número de carta como fallback
-                        if not set_name and '-' in card_number:
-                            set_name = card_number.split('-')[0]
-                    
-                    # Buscar rareza (Common, Rare, Super Rare, Secret Rare, etc.)
-                    rarity_keywords = ['Common', 'Rare', 'Super Rare', 'Secret Rare', 'Uncommon', 'Leader', 'Promo', 'P', 'C', 'U']
-                    for keyword in rarity_keywords:
-                        if keyword in card_text:
-                            rarity = keyword
-                            break
-                    
-                    # Extraer card_type (Leader, Character, Event, Stage)
-                    card_type = None
-                    card_type_keywords = ['Leader', 'Character', 'Event', 'Stage']
-                    for keyword in card_type_keywords:
-                        if keyword in card_text:
-                            card_type = keyword
-                            break
-                    
-                    # Extraer color (RED, BLUE, GREEN, PURPLE, YELLOW, BLACK)
-                    # Los colores pueden aparecer en el texto o en la URL
-                    color = None
-                    color_keywords = ['RED', 'BLUE', 'GREEN', 'PURPLE', 'YELLOW', 'BLACK']
-                    # Buscar en el texto de la tarjeta
-                    for keyword in color_keywords:
-                        if keyword in card_text.upper():
-                            color = keyword
-                            break
-                    # Si no encontramos en el texto, buscar en la URL
-                    if not color:
-                        for keyword in color_keywords:
-                            if keyword.lower() in product_href.lower():
-                                color = keyword
-                                break
-                    
-                    # Intentar extraer nombre de la carta con todas sus variantes
-                    # Lista completa de variantes posibles
-                    variant_keywords = [
-                        '(Parallel)', '(Alternate Art)', '(Manga)', '(Gold)', 
-                        '(Full Art)', '(Reprint)', '(Jolly Roger Foil)',
-                        'Parallel', 'Alternate Art', 'Manga', 'Gold', 
-                        'Full Art', 'Reprint', 'Jolly Roger Foil'
-                    ]
-                    
-                    # Primero intentar desde el alt de la imagen (más confiable para variantes)
-                    if img_alt and query_text.lower() in img_alt.lower():
-                        card_name = img_alt.strip()
-                    # Luego intentar desde el título si está disponible
-                    elif title_text:
-                        # El título suele tener el formato completo: "Trafalgar Law (047) (Parallel)"
-                        title_lines = [line.strip() for line in title_text.split('\n') if line.strip()]
-                        for line in title_lines:
-                            if query_text.lower() in line.lower() or (card_number and card_number in line):
-                                card_name = line
-                                break
-                    
-                    # Si no encontramos en el título/alt, buscar en el texto completo
-                    # El texto completo puede tener el formato: "Romance DawnSuper Rare, #OP01-047Trafalgar Law (047) (Parallel)"
-                    if card_name == query_text:
-                        # Buscar en el texto completo líneas que contengan el query_text y variantes
-                        # Primero buscar líneas que contengan el query_text
-                        for i, line in enumerate(lines):
-                            if query_text.lower() in line.lower():
-                                # Esta línea contiene el nombre, verificar si tiene variantes
-                                if any(variant in line for variant in variant_keywords):
-                                    card_name = line
-                                    break
-                                # Si no tiene variantes en esta línea, buscar en las siguientes
-                                else:
-                                    card_name = line
-                                    # Verificar líneas siguientes para variantes
-                                    for j in range(i + 1, min(i + 4, len(lines))):
-                                        next_line = lines[j]
-                                        if any(variant in next_line for variant in variant_keywords):
-                                            card_name = f"{line} {next_line}"
-                                            break
-                                    if card_name != query_text:
-                                        break
-                        
-                        # Si aún no encontramos, buscar líneas después del número de carta
-                        if card_name == query_text:
-                            for i, line in enumerate(lines):
-                                # Si encontramos el número de carta, el nombre suele estar después
-                                if card_number and card_number in line:
-                                    if i + 1 < len(lines):
-                                        potential_name = lines[i + 1]
-                                        if potential_name and len(potential_name) > 2 and potential_name not in rarity_keywords:
-                                            card_name = potential_name
-                                            # Verificar si hay líneas siguientes con variantes
-                                            for j in range(i + 2, min(i + 4, len(lines))):
-                                                next_line = lines[j]
-                                                if any(variant in next_line for variant in variant_keywords):
-                                                    card_name = f"{potential_name} {next_line}"
-                                                    break
-                                            break
-                    
-                    # Incluir solo productos de One Piece Card Game
-                    # Verificar que sea realmente de One Piece
-                    if 'one-piece' in product_href.lower() or product_line == "One Piece Card Game":
-                        suggestions.append(Search_suggestion(
-                            text=card_text[:100],  # Primeros 100 caracteres
-                            card_name=card_name,
-                            set_name=set_name,
-                            product_line="One Piece Card Game",
-                            image_url=image_url,
-                            product_url=product_url,
-                            market_price=market_price,
-                            rarity=rarity,
-                            card_number=card_number,
-                            card_type=card_type,
-                            color=color
-                        ))
-                except Exception as e:
-                    logger.warning(f"Error procesando tarjeta de producto: {e}")
-                    continue
-            
-            context.close()
-        finally:
-            browser.close()
-    
-    # Limitar resultados al tamaño de página solicitado
-    paginated_results = suggestions[:page_size]
-    
-    # Intentar obtener el total de resultados desde TCGplayer
-    # Si extrajimos el total desde el heading de la página, usarlo
-    if total_results_from_page is not None:
-        total_results_estimated = total_results_from_page
-    elif page == 1 and len(suggestions) > 0:
-        # Si encontramos 18-24 resultados, probablemente hay más páginas
-        # Estimamos conservadoramente que hay al menos 2-3 veces más resultados
-        if len(suggestions) >= 18:
-            total_results_estimated = len(suggestions) * 3  # Estimación conservadora
-        else:
-            total_results_estimated = len(suggestions)
-    elif page > 1:
-        # Para páginas siguientes, estimamos basándonos en la página actual
-        total_results_estimated = (page - 1) * page_size + len(suggestions)
-    else:
-        total_results_estimated = len(suggestions)
-    
-    # Calcular total de páginas estimado
-    total_pages = math.ceil(total_results_estimated / page_size) if total_results_estimated > 0 else 0
-    
-    # Determinar si hay más páginas disponibles
-    # Si encontramos menos resultados que el page_size, probablemente es la última página
-    has_next_page = len(suggestions) >= page_size
-    has_previous_page = page > 1
-    
-    logger.info(f"Página {page}: Devolviendo {len(paginated_results)} resultados de {len(suggestions)} encontrados (estimado total: {total_results_estimated})")
-    
-    return Search_results_response(
-        results=paginated_results,
-        total_results=total_results_estimated,
-        page=page,
-        page_size=page_size,
-        total_pages=total_pages,
-        has_next_page=has_next_page,
-        has_previous_page=has_previous_page
-    )
+    live = await get_search_suggestions(query_text, 1, FILTER_SOURCE_PAGE_SIZE)
+    if _catalog_search is not None:
+        hit = await _catalog_search.lookup(query_text, page, page_size, filters, with_facets)
+        if hit is not None:
+            return hit
+    response = filter_results(live.results, filters, page, page_size, with_facets)
+    return response, await search_max_age(query_text, 1, FILTER_SOURCE_PAGE_SIZE)
 
 
-async def get_search_suggestions(query_text: str, page: int = 1, page_size: int = 24) -> Search_results_response:
-    """Wrapper asíncrono para obtener sugerencias con paginación."""
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(_executor, get_search_suggestions_sync, query_text, page, page_size)
+async def search_max_age(query_text: str, page: int, page_size: int) -> float:
+    """Lo que le queda de frescura a la página en la caché de búsquedas (0 si se sirvió vencida)."""
+    cached = await _search_cache.peek(search_cache_key(query_text, page, page_size)) if _search_cache.ttl > 0 else None
+    return _search_cache.ttl - cached[1] if cached is not None else 0
+
+
+def suggestions_cache_control(max_age: float) -> str:
+    return cache_control(max_age, stale_if_error=settings.stale_if_error)
 
 
 @app.get("/api/suggestions", response_model=Search_results_response)
-async def get_suggestions(q: str = "", page: int = 1, page_size: int = 24) -> Any:
+async def get_suggestions(
+    request: Request,
+    q: str = "",
+    page: int = 1,
+    page_size: int = 24,
+    rarity: list[str] = Query([]),
+    set_name: list[str] = Query([]),
+    card_type: list[str] = Query([]),
+    color: list[str] = Query([]),
+    min_price: float | None = Query(None, ge=0),
+    max_price: float | None = Query(None, ge=0),
+    facets: bool = True,
+) -> Any:
     """
     Endpoint para obtener sugerencias de búsqueda de TCGplayer con paginación.
     Siempre devuelve la misma cantidad de resultados por página (page_size).
+    Responde desde el catálogo local cuando la página pedida tiene resultados en él.
+    Los filtros (rarity, set_name, card_type y color se pueden repetir; min_price y max_price) se
+    aplican sobre todas las cartas conocidas de la consulta, y con facets=true la respuesta trae
+    los conteos por valor de cada campo. Lleva ETag y responde 304 si la página no cambió.
     """
     if not q or len(q.strip()) < 2:
-        return Search_results_response(
-            results=[],
-            total_results=0,
-            page=page,
-            page_size=page_size,
-            total_pages=0,
-            has_next_page=False,
-            has_previous_page=False
+        return conditional_json_response(
+            request, empty_search_results(page, page_size), suggestions_cache_control(settings.search_cache_ttl)
         )
     
     # Validar parámetros de paginación
     page = max(1, page)
     page_size = max(1, min(50, page_size))  # Limitar entre 1 y 50 resultados por página
+    query_text = q.strip()
+    filters = Search_filters(
+        rarity=rarity, set_name=set_name, card_type=card_type, color=color, min_price=min_price, max_price=max_price
+    )
+    filtered = not filters.is_empty()
     
     try:
-        return await get_search_suggestions(q.strip(), page, page_size)
+        hit = (
+            await _catalog_search.lookup(query_text, page, page_size, filters, facets)
+            if _catalog_search is not None
+            else None
+        )
+        # `max_age` es lo que le queda de frescura a lo servido, igual que en los precios
+        response, max_age = hit if hit is not None else (None, 0.0)
+        if response is not None and not filtered:
+            await note_catalog_page(query_text, page, page_size, response.total_pages)
+        elif response is None and filtered:
+            response, max_age = await get_filtered_suggestions(query_text, page, page_size, filters, facets)
+        elif response is None:
+            response = await get_search_suggestions(query_text, page, page_size)
+            max_age = await search_max_age(query_text, page, page_size)
+            if _search_prefetcher is not None:
+                await _search_prefetcher.after_served(query_text, page, page_size, response.total_pages)
+            if facets:
+                # La búsqueda en vivo ya alimentó el catálogo; sin él, las facetas son las de la página
+                page_facets = (
+                    await _catalog_search.facets(query_text)
+                    if _catalog_search is not None
+                    else compute_facets(facet_row(suggestion) for suggestion in response.results)
+                )
+                response = response.model_copy(update={"facets": page_facets})
+        if response.results and not filtered:
+            await observe_search(query_text, page, page_size)
+        return conditional_json_response(request, response, suggestions_cache_control(max_age))
     except Exception as exc:
         logger = logging.getLogger(__name__)
         logger.error(f"Error obteniendo sugerencias: {exc}")
-        return Search_results_response(
-            results=[],
-            total_results=0,
-            page=page,
-            page_size=page_size,
-            total_pages=0,
-            has_next_page=False,
-            has_previous_page=False
+        # La página vacía de un error no debe quedar cacheada en el navegador
+        return conditional_json_response(request, empty_search_results(page, page_size), NO_STORE)
+
+
+def _encode_stream_event(event_type: str, data: dict[str, Any], stream_format: str) -> str:
+    """Serializa un evento como línea NDJSON o como evento SSE."""
+    if stream_format == "sse":
+        return f"event: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return json.dumps({"type": event_type, "data": data}, ensure_ascii=False) + "\n"
+
+
+async def _stream_suggestion_events(q: str, page: int, page_size: int, stream_format: str) -> AsyncIterator[str]:
+    local = await _catalog_search.cached(q, page, page_size) if _catalog_search is not None and len(q) >= 2 else None
+    if local is not None:
+        # Hit del catálogo: la página completa sale de inmediato
+        await note_catalog_page(q, page, page_size, local.total_pages)
+        for suggestion in local.results:
+            yield _encode_stream_event("result", suggestion.model_dump(), stream_format)
+        summary = Search_stream_summary(**local.model_dump(exclude={"results", "facets"}))
+        yield _encode_stream_event("summary", summary.model_dump(), stream_format)
+        return
+
+    emitted = 0
+    try:
+        async for item in _scrape_engine.stream_search(q, page, page_size):
+            if isinstance(item, Search_results_response):
+                await record_search_results(q, item)
+                await _search_cache.put(search_cache_key(q, page, page_size), item)
+                if _search_prefetcher is not None:
+                    await _search_prefetcher.after_served(q, page, page_size, item.total_pages)
+                summary = Search_stream_summary(**item.model_dump(exclude={"results", "facets"}))
+                yield _encode_stream_event("summary", summary.model_dump(), stream_format)
+            elif emitted < page_size:
+                emitted += 1
+                yield _encode_stream_event("result", item.model_dump(), stream_format)
+    except Upstream_unavailable as exc:
+        logging.getLogger(__name__).warning(f"Sugerencias en streaming rechazadas por el regulador: {exc}")
+        yield _encode_stream_event(
+            "error",
+            {"detail": "TCGplayer no está disponible por ahora; reintenta más tarde.", "retry_after": round(exc.retry_after)},
+            stream_format,
         )
+    except Exception as exc:
+        logger = logging.getLogger(__name__)
+        logger.error(f"Error transmitiendo sugerencias: {exc}")
+        yield _encode_stream_event("error", {"detail": "Error al obtener resultados de TCGplayer."}, stream_format)
+
+
+@app.get("/api/suggestions/stream")
+async def stream_suggestions(
+    q: str = "",
+    page: int = 1,
+    page_size: int = 24,
+    stream_format: str = Query("ndjson", alias="format", pattern="^(ndjson|sse)$"),
+) -> StreamingResponse:
+    """
+    Variante en streaming de /api/suggestions: emite cada resultado apenas se extrae de la página
+    (eventos "result") y termina con un evento "summary" con la paginación. Con format=sse usa
+    Server-Sent Events; por defecto, NDJSON (un objeto JSON por línea).
+    """
+    page = max(1, page)
+    page_size = max(1, min(50, page_size))
+    media_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(
+        _stream_suggestion_events(q.strip(), page, page_size, stream_format),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def price_cache_control(query: Card_query) -> str:
+    """`Cache-Control` con lo que le queda de frescura al precio en la caché (0 si se sirvió vencido)."""
+    cached = await _price_cache.peek(price_cache_key(query)) if _price_cache.ttl > 0 else None
+    max_age = _price_cache.ttl - cached[1] if cached is not None else 0
+    return cache_control(max_age, _price_cache.stale_ttl, _price_cache.stale_if_error)
+
+
+async def respond_card_price(request: Request, payload: Card_query) -> Response:
+    try:
+        query = await _product_index.resolve(payload)
+        price = await get_cached_card_price(query)
+        observe_card_price(query, price)
+        return conditional_json_response(request, price, await price_cache_control(query))
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc), headers={"Cache-Control": NO_STORE}) from exc
+    except Upstream_unavailable as exc:
+        # Circuito abierto y nada en caché para esta carta: mejor fallar ya que esperar un timeout
+        raise HTTPException(
+            status_code=503,
+            detail="TCGplayer no está disponible por ahora; reintenta más tarde.",
+            headers={"Retry-After": str(int(exc.retry_after + 0.999)), "Cache-Control": NO_STORE},
+        ) from exc
+    except Exception as exc:  # noqa: BLE001
+        raise HTTPException(
+            status_code=502,
+            detail="Error al comunicarse con TCGplayer o al procesar la respuesta.",
+            headers={"Cache-Control": NO_STORE},
+        ) from exc
 
 
 @app.post("/api/price", response_model=Card_price)
-async def get_card_price(payload: Card_query) -> Any:
+async def get_card_price(request: Request, payload: Card_query) -> Any:
     """
     Comentario: endpoint principal para que el frontend consulte el precio de una carta.
     Maneja los errores para no exponer detalles internos de scraping al cliente.
+    Las consultas repetidas se sirven desde la caché de precios. Con `product_id`, o con
+    `card_number` (y `variant`) resuelto a un ID de producto, se consulta exactamente ese producto
+    en vez del primer resultado de una búsqueda de texto libre.
+    """
+    return await respond_card_price(request, payload)
+
+
+@app.get("/api/price", response_model=Card_price)
+async def get_card_price_by_query(request: Request, query: Annotated[Card_query, Query()]) -> Any:
+    """
+    Comentario: igual que POST /api/price pero con los campos como parámetros de la URL, para que el
+    navegador o un proxy puedan cachear la respuesta (no cachean POST) y revalidarla con
+    If-None-Match: si el precio no cambió responde 304 sin cuerpo.
+    """
+    return await respond_card_price(request, query)
+
+
+@app.get("/api/price/history", response_model=Price_history_response)
+async def get_price_history(
+    product_id: int,
+    is_foil: bool = False,
+    days: int = Query(90, ge=1, le=3650),
+    interval: str = Query("day", pattern="^(day|week)$"),
+) -> Any:
+    """
+    Comentario: evolución del precio de mercado de un producto (el ID de TCGplayer de `product_url`)
+    a partir de los precios observados en scrapes anteriores, sin volver a scrapear. Cada punto
+    es un día o una semana con apertura, máximo, mínimo, cierre y cantidad de observaciones.
+    """
+    if _price_history is None:
+        raise HTTPException(status_code=404, detail="El histórico de precios está desactivado.")
+    return _price_history.history(product_id, is_foil, days, interval)
+
+
+# La imagen de un producto prácticamente no cambia: el navegador puede usarla una semana sin preguntar
+IMAGE_CACHE_CONTROL = cache_control(7 * 86400, stale_while_revalidate=86400)
+
+
+@app.get("/api/images/{product_id}")
+async def get_card_image(request: Request, product_id: int = Path(ge=1)) -> Response:
     """
+    Comentario: miniatura de un producto servida desde la caché de imágenes en disco; solo la primera
+    solicitud de cada carta va al CDN de TCGplayer. Acepta rangos (`Range`) y solicitudes
+    condicionales (`If-None-Match`, `If-Modified-Since`). Con la caché desactivada redirige al CDN.
+    """
+    if _image_cache is None:
+        return RedirectResponse(settings.image_cdn_url + THUMBNAIL_PATH.format(product_id=product_id))
     try:
-        return await fetch_card_price_from_tcgplayer(payload)
-    except ValueError as exc:
+        path, stat_result = await _image_cache.get(product_id)
+    except Image_not_found as exc:
         raise HTTPException(status_code=404, detail=str(exc)) from exc
     except Exception as exc:  # noqa: BLE001
         raise HTTPException(
             status_code=502,
-            detail="Error al comunicarse con TCGplayer o al procesar la respuesta.",
+            detail="Error al descargar la imagen del CDN de TCGplayer.",
+            headers={"Cache-Control": NO_STORE},
         ) from exc
+    response = FileResponse(
+        path,
+        media_type="image/jpeg",
+        stat_result=stat_result,
+        headers={"Cache-Control": IMAGE_CACHE_CONTROL},
+    )
+    if not_modified(request, response.headers["etag"], stat_result.st_mtime):
+        return Response(
+            status_code=304,
+            headers={
+                "ETag": response.headers["etag"],
+                "Last-Modified": response.headers["last-modified"],
+                "Cache-Control": IMAGE_CACHE_CONTROL,
+            },
+        )
+    return response
+
+
+@app.post("/api/prices", response_model=Batch_price_response)
+async def get_card_prices(payload: Batch_price_request) -> Any:
+    """
+    Comentario: valora una lista completa de cartas (p. ej. un mazo) en una sola llamada.
+    Deduplica, agrupa las búsquedas por nombre de carta y devuelve un resultado por ítem,
+    con su propio código de estado y error, en el mismo orden de entrada.
+    """
+    return await price_batch(
+        payload.items,
+        search=get_search_suggestions,
+        fetch_price=get_cached_card_price,
+        price_cache=_price_cache,
+        resolve=_product_index.resolve,
+        is_search_cached=lambda query_text, page, page_size: is_search_cached(
+            search_cache_key(query_text, page, page_size)
+        ),
+        concurrency=settings.batch_concurrency,
+    )
+
+
+@app.get("/api/stats")
+async def get_stats() -> Any:
+    """
+    Comentario: expone las métricas del motor de scraping (con el regulador de tráfico en
+    `engine.governor`), la caché de precios, la coalescencia y la duración de cada etapa de espera
+    de las páginas.
+    """
+    return {
+        "engine": _scrape_engine.stats(),
+        "readiness": readiness_stats.stats(),
+        "price_cache": _price_cache.stats(),
+        "search_cache": _search_cache.stats(),
+        "prefetch": _search_prefetcher.stats() if _search_prefetcher is not None else None,
+        "single_flight": _single_flight.stats(),
+        "catalog": _catalog_search.stats() if _catalog_search is not None else None,
+        "product_index": _product_index.stats(),
+        "price_history": _price_history.stats() if _price_history is not None else None,
+        "refresh_scheduler": _refresh_scheduler.stats() if _refresh_scheduler is not None else None,
+        "image_cache": _image_cache.stats() if _image_cache is not None else None,
+    }
+
+
+def collect_service_metrics() -> list[Metric_family]:
+    """Estado de la cola del motor, las cachés y la coalescencia en el momento del scrape de Prometheus."""
+    engine_stats = _scrape_engine.stats()
+    families = [
+        Metric_family("optcg_scrape_queue_depth", "gauge", "Scrapes esperando un navegador.", [({}, engine_stats["queued"])]),
+        Metric_family("optcg_scrapes_in_flight", "gauge", "Scrapes en curso.", [({}, engine_stats["in_flight"])]),
+        Metric_family(
+            "optcg_scrape_concurrency", "gauge", "Scrapes simultáneos permitidos.", [({}, engine_stats["concurrency"])]
+        ),
+        Metric_family(
+            "optcg_scrapes_total",
+            "counter",
+            "Scrapes terminados por resultado.",
+            [({"outcome": "ok"}, engine_stats["completed"]), ({"outcome": "error"}, engine_stats["failed"])],
+        ),
+    ]
+    if "fast_path_hits" in engine_stats:
+        families.append(
+            Metric_family(
+                "optcg_fast_path_total",
+                "counter",
+                "Solicitudes resueltas por el API JSON, que cayeron a Playwright o que TCGplayer limitó (sin respaldo).",
+                [
+                    ({"result": "hit"}, engine_stats["fast_path_hits"]),
+                    ({"result": "fallback"}, engine_stats["fast_path_fallbacks"]),
+                    ({"result": "throttled"}, engine_stats.get("fast_path_throttled", 0)),
+                ],
+            )
+        )
+
+    governor_stats = engine_stats.get("governor")
+    if governor_stats is not None:
+        families += [
+            Metric_family(
+                "optcg_upstream_concurrency_limit",
+                "gauge",
+                "Límite adaptativo (AIMD) de solicitudes simultáneas hacia TCGplayer.",
+                [({}, governor_stats["concurrency_limit"])],
+            ),
+            Metric_family(
+                "optcg_upstream_breaker_state",
+                "gauge",
+                "Estado del circuito hacia TCGplayer (1 en el estado actual).",
+                [
+                    ({"state": state}, 1 if governor_stats["breaker_state"] == state else 0)
+                    for state in ("closed", "half_open", "open")
+                ],
+            ),
+            Metric_family(
+                "optcg_upstream_requests_total",
+                "counter",
+                "Operaciones contra TCGplayer por resultado (throttled: respuestas 403/429/503, incluidas en error).",
+                [
+                    ({"outcome": "ok"}, governor_stats["succeeded"]),
+                    ({"outcome": "error"}, governor_stats["failed"]),
+                    ({"outcome": "throttled"}, governor_stats["throttled"]),
+                ],
+            ),
+            Metric_family(
+                "optcg_upstream_rejected_total",
+                "counter",
+                "Solicitudes que no llegaron a TCGplayer por el circuito abierto o por esperar demasiado turno.",
+                [({"reason": reason}, count) for reason, count in governor_stats["rejected"].items()],
+            ),
+            Metric_family(
+                "optcg_upstream_rate_limit_wait_seconds_total",
+                "counter",
+                "Segundos acumulados de espera impuestos por el límite de ritmo.",
+                [({}, governor_stats["rate_limit_wait_seconds"])],
+            ),
+        ]
+
+    pool_stats = engine_stats.get("pool") or {}
+    memory_stats = pool_stats.get("memory")
+    if memory_stats is not None:
+        families += [
+            Metric_family(
+                "optcg_browser_rss_bytes",
+                "gauge",
+                "RSS sumado de los navegadores Chromium y sus procesos (cota superior: cuenta varias veces la memoria compartida).",
+                [({}, memory_stats["total_rss_mb"] * MIB)],
+            ),
+            Metric_family(
+                "optcg_browser_memory_budget_bytes",
+                "gauge",
+                "Presupuesto de memoria de los navegadores; por encima las páginas nuevas esperan.",
+                [({}, memory_stats["budget_mb"] * MIB)],
+            ),
+            Metric_family(
+                "optcg_browser_memory_actions_total",
+                "counter",
+                "Navegadores reciclados por pasar del límite de memoria y matados por no cerrarse a tiempo.",
+                [({"action": "recycle"}, memory_stats["recycles"]), ({"action": "kill"}, memory_stats["kills"])],
+            ),
+            Metric_family(
+                "optcg_browser_memory_admissions_total",
+                "counter",
+                "Páginas que esperaron por el presupuesto de memoria (waited) y las rechazadas por él (rejected).",
+                [({"result": "waited"}, memory_stats["admission_waits"]), ({"result": "rejected"}, memory_stats["admission_rejected"])],
+            ),
+        ]
+    if "deadline_exceeded" in pool_stats:
+        families.append(
+            Metric_family(
+                "optcg_page_deadline_exceeded_total",
+                "counter",
+                "Páginas cortadas por pasar del plazo máximo (OPTCG_PAGE_DEADLINE).",
+                [({}, pool_stats["deadline_exceeded"])],
+            )
+        )
+
+    caches = [("price", _price_cache.stats()), ("search", _search_cache.stats())]
+    lookups = Metric_family("optcg_cache_lookups_total", "counter", "Consultas a las cachés por resultado.")
+    entries = Metric_family("optcg_cache_entries", "gauge", "Entradas guardadas en cada caché.")
+    evictions = Metric_family("optcg_cache_evictions_total", "counter", "Entradas descartadas por tamaño.")
+    stale_on_error = Metric_family(
+        "optcg_cache_stale_on_error_total", "counter", "Entradas vencidas servidas porque falló TCGplayer."
+    )
+    for cache_name, cache_stats in caches:
+        for result in ("hits", "stale_hits", "misses"):
+            lookups.samples.append(({"cache": cache_name, "result": result}, cache_stats[result]))
+        entries.samples.append(({"cache": cache_name}, cache_stats["entries"]))
+        evictions.samples.append(({"cache": cache_name}, cache_stats["evictions"]))
+        stale_on_error.samples.append(({"cache": cache_name}, cache_stats["stale_on_error"]))
+    if _catalog_search is not None:
+        catalog_stats = _catalog_search.stats()
+        lookups.samples.append(({"cache": "catalog", "result": "hits"}, catalog_stats["hits"]))
+        lookups.samples.append(({"cache": "catalog", "result": "misses"}, catalog_stats["misses"]))
+        entries.samples.append(({"cache": "catalog"}, catalog_stats["cards"]))
+    if _image_cache is not None:
+        image_stats = _image_cache.stats()
+        lookups.samples.append(({"cache": "image", "result": "hits"}, image_stats["hits"]))
+        lookups.samples.append(({"cache": "image", "result": "misses"}, image_stats["misses"]))
+        entries.samples.append(({"cache": "image"}, image_stats["entries"]))
+        evictions.samples.append(({"cache": "image"}, image_stats["evictions"]))
+        families.append(
+            Metric_family(
+                "optcg_image_cache_bytes", "gauge", "Bytes en disco de la caché de imágenes.", [({}, image_stats["bytes"])]
+            )
+        )
+    families += [lookups, entries, evictions, stale_on_error]
+
+    single_flight_stats = _single_flight.stats()
+    families.append(
+        Metric_family(
+            "optcg_single_flight_total",
+            "counter",
+            "Solicitudes que lanzaron un scrape (leader) o esperaron uno idéntico en curso (coalesced).",
+            [({"role": "leader"}, single_flight_stats["leaders"]), ({"role": "coalesced"}, single_flight_stats["coalesced"])],
+        )
+    )
+    return families
+
+
+metrics_registry.register_collector(collect_service_metrics)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    """
+    Comentario: métricas en formato Prometheus: histogramas por etapa de cada scrape, espera en cola,
+    lanzamientos de navegador, nivel de la cascada que encontró el precio y estado de colas y cachés.
+    """
+    return Response(metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
@@ -0,0 +1,309 @@
+"""
+Comentario: regulador de memoria de los navegadores. Cada Chromium con su contexto de 1920x1080 y sus
+procesos de renderizado ocupa cientos de MB, y con muchos scrapes simultáneos el host se queda sin
+memoria antes que sin CPU. `Memory_governor`:
+
+- Identifica el proceso raíz de cada navegador por un argumento marcador en su línea de comandos
+  (`--optcg-browser-id=...`, que Chromium ignora) y suma el RSS de ese proceso y de todos sus
+  descendientes (renderers, GPU, utilidades) leyendo `/proc` cada `sample_interval` segundos.
+- Avisa al pool de los navegadores que pasan de `max_browser_bytes`. El pool los recicla y, si
+  siguen vivos pasado el plazo de una página, los mata.
+- Con el total por encima de `budget_bytes`, las páginas nuevas esperan a que baje (hasta
+  `max_wait` segundos) y si no, fallan con `Memory_budget_exhausted` (503 con `Retry-After`, o el
+  último precio cacheado).
+
+Solo funciona en Linux (sin `/proc` no mide nada y nunca frena). El RSS cuenta varias veces las
+páginas compartidas entre procesos, así que el total es una cota superior: el presupuesto es
+conservador. Los números están en `engine.pool.memory` de `GET /api/stats` y en `/metrics`.
+"""
+import asyncio
+import itertools
+import logging
+import os
+import signal
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from upstream_governor import Upstream_unavailable
+
+logger = logging.getLogger(__name__)
+
+PROC_DIR = Path("/proc")
+BROWSER_MARKER_ARG = "--optcg-browser-id"
+PAGE_SIZE_BYTES = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+MIB = 1024 * 1024
+# Retry-After de una página rechazada por memoria: un par de muestreos
+MEMORY_RETRY_AFTER_SECONDS = 10.0
+
+
+class Memory_budget_exhausted(Upstream_unavailable):
+    """
+    Los navegadores ya usan todo el presupuesto de memoria. Se trata como TCGplayer no disponible
+    (503 con `Retry-After` o el precio cacheado), pero el regulador de tráfico no lo cuenta como fallo.
+    """
+
+
+def memory_supported() -> bool:
+    return (PROC_DIR / "self" / "statm").exists()
+
+
+def read_rss_bytes(pid: int) -> int | None:
+    """RSS de un proceso en bytes (segundo campo de /proc/<pid>/statm), o None si ya no existe."""
+    try:
+        with open(PROC_DIR / str(pid) / "statm", encoding="ascii") as statm:
+            return int(statm.read().split()[1]) * PAGE_SIZE_BYTES
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def process_children() -> dict[int, list[int]]:
+    """Mapa ppid -> pids de todos los procesos visibles, en una sola pasada por /proc."""
+    children: dict[int, list[int]] = {}
+    for entry in PROC_DIR.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            # El nombre del proceso va entre paréntesis y puede tener espacios: el ppid va después de ")"
+            stat = (entry / "stat").read_text(encoding="utf-8")
+            ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry.name))
+    return children
+
+
+def descendant_pids(root_pid: int, children: dict[int, list[int]] | None = None) -> list[int]:
+    children = process_children() if children is None else children
+    pending, found = [root_pid], []
+    while pending:
+        for child in children.get(pending.pop(), []):
+            found.append(child)
+            pending.append(child)
+    return found
+
+
+def _command_line(pid: int) -> list[str]:
+    try:
+        return (PROC_DIR / str(pid) / "cmdline").read_bytes().decode("utf-8", "replace").split("\0")
+    except OSError:
+        return []
+
+
+class Tracked_browser:
+    """Un navegador del pool: su marcador, el PID de su proceso raíz (cuando aparece) y su último RSS."""
+
+    __slots__ = ("key", "pid", "processes", "rss_bytes", "peak_rss_bytes", "over_limit_since")
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+        self.pid: int | None = None
+        self.processes = 0
+        self.rss_bytes = 0
+        self.peak_rss_bytes = 0
+        self.over_limit_since: float | None = None
+
+
+class Memory_governor:
+    """
+    Comentario: el pool llama a `launch_args()` al lanzar cada navegador, `register`/`unregister`
+    al ponerlo en servicio y al cerrarlo, y `await admit()` antes de abrir cada página.
+    `start(on_over_limit)` arranca el muestreo; `on_over_limit(key, seconds)` se llama en cada
+    muestreo mientras un navegador siga por encima del límite, con los segundos que lleva así.
+    """
+
+    def __init__(
+        self,
+        max_browser_bytes: int,
+        budget_bytes: int,
+        sample_interval: float = 5.0,
+        max_wait: float = 30.0,
+    ) -> None:
+        self.max_browser_bytes = max_browser_bytes
+        self.budget_bytes = budget_bytes
+        self.sample_interval = sample_interval
+        self.max_wait = max_wait
+        self.supported = memory_supported()
+        self.total_rss_bytes = 0
+        self.peak_total_rss_bytes = 0
+        self.over_budget = False
+        self.samples = 0
+        self.last_sample_seconds = 0.0
+        self.recycles = 0
+        self.kills = 0
+        self.admission_waits = 0
+        self.admission_rejected = 0
+        self._browsers: dict[str, Tracked_browser] = {}
+        self._keys = itertools.count(1)
+        self._under_budget = asyncio.Event()
+        self._under_budget.set()
+        self._task: asyncio.Task | None = None
+
+    def launch_args(self) -> tuple[str, list[str]]:
+        """Marcador nuevo y los argumentos de Chromium que lo llevan."""
+        key = f"{os.getpid()}-{next(self._keys)}"
+        return key, [f"{BROWSER_MARKER_ARG}={key}"]
+
+    def register(self, key: str) -> None:
+        self._browsers[key] = Tracked_browser(key)
+
+    def unregister(self, key: str) -> None:
+        self._browsers.pop(key, None)
+
+    async def start(self, on_over_limit: Callable[[str, float], Awaitable[None] | None]) -> None:
+        if not self.supported:
+            logger.info("Regulador de memoria desactivado: no hay /proc para medir el RSS de Chromium")
+            return
+        self._task = asyncio.create_task(self._sample_loop(on_over_limit))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Nadie debe quedar esperando un presupuesto que ya no se va a medir
+        self._under_budget.set()
+
+    async def _sample_loop(self, on_over_limit: Callable[[str, float], Awaitable[None] | None]) -> None:
+        while True:
+            try:
+                over_limit = await asyncio.to_thread(self.sample)
+                # El evento es del event loop: se actualiza aquí y no en el hilo del muestreo
+                if self.over_budget:
+                    self._under_budget.clear()
+                else:
+                    self._under_budget.set()
+                for key, seconds in over_limit:
+                    result = on_over_limit(key, seconds)
+                    if asyncio.iscoroutine(result):
+                        await result
+            except Exception as e:
+                logger.warning(f"Muestreo de memoria de los navegadores falló: {e}")
+            await asyncio.sleep(self.sample_interval)
+
+    def sample(self) -> list[tuple[str, float]]:
+        """
+        Mide el RSS de cada navegador y el total; devuelve los navegadores por encima del límite con
+        los segundos que llevan así. Corre en un hilo: solo lee /proc y actualiza contadores.
+        """
+        started = time.perf_counter()
+        now = time.monotonic()
+        children = process_children()
+        browsers = list(self._browsers.values())
+        if any(browser.pid is None for browser in browsers):
+            self._resolve_pids(browsers, children)
+
+        total = 0
+        over_limit = []
+        for browser in browsers:
+            if browser.pid is None:
+                continue
+            pids = [browser.pid] + descendant_pids(browser.pid, children)
+            sizes = [size for size in (read_rss_bytes(pid) for pid in pids) if size is not None]
+            browser.processes = len(sizes)
+            browser.rss_bytes = sum(sizes)
+            browser.peak_rss_bytes = max(browser.peak_rss_bytes, browser.rss_bytes)
+            total += browser.rss_bytes
+            if self.max_browser_bytes > 0 and browser.rss_bytes > self.max_browser_bytes:
+                if browser.over_limit_since is None:
+                    browser.over_limit_since = now
+                    logger.warning(
+                        f"Navegador {browser.key}: {browser.rss_bytes / MIB:.0f} MB, por encima del límite de "
+                        f"{self.max_browser_bytes / MIB:.0f} MB"
+                    )
+                over_limit.append((browser.key, now - browser.over_limit_since))
+            else:
+                browser.over_limit_since = None
+
+        self.total_rss_bytes = total
+        self.peak_total_rss_bytes = max(self.peak_total_rss_bytes, total)
+        was_over_budget = self.over_budget
+        self.over_budget = self.budget_bytes > 0 and total > self.budget_bytes
+        if self.over_budget != was_over_budget:
+            logger.warning(
+                f"Memoria de los navegadores {total / MIB:.0f} MB: "
+                f"{'presupuesto agotado' if self.over_budget else 'de nuevo dentro del presupuesto'} "
+                f"({self.budget_bytes / MIB:.0f} MB)"
+            )
+        self.samples += 1
+        self.last_sample_seconds = time.perf_counter() - started
+        return over_limit
+
+    def _resolve_pids(self, browsers: list[Tracked_browser], children: dict[int, list[int]]) -> None:
+        pending = {f"{BROWSER_MARKER_ARG}={browser.key}": browser for browser in browsers if browser.pid is None}
+        for pid in descendant_pids(os.getpid(), children):
+            for argument in _command_line(pid):
+                browser = pending.pop(argument, None)
+                if browser is not None:
+                    browser.pid = pid
+                    break
+            if not pending:
+                return
+
+    async def admit(self) -> None:
+        """Espera a que el total vuelva a estar dentro del presupuesto; lanza Memory_budget_exhausted si no."""
+        if self._under_budget.is_set():
+            return
+        self.admission_waits += 1
+        try:
+            await asyncio.wait_for(self._under_budget.wait(), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            self.admission_rejected += 1
+            raise Memory_budget_exhausted(
+                f"Los navegadores superan el presupuesto de memoria ({self.budget_bytes / MIB:.0f} MB) "
+                f"desde hace más de {self.max_wait:.0f}s",
+                retry_after=MEMORY_RETRY_AFTER_SECONDS,
+            ) from None
+
+    def note_recycle(self) -> None:
+        self.recycles += 1
+
+    async def kill(self, key: str, reason: str) -> bool:
+        """Mata el proceso raíz del navegador y sus descendientes (SIGKILL); False si no se conoce su PID."""
+        # Buscar los descendientes recorre todo /proc: en un hilo, como el muestreo
+        return await asyncio.to_thread(self._kill, key, reason)
+
+    def _kill(self, key: str, reason: str) -> bool:
+        browser = self._browsers.get(key)
+        if browser is not None and browser.pid is None:
+            # Lanzado después del último muestreo
+            self._resolve_pids([browser], process_children())
+        if browser is None or browser.pid is None:
+            return False
+        logger.warning(f"Navegador {key}: matando el proceso {browser.pid} y sus descendientes ({reason})")
+        for pid in descendant_pids(browser.pid) + [browser.pid]:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+        self.kills += 1
+        return True
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "supported": self.supported,
+            "total_rss_mb": round(self.total_rss_bytes / MIB, 1),
+            "peak_total_rss_mb": round(self.peak_total_rss_bytes / MIB, 1),
+            "budget_mb": round(self.budget_bytes / MIB, 1),
+            "max_browser_mb": round(self.max_browser_bytes / MIB, 1),
+            "over_budget": self.over_budget,
+            "recycles": self.recycles,
+            "kills": self.kills,
+            "admission_waits": self.admission_waits,
+            "admission_rejected": self.admission_rejected,
+            "samples": self.samples,
+            "last_sample_ms": round(self.last_sample_seconds * 1000, 2),
+            "browsers": [
+                {
+                    "key": browser.key,
+                    "pid": browser.pid,
+                    "processes": browser.processes,
+                    "rss_mb": round(browser.rss_bytes / MIB, 1),
+                    "peak_rss_mb": round(browser.peak_rss_bytes / MIB, 1),
+                }
+                for browser in self._browsers.values()
+            ],
+        }
@@ -0,0 +1,184 @@
+"""
+Comentario: métricas en el formato de texto de Prometheus para `GET /metrics`, sin dependencias extra.
+
+- Histogramas y contadores (`metrics_registry.histogram` y `.counter`) que el código actualiza en el
+  momento: etapas de cada scrape, espera en cola, lanzamientos de navegador, nivel de la cascada
+  que encontró el precio.
+- Colectores (`metrics_registry.register_collector`) que al renderizar leen el estado de otros
+  componentes (cola del motor, cachés...) y lo devuelven como `Metric_family`.
+
+Los histogramas se actualizan desde los hilos de los slots, de ahí los locks.
+"""
+import math
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+
+# Límites de los buckets en segundos: de una extracción en milisegundos a un scrape lento completo
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+@dataclass
+class Metric_family:
+    """Métrica leída al renderizar: `kind` es "gauge" o "counter"; cada muestra es (etiquetas, valor)."""
+
+    name: str
+    kind: str
+    help_text: str
+    samples: list[tuple[dict[str, str], float]] = field(default_factory=list)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{self.name}{_format_labels(labels)} {_format_value(value)}" for labels, value in self.samples]
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return Metric_family(
+            self.name,
+            "counter",
+            self.help_text,
+            [(dict(zip(self.label_names, label_values)), value) for label_values, value in values],
+        ).render()
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        label_names: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Por combinación de etiquetas: conteos por bucket (no acumulados), suma y cantidad
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = ([0] * len(self.buckets), [0.0, 0])
+                self._series[label_values] = series
+            counts, totals = series
+            for index, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    counts[index] += 1
+                    break
+            totals[0] += value
+            totals[1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, (list(counts), list(totals))) for labels, (counts, totals) in self._series.items())
+        for label_values, (counts, (total, count)) in series:
+            labels = dict(zip(self.label_names, label_values))
+            cumulative = 0
+            for upper_bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels({**labels, "le": _format_value(upper_bound)})
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {int(count)}")
+        return lines
+
+
+class Metrics_registry:
+    def __init__(self) -> None:
+        self._metrics: list[Counter | Histogram] = []
+        self._collectors: list[Callable[[], Iterable[Metric_family]]] = []
+
+    def counter(self, name: str, help_text: str, label_names: tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help_text, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, label_names: tuple[str, ...] = ()) -> Histogram:
+        metric = Histogram(name, help_text, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[Metric_family]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics:
+            lines += metric.render()
+        for collector in self._collectors:
+            for family in collector():
+                lines += family.render()
+        return "\n".join(lines) + "\n"
+
+
+metrics_registry = Metrics_registry()
+
+scrape_stage_seconds = metrics_registry.histogram(
+    "optcg_scrape_stage_seconds",
+    "Duración de cada etapa de un scrape con Playwright (goto, search_xhr, price_ready, cookie_banner, extract...).",
+    ("flow", "stage"),
+)
+scrape_queue_wait_seconds = metrics_registry.histogram(
+    "optcg_scrape_queue_wait_seconds",
+    "Espera de un scrape hasta obtener un navegador (cola del motor o del pool de hilos).",
+    ("kind",),
+)
+scrape_run_seconds = metrics_registry.histogram(
+    "optcg_scrape_run_seconds",
+    "Duración de un scrape desde que obtiene navegador hasta que termina.",
+    ("kind", "outcome"),
+)
+browser_launch_seconds = metrics_registry.histogram(
+    "optcg_browser_launch_seconds",
+    "Duración de lanzar Chromium y crear su contexto.",
+    ("pool",),
+)
+price_extraction_seconds = metrics_registry.histogram(
+    "optcg_price_extraction_seconds",
+    "Duración de la cascada de extracción de precio, por nivel que lo encontró.",
+    ("tier",),
+)
+price_source_total = metrics_registry.counter(
+    "optcg_price_source_total",
+    "Precios obtenidos por origen: API JSON (json_api, product_api), página de producto (product_page) "
+    "o nivel de la cascada de selectores (primary, fallback, all_prices, body_text); not_found cuenta "
+    "las extracciones sin precio.",
+    ("tier",),
+)
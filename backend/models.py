@@ -0,0 +1,133 @@
+"""Comentario: modelos Pydantic compartidos por el API y los módulos de scraping."""
+from pydantic import BaseModel, Field, model_validator
+
+
+class Card_query(BaseModel):
+    card_name: str = Field("", max_length=120)
+    set_name: str = Field("", max_length=120)  # Ahora es opcional
+    is_foil: bool = False
+    # Búsqueda precisa: número de carta (OP05-119) con variante opcional (Parallel, Alternate Art...)
+    # o directamente el ID de producto de TCGplayer; se consulta ese producto y no el primer resultado
+    card_number: str | None = Field(None, max_length=20)
+    variant: str | None = Field(None, max_length=60)
+    product_id: int | None = Field(None, ge=1)
+
+    @model_validator(mode="after")
+    def _require_card(self) -> "Card_query":
+        if not self.card_name.strip() and not self.card_number and self.product_id is None:
+            raise ValueError("Indica card_name, card_number o product_id.")
+        return self
+
+
+class Search_suggestion(BaseModel):
+    text: str
+    card_name: str
+    set_name: str | None = None
+    product_line: str | None = None
+    image_url: str | None = None
+    product_url: str | None = None
+    market_price: float | None = None
+    rarity: str | None = None
+    card_number: str | None = None
+    card_type: str | None = None  # Leader, Character, Event, Stage, etc.
+    color: str | None = None  # RED, BLUE, GREEN, PURPLE, YELLOW, BLACK
+
+
+class Search_filters(BaseModel):
+    # Filtros de /api/suggestions: dentro de un campo basta con que coincida uno de los valores
+    # (sin distinguir mayúsculas); entre campos tienen que cumplirse todos
+    rarity: list[str] = Field(default_factory=list)
+    set_name: list[str] = Field(default_factory=list)
+    card_type: list[str] = Field(default_factory=list)
+    color: list[str] = Field(default_factory=list)
+    min_price: float | None = None
+    max_price: float | None = None
+
+    def is_empty(self) -> bool:
+        return not (self.rarity or self.set_name or self.card_type or self.color) and (
+            self.min_price is None and self.max_price is None
+        )
+
+
+class Facet_count(BaseModel):
+    value: str
+    count: int
+
+
+class Search_facets(BaseModel):
+    # Conteos por valor de todas las cartas de la consulta que cumplen los demás filtros (el filtro
+    # del propio campo no se aplica, así se pueden ver y combinar las otras opciones)
+    rarity: list[Facet_count] = Field(default_factory=list)
+    set_name: list[Facet_count] = Field(default_factory=list)
+    card_type: list[Facet_count] = Field(default_factory=list)
+    color: list[Facet_count] = Field(default_factory=list)
+    min_price: float | None = None
+    max_price: float | None = None
+
+
+class Search_results_response(BaseModel):
+    results: list[Search_suggestion]
+    total_results: int
+    page: int
+    page_size: int
+    total_pages: int
+    has_next_page: bool
+    has_previous_page: bool
+    # Solo en /api/suggestions con facets=true
+    facets: Search_facets | None = None
+
+
+class Search_stream_summary(BaseModel):
+    # Último evento de /api/suggestions/stream: la paginación sin repetir los resultados ya emitidos
+    total_results: int
+    page: int
+    page_size: int
+    total_pages: int
+    has_next_page: bool
+    has_previous_page: bool
+
+
+class Card_price(BaseModel):
+    card_name: str
+    set_name: str
+    is_foil: bool
+    market_price: float
+    currency: str = "USD"
+    source_url: str
+    # ID de producto de TCGplayer cuando la fuente lo conoce (camino rápido o búsqueda agrupada)
+    product_id: int | None = None
+
+
+class Batch_price_request(BaseModel):
+    items: list[Card_query] = Field(..., min_length=1, max_length=200)
+
+
+class Batch_price_item(BaseModel):
+    query: Card_query
+    price: Card_price | None = None
+    status: int = 200  # 200 con precio, 404 sin precio reconocible, 502 error de scraping
+    error: str | None = None
+
+
+class Batch_price_response(BaseModel):
+    results: list[Batch_price_item]
+    unique_queries: int
+    cache_hits: int
+    searches: int
+
+
+class Price_history_point(BaseModel):
+    # Un intervalo (día o semana) de la serie: apertura, máximo, mínimo y último precio observado
+    date: str
+    open: float
+    high: float
+    low: float
+    close: float
+    samples: int
+
+
+class Price_history_response(BaseModel):
+    product_id: int
+    is_foil: bool
+    interval: str
+    points: list[Price_history_point]
@@ -0,0 +1,172 @@
+"""
+Comentario: prefetch especulativo de páginas de búsqueda. Casi siempre, después de la página N el
+usuario pide la N+1, y cada clic cuesta un scrape completo. Cuando se sirve una página en vivo se
+buscan en segundo plano las páginas N+1 (y opcionalmente N+2) y se guardan en la caché de búsquedas.
+
+La especulación nunca compite con el tráfico real:
+- como mucho `concurrency` prefetches en curso; si no hay presupuesto, simplemente no se especula;
+- si el motor está bajo presión (su capacidad ocupada) no se lanzan nuevos y se cancelan los que
+  están en curso, salvo los que ya tienen a un usuario esperándolos;
+- si un usuario pide una página que se está precargando, espera ese mismo scrape en vez de repetirlo.
+
+`stats()` muestra cuántos prefetches terminaron, cuántos se usaron y cuántos vencieron sin usarse.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+from cache import search_cache_key
+from models import Search_results_response
+
+logger = logging.getLogger(__name__)
+
+# Páginas posteriores que se pueden precargar como máximo
+MAX_PREFETCH_DEPTH = 2
+
+
+class Search_prefetcher:
+    """
+    `fetch_page` hace el scrape directamente contra el motor (sin coalescencia, para poder cancelarlo)
+    y `store` guarda el resultado en la caché de búsquedas. `is_cached(key)` indica si ya hay una
+    entrada fresca y `is_under_pressure()` si el motor tiene su capacidad ocupada.
+    """
+
+    def __init__(
+        self,
+        fetch_page: Callable[[str, int, int], Awaitable[Search_results_response]],
+        store: Callable[[str, int, int, Search_results_response], Awaitable[None]],
+        is_cached: Callable[[str], Awaitable[bool]],
+        is_under_pressure: Callable[[], bool],
+        ttl: float,
+        depth: int = 1,
+        concurrency: int = 2,
+    ) -> None:
+        self.fetch_page = fetch_page
+        self.store = store
+        self.is_cached = is_cached
+        self.is_under_pressure = is_under_pressure
+        self.ttl = ttl
+        self.depth = max(0, min(MAX_PREFETCH_DEPTH, depth))
+        self.concurrency = concurrency
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.used = 0
+        self.joined = 0
+        self.expired_unused = 0
+        self.skipped_budget = 0
+        self.skipped_pressure = 0
+        self._in_flight: dict[str, asyncio.Task] = {}
+        self._joined_keys: set[str] = set()
+        # Prefetches terminados que todavía nadie pidió, con el momento en que se guardaron
+        self._unused: dict[str, float] = {}
+
+    async def after_served(self, query_text: str, page: int, page_size: int, total_pages: int) -> None:
+        """Llamar después de servir la página `page` en vivo: precarga las siguientes si conviene."""
+        self._expire_unused()
+        if self.depth == 0:
+            return
+        if self.is_under_pressure():
+            self.skipped_pressure += 1
+            self.shed()
+            return
+        for next_page in range(page + 1, min(page + self.depth, total_pages) + 1):
+            key = search_cache_key(query_text, next_page, page_size)
+            if key in self._in_flight or await self.is_cached(key):
+                continue
+            if key in self._in_flight:
+                # Otra petición lanzó este mismo prefetch mientras se consultaba la caché
+                continue
+            if len(self._in_flight) >= self.concurrency:
+                self.skipped_budget += 1
+                return
+            self.started += 1
+            task = asyncio.create_task(self._prefetch(key, query_text, next_page, page_size))
+            # Marca el error como recuperado aunque ningún usuario llegue a esperar este prefetch
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+            self._in_flight[key] = task
+
+    async def _prefetch(self, key: str, query_text: str, page: int, page_size: int) -> Search_results_response:
+        try:
+            response = await self.fetch_page(query_text, page, page_size)
+            await self.store(query_text, page, page_size, response)
+            self.completed += 1
+            if key in self._joined_keys:
+                # Un usuario ya lo estaba esperando: cuenta como usado
+                self.used += 1
+            else:
+                self._unused[key] = time.time()
+            logger.debug(f"Página precargada: '{query_text}' página {page}")
+            return response
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        except Exception as e:
+            self.failed += 1
+            logger.debug(f"Prefetch de '{query_text}' página {page} falló: {e}")
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+            self._joined_keys.discard(key)
+
+    def join(self, key: str) -> asyncio.Task | None:
+        """Prefetch en curso para `key`, si lo hay; a partir de aquí ya no se cancela por presión."""
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.joined += 1
+            self._joined_keys.add(key)
+        return task
+
+    def note_lookup(self, key: str) -> bool:
+        """Registra que se pidió `key`: si venía de un prefetch aún sin usar, es un acierto (True)."""
+        if self._unused.pop(key, None) is not None:
+            self.used += 1
+            return True
+        return False
+
+    def shed(self) -> int:
+        """Cancela los prefetches en curso que nadie espera. Devuelve cuántos se cancelaron."""
+        cancelled = 0
+        for key, task in list(self._in_flight.items()):
+            if key not in self._joined_keys and not task.done():
+                task.cancel()
+                cancelled += 1
+        if cancelled:
+            logger.info(f"Motor bajo presión: {cancelled} prefetches cancelados")
+        return cancelled
+
+    def _expire_unused(self) -> None:
+        now = time.time()
+        for key, stored_at in list(self._unused.items()):
+            if now - stored_at > self.ttl:
+                del self._unused[key]
+                self.expired_unused += 1
+
+    async def close(self) -> None:
+        tasks = list(self._in_flight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict[str, Any]:
+        self._expire_unused()
+        resolved = self.used + self.expired_unused
+        return {
+            "depth": self.depth,
+            "concurrency": self.concurrency,
+            "in_flight": len(self._in_flight),
+            "started": self.started,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "skipped_budget": self.skipped_budget,
+            "skipped_pressure": self.skipped_pressure,
+            "used": self.used,
+            "joined_in_flight": self.joined,
+            "expired_unused": self.expired_unused,
+            "pending_unused": len(self._unused),
+            # Fracción de prefetches ya resueltos (usados o vencidos) que alguien llegó a pedir
+            "hit_rate": round(self.used / resolved, 3) if resolved else 0.0,
+        }
@@ -0,0 +1,165 @@
+"""
+Comentario: histórico de precios de mercado por producto de TCGplayer y acabado (foil o no).
+Cada precio observado en un scrape (búsquedas y consultas de precio) se agrega a SQLite en dos tablas:
+
+- `price_points`: serie cruda, solo anexos, con clave (product_id, is_foil, observed_at) en una
+  tabla WITHOUT ROWID para que cada serie quede contigua en disco y los rangos de tiempo se lean
+  con un solo recorrido del índice. Los precios van en centavos enteros. Un precio igual al último
+  de la serie no se vuelve a guardar hasta que pase `min_interval`, y de dos precios en el mismo
+  segundo se guarda solo el primero.
+- `price_daily`: resumen diario (apertura, máximo, mínimo, cierre, muestras) que se actualiza en la
+  misma escritura. `GET /api/price/history` lee solo estas filas, así que consultar meses de una
+  carta cuesta lo mismo aunque haya miles de cartas con muchas observaciones cada una.
+"""
+import logging
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from models import Card_price, Price_history_point, Price_history_response, Search_suggestion
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS price_points ("
+    "product_id INTEGER NOT NULL, is_foil INTEGER NOT NULL, observed_at INTEGER NOT NULL, "
+    "price_cents INTEGER NOT NULL, PRIMARY KEY (product_id, is_foil, observed_at)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS price_daily ("
+    "product_id INTEGER NOT NULL, is_foil INTEGER NOT NULL, day INTEGER NOT NULL, "
+    "open_cents INTEGER NOT NULL, high_cents INTEGER NOT NULL, low_cents INTEGER NOT NULL, "
+    "close_cents INTEGER NOT NULL, samples INTEGER NOT NULL, PRIMARY KEY (product_id, is_foil, day)) WITHOUT ROWID",
+]
+
+
+def product_id_from_url(product_url: str | None) -> int | None:
+    """'https://www.tcgplayer.com/product/594325/...' -> 594325."""
+    match = re.search(r"/product/(\d+)", product_url or "")
+    return int(match.group(1)) if match else None
+
+
+class Price_history_store:
+    """Serie temporal de precios en SQLite; varios procesos pueden abrir el mismo archivo."""
+
+    def __init__(self, path: Path, min_interval: float = 3600.0) -> None:
+        self.path = path
+        self.min_interval = min_interval
+        self.appended = 0
+        self.skipped = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # Último (momento, centavos) guardado por serie, para no leer la tabla en cada anexo
+        self._last: dict[tuple[int, int], tuple[int, int]] = {}
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for statement in SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+
+    def append(self, observations: list[tuple[int, bool, float]], observed_at: float | None = None) -> int:
+        """
+        Agrega observaciones (product_id, is_foil, precio) en una sola transacción, así una página de
+        resultados cuesta un commit. Bloquea: desde el event loop se llama con `asyncio.to_thread`.
+        Devuelve cuántas se guardaron.
+        """
+        now = int(observed_at if observed_at is not None else time.time())
+        day = now // SECONDS_PER_DAY
+        rows = []
+        with self._lock:
+            for product_id, is_foil, price in observations:
+                series = (product_id, int(is_foil))
+                cents = round(price * 100)
+                last = self._last.get(series)
+                if last is not None and last[1] == cents and now - last[0] < self.min_interval:
+                    self.skipped += 1
+                    continue
+                # La clave es al segundo: si la serie ya tiene un punto en este segundo (de este u otro
+                # proceso) se conserva el primero, y el resumen diario solo cuenta los puntos guardados
+                inserted = self._conn.execute(
+                    "INSERT OR IGNORE INTO price_points (product_id, is_foil, observed_at, price_cents) VALUES (?, ?, ?, ?)",
+                    (product_id, int(is_foil), now, cents),
+                ).rowcount
+                if not inserted:
+                    self.skipped += 1
+                    continue
+                self._last[series] = (now, cents)
+                rows.append((product_id, int(is_foil), now, cents, day))
+            if not rows:
+                self._conn.commit()
+                return 0
+            self._conn.executemany(
+                "INSERT INTO price_daily (product_id, is_foil, day, open_cents, high_cents, low_cents, close_cents, samples) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 1) ON CONFLICT (product_id, is_foil, day) DO UPDATE SET "
+                "high_cents = max(high_cents, excluded.high_cents), low_cents = min(low_cents, excluded.low_cents), "
+                "close_cents = excluded.close_cents, samples = samples + 1",
+                [(product_id, is_foil, day, cents, cents, cents, cents) for product_id, is_foil, _, cents, day in rows],
+            )
+            self._conn.commit()
+            self.appended += len(rows)
+        return len(rows)
+
+    def record_suggestions(self, suggestions: list[Search_suggestion]) -> int:
+        """Guarda los precios de una búsqueda (los resultados de búsqueda no distinguen foils)."""
+        observations = []
+        for suggestion in suggestions:
+            product_id = product_id_from_url(suggestion.product_url)
+            if product_id is not None and suggestion.market_price is not None:
+                observations.append((product_id, False, suggestion.market_price))
+        return self.append(observations)
+
+    def record_price(self, price: Card_price) -> int:
+        if price.product_id is None:
+            return 0
+        return self.append([(price.product_id, price.is_foil, price.market_price)])
+
+    def history(self, product_id: int, is_foil: bool, days: int, interval: str = "day") -> Price_history_response:
+        """Serie diaria (o semanal, agregando días) de los últimos `days` días."""
+        first_day = int(time.time()) // SECONDS_PER_DAY - days + 1
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT day, open_cents, high_cents, low_cents, close_cents, samples FROM price_daily "
+                "WHERE product_id = ? AND is_foil = ? AND day >= ? ORDER BY day",
+                (product_id, int(is_foil), first_day),
+            ).fetchall()
+
+        buckets: list[list[int]] = []
+        for day, open_cents, high_cents, low_cents, close_cents, samples in rows:
+            # Semanas ISO: el 1970-01-01 fue jueves, así que se desplaza 3 días para empezar en lunes
+            bucket = day if interval == "day" else day - (day + 3) % 7
+            if buckets and buckets[-1][0] == bucket:
+                current = buckets[-1]
+                current[2] = max(current[2], high_cents)
+                current[3] = min(current[3], low_cents)
+                current[4] = close_cents
+                current[5] += samples
+            else:
+                buckets.append([bucket, open_cents, high_cents, low_cents, close_cents, samples])
+
+        epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+        return Price_history_response(
+            product_id=product_id,
+            is_foil=is_foil,
+            interval=interval,
+            points=[
+                Price_history_point(
+                    date=(epoch + timedelta(days=bucket)).date().isoformat(),
+                    open=open_cents / 100,
+                    high=high_cents / 100,
+                    low=low_cents / 100,
+                    close=close_cents / 100,
+                    samples=samples,
+                )
+                for bucket, open_cents, high_cents, low_cents, close_cents, samples in buckets
+            ],
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> dict[str, int]:
+        return {"series_seen": len(self._last), "appended": self.appended, "skipped_unchanged": self.skipped}
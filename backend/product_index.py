@@ -0,0 +1,137 @@
+"""
+Comentario: resolución de número de carta (OP05-119) y variante a ID de producto de TCGplayer para
+que /api/price consulte exactamente ese producto en lugar de quedarse con el primer precio de una
+búsqueda de texto libre.
+
+El mapa número -> productos vive en memoria (LRU) y se alimenta de cada búsqueda en vivo; si no está
+ahí se busca en el catálogo local (índice por `card_number`) y, como último recurso, con una sola
+búsqueda del número en TCGplayer, que también deja aprendidas las demás variantes de la carta.
+"""
+import asyncio
+import logging
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterable
+
+from card_parser import has_variant
+from catalog import Card_catalog
+from models import Card_query, Search_results_response, Search_suggestion
+from price_history import product_id_from_url
+
+logger = logging.getLogger(__name__)
+
+# Resultados de la búsqueda de un número que no está en el mapa: el máximo que admite /api/suggestions
+NUMBER_SEARCH_PAGE_SIZE = 50
+CARD_NUMBER_PATTERN = re.compile(r"^[A-Z0-9]+-[A-Z0-9]+$")
+
+
+def normalize_card_number(card_number: str) -> str:
+    """' op05-119 ' -> 'OP05-119'."""
+    return card_number.strip().upper()
+
+
+@dataclass(frozen=True)
+class Product_ref:
+    product_id: int
+    card_name: str
+    set_name: str | None
+
+
+def choose_product(products: Iterable[Product_ref], variant: str | None) -> Product_ref | None:
+    """
+    Con variante, el producto cuyo nombre la contiene (sin distinguir mayúsculas); sin variante, la
+    impresión base (nombre sin Parallel, Alternate Art, Manga...). Entre varios, el de ID más bajo,
+    que es el que TCGplayer publicó primero.
+    """
+    products = sorted(products, key=lambda product: product.product_id)
+    if variant and variant.strip():
+        wanted = variant.strip().casefold()
+        return next((product for product in products if wanted in product.card_name.casefold()), None)
+    base = [product for product in products if not has_variant(product.card_name)]
+    return (base or products)[0] if products else None
+
+
+class Product_index:
+    """Mapa número de carta -> productos, con el catálogo como respaldo persistente."""
+
+    def __init__(
+        self,
+        search: Callable[[str, int, int], Awaitable[Search_results_response]],
+        catalog: Card_catalog | None = None,
+        max_entries: int = 5000,
+    ) -> None:
+        self.search = search
+        self.catalog = catalog
+        self.max_entries = max_entries
+        self.hits = 0
+        self.catalog_hits = 0
+        self.searches = 0
+        self.unresolved = 0
+        self._by_number: OrderedDict[str, dict[int, Product_ref]] = OrderedDict()
+
+    def learn(self, suggestions: Iterable[Search_suggestion]) -> None:
+        """Agrega al mapa los productos con número de carta de una búsqueda."""
+        for suggestion in suggestions:
+            product_id = product_id_from_url(suggestion.product_url)
+            if product_id is None or not suggestion.card_number:
+                continue
+            number = normalize_card_number(suggestion.card_number)
+            products = self._by_number.setdefault(number, {})
+            products[product_id] = Product_ref(product_id, suggestion.card_name, suggestion.set_name)
+            self._by_number.move_to_end(number)
+        while len(self._by_number) > self.max_entries:
+            self._by_number.popitem(last=False)
+
+    async def _lookup(self, number: str) -> list[Product_ref]:
+        products = self._by_number.get(number)
+        if products:
+            self._by_number.move_to_end(number)
+            self.hits += 1
+            return list(products.values())
+        if self.catalog is not None:
+            # Consulta SQLite bloqueante: en un hilo, para no frenar el event loop
+            cards = await asyncio.to_thread(self.catalog.cards_by_number, number)
+            if cards:
+                self.catalog_hits += 1
+                self.learn(cards)
+                return list(self._by_number.get(number, {}).values())
+        return []
+
+    async def resolve(self, query: Card_query) -> Card_query:
+        """
+        Devuelve la consulta con `product_id` si trae `card_number` (o ya lo traía). Las consultas
+        solo por nombre se devuelven igual. Lanza ValueError si el número no corresponde a ninguna carta.
+        """
+        if query.product_id is not None or not query.card_number:
+            return query
+        number = normalize_card_number(query.card_number)
+        products = await self._lookup(number)
+        if not products and CARD_NUMBER_PATTERN.match(number):
+            self.searches += 1
+            response = await self.search(number, 1, NUMBER_SEARCH_PAGE_SIZE)
+            self.learn(response.results)
+            products = list(self._by_number.get(number, {}).values())
+
+        product = choose_product(products, query.variant)
+        if product is None:
+            self.unresolved += 1
+            variant = f" ({query.variant})" if query.variant else ""
+            raise ValueError(f"No se encontró ningún producto de TCGplayer para la carta {number}{variant}.")
+        logger.info(f"Carta {number}{' ' + query.variant if query.variant else ''} -> producto {product.product_id}")
+        return query.model_copy(
+            update={
+                "product_id": product.product_id,
+                "card_name": query.card_name or product.card_name,
+                "set_name": query.set_name or product.set_name or "",
+            }
+        )
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "card_numbers": len(self._by_number),
+            "hits": self.hits,
+            "catalog_hits": self.catalog_hits,
+            "searches": self.searches,
+            "unresolved": self.unresolved,
+        }
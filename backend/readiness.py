@@ -0,0 +1,215 @@
+"""
+Comentario: detección de "página lista" basada en señales concretas en lugar de esperas fijas
+(`wait_for_timeout`). Cada flujo de scraping espera solo lo necesario:
+
+- la respuesta XHR de búsqueda de productos (`/v1/search/request`), que indica que los datos llegaron;
+- el selector de precio con un texto que ya contiene un precio;
+- que la cantidad de tarjetas de producto deje de cambiar durante una ventana corta.
+
+`Stage_timer` mide cada etapa de una solicitud y `readiness_stats` acumula las duraciones por
+flujo y etapa para exponerlas en `GET /api/stats`. Cada etapa también se publica en el histograma
+`optcg_scrape_stage_seconds` de `GET /metrics` apenas termina, así que los scrapes que fallan a
+mitad de camino también muestran dónde se fue el tiempo.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from metrics import scrape_stage_seconds
+
+logger = logging.getLogger(__name__)
+
+# Fragmento de URL del XHR con el que la vista de grid pide los productos
+SEARCH_XHR_URL_FRAGMENT = "/v1/search/request"
+
+# Límites de cada espera; si una señal no llega se sigue con lo que haya en la página
+SEARCH_XHR_TIMEOUT_MS = 10000
+PRICE_READY_TIMEOUT_MS = 15000
+CARDS_STABLE_TIMEOUT_MS = 10000
+CARDS_FALLBACK_TIMEOUT_MS = 5000
+LAZY_LOAD_TIMEOUT_MS = 3000
+# Ventanas sin cambios en la cantidad de tarjetas para darlas por estables
+CARDS_QUIET_MS = 500
+LAZY_LOAD_QUIET_MS = 300
+POLLING_INTERVAL_MS = 100
+
+# Verdadero cuando algún elemento del selector ya muestra un precio ("$3.78")
+PRICE_READY_SCRIPT = """
+    (selector) => Array.from(document.querySelectorAll(selector))
+        .some((element) => /\\$\\s*\\d/.test(element.textContent || ''))
+"""
+
+# Verdadero cuando hay tarjetas y su cantidad no cambió durante `quietMs`. El estado vive en
+# `window` bajo `key` para que cada espera (antes y después del scroll) empiece de cero.
+CARDS_STABLE_SCRIPT = """
+    ({ selector, quietMs, key }) => {
+        const state = (window.__optcgReadiness = window.__optcgReadiness || {});
+        const count = document.querySelectorAll(selector).length;
+        const now = performance.now();
+        const previous = state[key];
+        if (!previous || previous.count !== count) {
+            state[key] = { count, since: now };
+            return false;
+        }
+        return count > 0 && now - previous.since >= quietMs;
+    }
+"""
+
+# Muestras recientes por etapa para calcular percentiles
+RECENT_SAMPLES = 200
+
+
+def is_search_response(response) -> bool:
+    return SEARCH_XHR_URL_FRAGMENT in response.url
+
+
+class Readiness_stats:
+    """Duraciones por flujo y etapa. Se actualiza desde los hilos de los slots, de ahí el lock."""
+
+    def __init__(self) -> None:
+        self._samples: dict[str, dict[str, deque[float]]] = {}
+        self._counts: dict[str, dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, flow: str, stages: dict[str, float]) -> None:
+        with self._lock:
+            flow_samples = self._samples.setdefault(flow, {})
+            flow_counts = self._counts.setdefault(flow, {})
+            for stage, seconds in stages.items():
+                flow_samples.setdefault(stage, deque(maxlen=RECENT_SAMPLES)).append(seconds)
+                flow_counts[stage] = flow_counts.get(stage, 0) + 1
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            result: dict[str, Any] = {}
+            for flow, stages in self._samples.items():
+                result[flow] = {}
+                for stage, samples in stages.items():
+                    ordered = sorted(samples)
+                    result[flow][stage] = {
+                        "count": self._counts[flow][stage],
+                        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 1),
+                        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+                        "max_ms": round(ordered[-1] * 1000, 1),
+                    }
+            return result
+
+
+readiness_stats = Readiness_stats()
+
+
+class Stage_timer:
+    """Cronometra las etapas de una solicitud de scraping (`goto`, `search_xhr`, `price_ready`...)."""
+
+    def __init__(self, flow: str) -> None:
+        self.flow = flow
+        self.stages: dict[str, float] = {}
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = time.perf_counter() - started
+            scrape_stage_seconds.observe(self.stages[name], self.flow, name)
+
+    def finish(self) -> None:
+        self.stages["total"] = time.perf_counter() - self._started
+        scrape_stage_seconds.observe(self.stages["total"], self.flow, "total")
+        readiness_stats.record(self.flow, self.stages)
+        logger.info(
+            f"Etapas de '{self.flow}': "
+            + ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in self.stages.items())
+        )
+
+
+class Search_response_watch:
+    """
+    Registra si ya llegó el XHR de búsqueda. Se instala antes de `goto` para no perder la respuesta
+    si llega mientras se carga el documento.
+    """
+
+    def __init__(self, browser_page) -> None:
+        self.arrived = False
+        browser_page.on("response", self._on_response)
+
+    def _on_response(self, response) -> None:
+        if is_search_response(response):
+            self.arrived = True
+
+    def wait_sync(self, browser_page, timeout: float = SEARCH_XHR_TIMEOUT_MS) -> bool:
+        if self.arrived:
+            return True
+        try:
+            browser_page.wait_for_event("response", predicate=is_search_response, timeout=timeout)
+            return True
+        except Exception as e:
+            logger.debug(f"No llegó el XHR de búsqueda: {e}")
+            return False
+
+    async def wait(self, browser_page, timeout: float = SEARCH_XHR_TIMEOUT_MS) -> bool:
+        if self.arrived:
+            return True
+        try:
+            await browser_page.wait_for_event("response", predicate=is_search_response, timeout=timeout)
+            return True
+        except Exception as e:
+            logger.debug(f"No llegó el XHR de búsqueda: {e}")
+            return False
+
+
+def wait_for_price_sync(browser_page, selector: str, timeout: float = PRICE_READY_TIMEOUT_MS) -> bool:
+    """Espera a que el selector de precio tenga un precio; devuelve False si no aparece a tiempo."""
+    try:
+        browser_page.wait_for_function(PRICE_READY_SCRIPT, arg=selector, timeout=timeout, polling=POLLING_INTERVAL_MS)
+        return True
+    except Exception as e:
+        logger.warning(f"El precio no apareció en {timeout:.0f}ms: {e}")
+        return False
+
+
+async def wait_for_price(browser_page, selector: str, timeout: float = PRICE_READY_TIMEOUT_MS) -> bool:
+    try:
+        await browser_page.wait_for_function(PRICE_READY_SCRIPT, arg=selector, timeout=timeout, polling=POLLING_INTERVAL_MS)
+        return True
+    except Exception as e:
+        logger.warning(f"El precio no apareció en {timeout:.0f}ms: {e}")
+        return False
+
+
+def wait_for_cards_stable_sync(
+    browser_page, selector: str, key: str, quiet_ms: float = CARDS_QUIET_MS, timeout: float = CARDS_STABLE_TIMEOUT_MS
+) -> bool:
+    """Espera a que la cantidad de tarjetas deje de cambiar durante `quiet_ms`."""
+    try:
+        browser_page.wait_for_function(
+            CARDS_STABLE_SCRIPT,
+            arg={"selector": selector, "quietMs": quiet_ms, "key": key},
+            timeout=timeout,
+            polling=POLLING_INTERVAL_MS,
+        )
+        return True
+    except Exception as e:
+        logger.warning(f"Las tarjetas no se estabilizaron en {timeout:.0f}ms ({key}): {e}")
+        return False
+
+
+async def wait_for_cards_stable(
+    browser_page, selector: str, key: str, quiet_ms: float = CARDS_QUIET_MS, timeout: float = CARDS_STABLE_TIMEOUT_MS
+) -> bool:
+    try:
+        await browser_page.wait_for_function(
+            CARDS_STABLE_SCRIPT,
+            arg={"selector": selector, "quietMs": quiet_ms, "key": key},
+            timeout=timeout,
+            polling=POLLING_INTERVAL_MS,
+        )
+        return True
+    except Exception as e:
+        logger.warning(f"Las tarjetas no se estabilizaron en {timeout:.0f}ms ({key}): {e}")
+        return False
@@ -0,0 +1,227 @@
+"""
+Comentario: refresco proactivo de precios. Sin esto, el primer usuario que pide una carta (o el
+primero después de que vence la caché) siempre paga el scrape completo.
+
+El planificador mantiene una lista de seguimiento alimentada por la frecuencia de /api/price y
+/api/suggestions. Cada cierto intervalo ordena las entradas que están por vencer en una cola de
+prioridad (las más pedidas y las de precio más volátil primero) y las refresca con un número fijo
+de workers y un límite de refrescos por minuto hacia TCGplayer. Si el motor ya tiene scrapes en
+cola por tráfico en vivo, el ciclo se salta para no competir con los usuarios.
+"""
+import asyncio
+import heapq
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# Peso de la volatilidad en la prioridad: una carta que cambió 10% pesa el doble que una estable
+VOLATILITY_WEIGHT = 10.0
+# Suavizado de la volatilidad (media móvil exponencial del cambio relativo de precio)
+VOLATILITY_SMOOTHING = 0.3
+# Entradas cuya popularidad decayó por debajo de esto (~4 vidas medias sin pedirse) dejan de seguirse
+MIN_SCORE = 0.05
+# Piso de `refresh_after`: con un TTL de 0 la prioridad dividiría por cero
+MIN_REFRESH_AFTER = 1.0
+
+Refresh_fn = Callable[[], Awaitable[float | None]]
+
+
+@dataclass
+class Watch_entry:
+    key: str
+    refresh: Refresh_fn
+    refresh_after: float
+    score: float = 0.0
+    last_requested: float = field(default_factory=time.time)
+    last_refreshed: float = field(default_factory=time.time)
+    last_price: float | None = None
+    volatility: float = 0.0
+    refreshes: int = 0
+    failures: int = 0
+
+    def decayed_score(self, now: float, half_life: float) -> float:
+        return self.score * 0.5 ** ((now - self.last_requested) / half_life)
+
+    def priority(self, now: float, half_life: float) -> float:
+        overdue = (now - self.last_refreshed) / self.refresh_after
+        return self.decayed_score(now, half_life) * (1 + self.volatility * VOLATILITY_WEIGHT) * overdue
+
+    def record_price(self, price: float | None) -> None:
+        if price is not None and self.last_price:
+            change = abs(price - self.last_price) / self.last_price
+            self.volatility = (1 - VOLATILITY_SMOOTHING) * self.volatility + VOLATILITY_SMOOTHING * change
+        if price is not None:
+            self.last_price = price
+
+
+class Refresh_scheduler:
+    """
+    Comentario: `observe(key, refresh, refresh_after)` registra una solicitud; `refresh()` debe
+    volver a scrapear y guardar el dato (caché o catálogo) y devolver el precio si lo hay, para
+    medir la volatilidad. Una entrada vence `refresh_after` segundos después de su último refresco.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        rate_per_minute: float = 30.0,
+        interval: float = 15.0,
+        max_entries: int = 500,
+        half_life: float = 3600.0,
+        is_busy: Callable[[], bool] | None = None,
+    ) -> None:
+        self.workers = workers
+        self.rate_per_minute = rate_per_minute
+        self.interval = interval
+        self.max_entries = max_entries
+        self.half_life = half_life
+        self.is_busy = is_busy or (lambda: False)
+        self.refreshed = 0
+        self.failed = 0
+        self.skipped_busy = 0
+        self.evicted = 0
+        self._entries: dict[str, Watch_entry] = {}
+        self._queue: list[tuple[float, str]] = []
+        self._queued: set[str] = set()
+        self._wakeup = asyncio.Event()
+        self._next_start = 0.0
+        self._rate_lock = asyncio.Lock()
+        self._tasks: list[asyncio.Task] = []
+
+    def observe(self, key: str, refresh: Refresh_fn, refresh_after: float, price: float | None = None) -> None:
+        """Suma una solicitud a la entrada `key` (la crea si no existe) con decaimiento exponencial."""
+        now = time.time()
+        refresh_after = max(MIN_REFRESH_AFTER, refresh_after)
+        entry = self._entries.get(key)
+        is_new = entry is None
+        if entry is None:
+            # La solicitud que la crea acaba de obtener el dato, así que cuenta como refresco
+            entry = Watch_entry(key=key, refresh=refresh, refresh_after=refresh_after, last_price=price)
+            self._entries[key] = entry
+        entry.score = entry.decayed_score(now, self.half_life) + 1
+        entry.last_requested = now
+        entry.refresh = refresh
+        entry.refresh_after = refresh_after
+        if is_new and len(self._entries) > self.max_entries:
+            # La entrada recién creada no compite: si no, siempre sería la más fría y se iría ella
+            self._evict(now, keep=key)
+
+    def _evict(self, now: float, keep: str | None = None) -> None:
+        coldest = min(
+            (entry for entry in self._entries.values() if entry.key not in self._queued and entry.key != keep),
+            key=lambda entry: entry.decayed_score(now, self.half_life),
+            default=None,
+        )
+        if coldest is not None:
+            del self._entries[coldest.key]
+            self.evicted += 1
+
+    async def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._plan_loop())]
+        self._tasks += [asyncio.create_task(self._worker(worker_id)) for worker_id in range(self.workers)]
+        logger.info(
+            f"Planificador de refrescos iniciado: {self.workers} workers, {self.rate_per_minute:g} refrescos/min"
+        )
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def plan(self) -> int:
+        """Encola por prioridad las entradas vencidas. Devuelve cuántas se agregaron."""
+        if self.is_busy():
+            self.skipped_busy += 1
+            return 0
+        now = time.time()
+        for entry in list(self._entries.values()):
+            if entry.key not in self._queued and entry.decayed_score(now, self.half_life) < MIN_SCORE:
+                del self._entries[entry.key]
+                self.evicted += 1
+        added = 0
+        for entry in self._entries.values():
+            if entry.key in self._queued or now - entry.last_refreshed < entry.refresh_after:
+                continue
+            heapq.heappush(self._queue, (-entry.priority(now, self.half_life), entry.key))
+            self._queued.add(entry.key)
+            added += 1
+        if added:
+            self._wakeup.set()
+        return added
+
+    async def _plan_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.plan()
+            except Exception as e:
+                logger.warning(f"Error planificando refrescos: {e}")
+
+    async def _wait_rate_limit(self) -> None:
+        # Espaciado uniforme entre refrescos: como máximo `rate_per_minute` inicios por minuto
+        async with self._rate_lock:
+            delay = self._next_start - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_start = time.monotonic() + 60.0 / self.rate_per_minute
+
+    async def _worker(self, worker_id: int) -> None:
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            _, key = heapq.heappop(self._queue)
+            entry = self._entries.get(key)
+            if entry is None:
+                self._queued.discard(key)
+                continue
+            try:
+                await self._wait_rate_limit()
+                if self.is_busy():
+                    # El tráfico en vivo tiene prioridad: se vuelve a planificar en el próximo ciclo
+                    self.skipped_busy += 1
+                    continue
+                entry.record_price(await entry.refresh())
+                entry.refreshes += 1
+                entry.last_refreshed = time.time()
+                self.refreshed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Aunque falle, esperamos otro `refresh_after` antes de reintentar
+                entry.failures += 1
+                entry.last_refreshed = time.time()
+                self.failed += 1
+                logger.warning(f"Refresco proactivo de '{key}' falló: {e}")
+            finally:
+                self._queued.discard(key)
+
+    def stats(self) -> dict[str, Any]:
+        now = time.time()
+        hottest = sorted(
+            self._entries.values(), key=lambda entry: entry.decayed_score(now, self.half_life), reverse=True
+        )[:5]
+        return {
+            "watched": len(self._entries),
+            "queued": len(self._queue),
+            "workers": self.workers,
+            "rate_per_minute": self.rate_per_minute,
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+            "skipped_busy": self.skipped_busy,
+            "evicted": self.evicted,
+            "hottest": [
+                {
+                    "key": entry.key,
+                    "score": round(entry.decayed_score(now, self.half_life), 2),
+                    "volatility": round(entry.volatility, 4),
+                    "refreshes": entry.refreshes,
+                }
+                for entry in hottest
+            ],
+        }
@@ -0,0 +1,179 @@
+"""
+Comentario: perfil liviano para las páginas de scraping. Solo leemos texto del DOM y las URLs de
+imagen se construyen a partir del ID del producto, así que no hace falta descargar imágenes, video,
+fuentes ni los trackers de terceros. Cada página instala una intercepción (`page.route`) que aborta
+esas solicitudes salvo las que coincidan con la lista de permitidos, y lleva sus propios contadores
+para medir cuántas solicitudes se bloquearon y cuántos bytes se descargaron de verdad.
+"""
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Tipos de recurso de Playwright (`request.resource_type`) que no aportan nada al scraping
+DEFAULT_BLOCKED_RESOURCE_TYPES = ("image", "media", "font")
+
+# Analítica, publicidad y trackers que carga TCGplayer; se compara por sufijo de host
+DEFAULT_BLOCKED_DOMAINS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googleadservices.com",
+    "googlesyndication.com",
+    "doubleclick.net",
+    "facebook.net",
+    "facebook.com",
+    "hotjar.com",
+    "clarity.ms",
+    "bing.com",
+    "segment.io",
+    "segment.com",
+    "nr-data.net",
+    "newrelic.com",
+    "optimizely.com",
+    "criteo.com",
+    "criteo.net",
+    "adsrvr.org",
+    "amazon-adsystem.com",
+    "tiktok.com",
+    "pinterest.com",
+    "reddit.com",
+    "quantserve.com",
+    "scorecardresearch.com",
+)
+
+
+def _host_matches(host: str, domains: tuple[str, ...]) -> bool:
+    return any(host == domain or host.endswith(f".{domain}") for domain in domains)
+
+
+@dataclass(frozen=True)
+class Blocking_profile:
+    """Qué se aborta en las páginas de scraping. `allowed_domains` gana siempre sobre lo bloqueado."""
+
+    enabled: bool = True
+    blocked_resource_types: tuple[str, ...] = DEFAULT_BLOCKED_RESOURCE_TYPES
+    blocked_domains: tuple[str, ...] = DEFAULT_BLOCKED_DOMAINS
+    allowed_domains: tuple[str, ...] = ()
+
+    def block_reason(self, url: str, resource_type: str) -> str | None:
+        """Devuelve el motivo del bloqueo ("type:<tipo>" o "domain") o None si la solicitud pasa."""
+        if not self.enabled:
+            return None
+        host = (urlsplit(url).hostname or "").lower()
+        if self.allowed_domains and _host_matches(host, self.allowed_domains):
+            return None
+        if _host_matches(host, self.blocked_domains):
+            return "domain"
+        if resource_type in self.blocked_resource_types:
+            return f"type:{resource_type}"
+        return None
+
+
+@dataclass
+class Page_blocking_counters:
+    """Contadores de una sola página (una solicitud de scraping)."""
+
+    requests_allowed: int = 0
+    requests_blocked: int = 0
+    bytes_received: int = 0
+    blocked_by_reason: dict[str, int] = field(default_factory=dict)
+
+    def record(self, reason: str | None) -> None:
+        if reason is None:
+            self.requests_allowed += 1
+            return
+        self.requests_blocked += 1
+        self.blocked_by_reason[reason] = self.blocked_by_reason.get(reason, 0) + 1
+
+    def record_response(self, headers: dict[str, str]) -> None:
+        # Content-Length falta en respuestas chunked; es una cota inferior, suficiente para comparar perfiles
+        try:
+            self.bytes_received += int(headers.get("content-length") or 0)
+        except ValueError:
+            pass
+
+
+class Blocking_stats:
+    """Acumulado de todas las páginas. Se actualiza desde los hilos de los slots, de ahí el lock."""
+
+    def __init__(self, profile: Blocking_profile) -> None:
+        self.profile = profile
+        self.pages = 0
+        self.requests_allowed = 0
+        self.requests_blocked = 0
+        self.bytes_received = 0
+        self.blocked_by_reason: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, counters: Page_blocking_counters) -> None:
+        with self._lock:
+            self.pages += 1
+            self.requests_allowed += counters.requests_allowed
+            self.requests_blocked += counters.requests_blocked
+            self.bytes_received += counters.bytes_received
+            for reason, count in counters.blocked_by_reason.items():
+                self.blocked_by_reason[reason] = self.blocked_by_reason.get(reason, 0) + count
+        logger.debug(
+            f"Página de scraping: {counters.requests_blocked} solicitudes bloqueadas, "
+            f"{counters.requests_allowed} permitidas, {counters.bytes_received} bytes recibidos"
+        )
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            pages = self.pages
+            return {
+                "enabled": self.profile.enabled,
+                "pages": pages,
+                "requests_allowed": self.requests_allowed,
+                "requests_blocked": self.requests_blocked,
+                "bytes_received": self.bytes_received,
+                "avg_requests_blocked_per_page": round(self.requests_blocked / pages, 1) if pages else 0.0,
+                "avg_bytes_received_per_page": round(self.bytes_received / pages) if pages else 0,
+                "blocked_by_reason": dict(self.blocked_by_reason),
+            }
+
+
+def install_blocking_sync(browser_page, profile: Blocking_profile) -> Page_blocking_counters:
+    """Instala la intercepción en una página de la API síncrona y devuelve sus contadores."""
+    counters = Page_blocking_counters()
+    browser_page.on("response", lambda response: counters.record_response(response.headers))
+    if not profile.enabled:
+        # Sin perfil solo contamos, para tener la línea base con la que comparar
+        browser_page.on("request", lambda _: counters.record(None))
+        return counters
+
+    def handle_route(route) -> None:
+        request = route.request
+        reason = profile.block_reason(request.url, request.resource_type)
+        counters.record(reason)
+        if reason is None:
+            route.continue_()
+        else:
+            route.abort("blockedbyclient")
+
+    browser_page.route("**/*", handle_route)
+    return counters
+
+
+async def install_blocking(browser_page, profile: Blocking_profile) -> Page_blocking_counters:
+    """Versión asíncrona de `install_blocking_sync` para el pool nativo."""
+    counters = Page_blocking_counters()
+    browser_page.on("response", lambda response: counters.record_response(response.headers))
+    if not profile.enabled:
+        browser_page.on("request", lambda _: counters.record(None))
+        return counters
+
+    async def handle_route(route) -> None:
+        request = route.request
+        reason = profile.block_reason(request.url, request.resource_type)
+        counters.record(reason)
+        if reason is None:
+            await route.continue_()
+        else:
+            await route.abort("blockedbyclient")
+
+    await browser_page.route("**/*", handle_route)
+    return counters
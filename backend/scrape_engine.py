@@ -0,0 +1,499 @@
+"""
+Comentario: motores de scraping que usan los endpoints. Ambos exponen la misma interfaz
+(`fetch_card_price`, `search`, `stream_search`, `start`, `stop`, `stats`) para que el API no dependa del modo:
+
+- `Async_scrape_engine` (por defecto): Playwright asíncrono sobre el event loop de uvicorn con un
+  semáforo de concurrencia configurable.
+- `Sync_scrape_engine` (OPTCG_SCRAPE_ENGINE=sync): pool de hilos con la API síncrona, útil en Windows
+  cuando el event loop no permite lanzar subprocesos (NotImplementedError).
+
+Los dos registran métricas de cola por solicitud: cuánto esperó cada scrape antes de empezar y cuánto tardó.
+`Fast_path_scrape_engine` envuelve a cualquiera de ellos y consulta primero el API JSON de TCGplayer.
+Con OPTCG_WORKER_PROCESSES=N, `Process_scrape_engine` (`worker_pool.py`) reparte los scrapes entre N
+procesos que crean cada uno su propio motor con `create_local_scrape_engine`.
+`Governed_scrape_engine` envuelve al resultado y pasa todo el tráfico hacia TCGplayer por el
+regulador de `upstream_governor.py` (límite de ritmo, concurrencia adaptativa y circuit breaker).
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable
+
+from browser_pool import Async_browser_pool, Browser_pool
+from memory_governor import MIB, Memory_governor
+from metrics import scrape_queue_wait_seconds, scrape_run_seconds
+from models import Card_price, Card_query, Search_results_response, Search_suggestion
+from resource_blocking import DEFAULT_BLOCKED_DOMAINS, Blocking_profile
+from scraper import (
+    fetch_card_price_from_page,
+    fetch_card_price_from_tcgplayer_sync,
+    get_search_suggestions_from_page,
+    get_search_suggestions_sync,
+    iter_search_suggestions_from_page,
+    iter_search_suggestions_sync,
+)
+from settings import App_settings
+from tcgplayer_api import Tcgplayer_api_client
+from upstream_governor import Upstream_governor, Upstream_throttled
+from worker_pool import Process_scrape_engine
+
+logger = logging.getLogger(__name__)
+
+
+class Scrape_ticket:
+    """Tiempos de una solicitud de scraping: encolada, iniciada y terminada."""
+
+    __slots__ = ("kind", "enqueued_at", "started_at", "finished_at", "ok")
+
+    def __init__(self, kind: str) -> None:
+        self.kind = kind
+        self.enqueued_at = time.perf_counter()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.ok: bool | None = None
+
+    @property
+    def wait_seconds(self) -> float:
+        return (self.started_at or self.finished_at or time.perf_counter()) - self.enqueued_at
+
+    @property
+    def run_seconds(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+
+class Scrape_metrics:
+    """
+    Contadores de cola del motor. Usa un lock porque en modo síncrono `start` se llama
+    desde el hilo del slot del navegador.
+    """
+
+    def __init__(self, recent_size: int = 100) -> None:
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+        self._recent: deque[Scrape_ticket] = deque(maxlen=recent_size)
+
+    def enqueue(self, kind: str) -> Scrape_ticket:
+        with self._lock:
+            self.queued += 1
+        return Scrape_ticket(kind)
+
+    def start(self, ticket: Scrape_ticket) -> None:
+        with self._lock:
+            ticket.started_at = time.perf_counter()
+            self.queued -= 1
+            self.in_flight += 1
+
+    def finish(self, ticket: Scrape_ticket, ok: bool) -> None:
+        with self._lock:
+            ticket.finished_at = time.perf_counter()
+            ticket.ok = ok
+            if ticket.started_at is None:
+                # Falló antes de obtener un navegador (p. ej. pool cerrado)
+                self.queued -= 1
+            else:
+                self.in_flight -= 1
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+            self.total_wait_seconds += ticket.wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, ticket.wait_seconds)
+            self.total_run_seconds += ticket.run_seconds
+            self._recent.append(ticket)
+        scrape_queue_wait_seconds.observe(ticket.wait_seconds, ticket.kind)
+        if ticket.started_at is not None:
+            scrape_run_seconds.observe(ticket.run_seconds, ticket.kind, "ok" if ok else "error")
+        logger.info(
+            f"Scrape '{ticket.kind}' {'ok' if ok else 'fallido'}: "
+            f"espera en cola {ticket.wait_seconds:.3f}s, ejecución {ticket.run_seconds:.3f}s"
+        )
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                "queued": self.queued,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_wait_seconds": round(self.total_wait_seconds / finished, 4) if finished else 0.0,
+                "max_wait_seconds": round(self.max_wait_seconds, 4),
+                "avg_run_seconds": round(self.total_run_seconds / finished, 4) if finished else 0.0,
+                "recent": [
+                    {
+                        "kind": t.kind,
+                        "ok": t.ok,
+                        "wait_seconds": round(t.wait_seconds, 4),
+                        "run_seconds": round(t.run_seconds, 4),
+                    }
+                    for t in self._recent
+                ],
+            }
+
+
+class Async_scrape_engine:
+    """Motor nativo: las páginas salen de un `Async_browser_pool` y la concurrencia la limita un semáforo."""
+
+    mode = "async"
+
+    def __init__(self, pool: Async_browser_pool, concurrency: int = 8) -> None:
+        self.pool = pool
+        self.concurrency = concurrency
+        self.metrics = Scrape_metrics()
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def start(self) -> None:
+        await self.pool.start()
+
+    async def stop(self) -> None:
+        await self.pool.stop()
+
+    async def _run(self, kind: str, job: Callable[..., Any], *args: Any) -> Any:
+        ticket = self.metrics.enqueue(kind)
+        ok = False
+        try:
+            async with self._semaphore:
+                self.metrics.start(ticket)
+                async with self.pool.page() as browser_page:
+                    result = await job(browser_page, *args)
+            ok = True
+            return result
+        finally:
+            self.metrics.finish(ticket, ok)
+
+    async def fetch_card_price(self, query: Card_query) -> Card_price:
+        return await self._run("price", fetch_card_price_from_page, query)
+
+    async def search(self, query_text: str, page: int = 1, page_size: int = 24) -> Search_results_response:
+        return await self._run("suggestions", get_search_suggestions_from_page, query_text, page, page_size)
+
+    async def stream_search(
+        self, query_text: str, page: int = 1, page_size: int = 24
+    ) -> AsyncIterator[Search_suggestion | Search_results_response]:
+        """Emite cada sugerencia apenas se extrae y, al final, la respuesta paginada completa."""
+        ticket = self.metrics.enqueue("suggestions_stream")
+        ok = False
+        try:
+            async with self._semaphore:
+                self.metrics.start(ticket)
+                async with self.pool.page() as browser_page:
+                    async for item in iter_search_suggestions_from_page(browser_page, query_text, page, page_size):
+                        yield item
+            ok = True
+        finally:
+            self.metrics.finish(ticket, ok)
+
+    def stats(self) -> dict[str, Any]:
+        return {"mode": self.mode, "concurrency": self.concurrency, **self.metrics.stats(), "pool": self.pool.stats()}
+
+
+class Sync_scrape_engine:
+    """Motor síncrono: cada scrape ocupa un slot (hilo + navegador) del `Browser_pool`."""
+
+    mode = "sync"
+
+    def __init__(self, pool: Browser_pool) -> None:
+        self.pool = pool
+        self.concurrency = pool.size
+        self.metrics = Scrape_metrics()
+
+    async def start(self) -> None:
+        await self.pool.start()
+
+    async def stop(self) -> None:
+        await self.pool.stop()
+
+    async def _run(self, kind: str, job: Callable[..., Any], *args: Any) -> Any:
+        ticket = self.metrics.enqueue(kind)
+
+        def timed_job(browser_page, *job_args):
+            # Se ejecuta en el hilo del slot: aquí termina la espera en cola
+            self.metrics.start(ticket)
+            return job(browser_page, *job_args)
+
+        ok = False
+        try:
+            result = await self.pool.run(timed_job, *args)
+            ok = True
+            return result
+        finally:
+            self.metrics.finish(ticket, ok)
+
+    async def fetch_card_price(self, query: Card_query) -> Card_price:
+        return await self._run("price", fetch_card_price_from_tcgplayer_sync, query)
+
+    async def search(self, query_text: str, page: int = 1, page_size: int = 24) -> Search_results_response:
+        return await self._run("suggestions", get_search_suggestions_sync, query_text, page, page_size)
+
+    async def stream_search(
+        self, query_text: str, page: int = 1, page_size: int = 24
+    ) -> AsyncIterator[Search_suggestion | Search_results_response]:
+        """
+        El generador síncrono corre en el hilo del slot y pasa cada elemento al event loop
+        mediante una cola, así que el cliente los recibe a medida que se extraen.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+
+        def stream_job(browser_page, *job_args):
+            try:
+                for item in iter_search_suggestions_sync(browser_page, *job_args):
+                    loop.call_soon_threadsafe(queue.put_nowait, item)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        task = asyncio.ensure_future(self._run("suggestions_stream", stream_job, query_text, page, page_size))
+        # Si el trabajo falla antes de empezar (p. ej. pool cerrado) la cola también debe cerrarse
+        task.add_done_callback(lambda _: queue.put_nowait(done))
+        # Si el cliente se desconecta el scrape termina igual; evitamos el aviso de excepción no recuperada
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            yield item
+        await task
+
+    def stats(self) -> dict[str, Any]:
+        return {"mode": self.mode, "concurrency": self.concurrency, **self.metrics.stats(), "pool": self.pool.stats()}
+
+
+class Fast_path_scrape_engine:
+    """
+    Comentario: consulta primero el API JSON de TCGplayer por HTTP (sin navegador) y solo usa el
+    motor de Playwright si el camino rápido falla o no encuentra precio. Si TCGplayer nos está
+    limitando (`Upstream_throttled`) no hay respaldo: el error sube al regulador.
+    """
+
+    def __init__(self, api_client: Tcgplayer_api_client, browser_engine: Async_scrape_engine | Sync_scrape_engine) -> None:
+        self.api_client = api_client
+        self.browser_engine = browser_engine
+        self.mode = f"json+{browser_engine.mode}"
+        self.concurrency = browser_engine.concurrency
+        self.fast_path_hits = 0
+        self.fallbacks = 0
+        self.throttled = 0
+
+    async def start(self) -> None:
+        await self.api_client.start()
+        await self.browser_engine.start()
+
+    async def stop(self) -> None:
+        await self.api_client.stop()
+        await self.browser_engine.stop()
+
+    async def _with_fallback(self, kind: str, fast: Callable[[], Any], slow: Callable[[], Any]) -> Any:
+        try:
+            result = await fast()
+            self.fast_path_hits += 1
+            return result
+        except Upstream_throttled:
+            self.throttled += 1
+            raise
+        except Exception as e:
+            self.fallbacks += 1
+            logger.warning(f"Camino rápido JSON falló para '{kind}', usando Playwright: {e}")
+        return await slow()
+
+    async def fetch_card_price(self, query: Card_query) -> Card_price:
+        return await self._with_fallback(
+            "price",
+            lambda: self.api_client.fetch_card_price(query),
+            lambda: self.browser_engine.fetch_card_price(query),
+        )
+
+    async def search(self, query_text: str, page: int = 1, page_size: int = 24) -> Search_results_response:
+        return await self._with_fallback(
+            "suggestions",
+            lambda: self.api_client.search(query_text, page, page_size),
+            lambda: self.browser_engine.search(query_text, page, page_size),
+        )
+
+    async def stream_search(
+        self, query_text: str, page: int = 1, page_size: int = 24
+    ) -> AsyncIterator[Search_suggestion | Search_results_response]:
+        """El API JSON entrega la página entera de una vez; si falla, se transmite desde Playwright."""
+        try:
+            response = await self.api_client.search(query_text, page, page_size)
+            self.fast_path_hits += 1
+        except Upstream_throttled:
+            self.throttled += 1
+            raise
+        except Exception as e:
+            self.fallbacks += 1
+            logger.warning(f"Camino rápido JSON falló para 'suggestions_stream', usando Playwright: {e}")
+            async for item in self.browser_engine.stream_search(query_text, page, page_size):
+                yield item
+            return
+        for suggestion in response.results:
+            yield suggestion
+        yield response
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            **self.browser_engine.stats(),
+            "mode": self.mode,
+            "fast_path_hits": self.fast_path_hits,
+            "fast_path_fallbacks": self.fallbacks,
+            "fast_path_throttled": self.throttled,
+        }
+
+
+Engine = Async_scrape_engine | Sync_scrape_engine | Fast_path_scrape_engine | Process_scrape_engine
+
+
+class Governed_scrape_engine:
+    """
+    Comentario: cada operación (con camino rápido y respaldo incluidos) pide permiso al regulador
+    antes de tocar TCGplayer. Si el circuito está abierto falla al instante con `Upstream_unavailable`.
+    """
+
+    def __init__(self, engine: Engine, governor: Upstream_governor) -> None:
+        self.engine = engine
+        self.governor = governor
+        self.mode = engine.mode
+
+    async def start(self) -> None:
+        await self.engine.start()
+
+    async def stop(self) -> None:
+        await self.engine.stop()
+
+    async def fetch_card_price(self, query: Card_query) -> Card_price:
+        async with self.governor.permit():
+            return await self.engine.fetch_card_price(query)
+
+    async def search(self, query_text: str, page: int = 1, page_size: int = 24) -> Search_results_response:
+        async with self.governor.permit():
+            return await self.engine.search(query_text, page, page_size)
+
+    async def stream_search(
+        self, query_text: str, page: int = 1, page_size: int = 24
+    ) -> AsyncIterator[Search_suggestion | Search_results_response]:
+        async with self.governor.permit():
+            async for item in self.engine.stream_search(query_text, page, page_size):
+                yield item
+
+    def stats(self) -> dict[str, Any]:
+        engine_stats = self.engine.stats()
+        governor_stats = self.governor.stats()
+        # Lo que espera turno en el regulador también está en cola, y la capacidad real es el
+        # límite adaptativo, no la concurrencia configurada
+        return {
+            **engine_stats,
+            "queued": engine_stats["queued"] + governor_stats["waiting"],
+            "concurrency": min(engine_stats["concurrency"], governor_stats["concurrency_limit"]),
+            "governor": governor_stats,
+        }
+
+
+def create_scrape_engine(app_settings: App_settings) -> Engine | Governed_scrape_engine:
+    """
+    Crea el motor configurado: local (ver `create_local_scrape_engine`) o repartido en procesos
+    worker si OPTCG_WORKER_PROCESSES > 0, envuelto por el regulador de tráfico salvo que OPTCG_GOVERNOR=0.
+    El regulador queda en el proceso principal para que el límite hacia TCGplayer sea global.
+    """
+    engine: Engine
+    if app_settings.worker_processes > 0:
+        engine = Process_scrape_engine(
+            app_settings,
+            create_local_scrape_engine,
+            # Igual que el motor local: en modo sync el límite es el tamaño del pool de navegadores
+            worker_concurrency=(
+                app_settings.browser_pool_size if app_settings.scrape_engine == "sync" else app_settings.scrape_concurrency
+            ),
+            metrics=Scrape_metrics(),
+        )
+    else:
+        engine = create_local_scrape_engine(app_settings)
+    if not app_settings.governor_enabled:
+        return engine
+    governor = Upstream_governor(
+        rate_per_second=app_settings.governor_rate_per_second,
+        burst=app_settings.governor_burst,
+        max_concurrency=engine.concurrency,
+        latency_target=app_settings.governor_latency_target,
+        max_queue_wait=app_settings.governor_max_queue_wait,
+        failure_ratio=app_settings.breaker_failure_ratio,
+        window=app_settings.breaker_window,
+        open_seconds=app_settings.breaker_open_seconds,
+    )
+    return Governed_scrape_engine(engine, governor)
+
+
+def create_local_scrape_engine(app_settings: App_settings) -> Async_scrape_engine | Sync_scrape_engine | Fast_path_scrape_engine:
+    """
+    Motor de Playwright configurado, envuelto por el camino rápido JSON salvo que OPTCG_FAST_PATH=0.
+    Es el que usa el proceso de uvicorn en modo de un solo proceso y cada worker en modo multiproceso.
+    """
+    browser_engine = _create_browser_engine(app_settings)
+    if not app_settings.fast_path_enabled:
+        return browser_engine
+    api_client = Tcgplayer_api_client(
+        app_settings.tcgplayer_api_url,
+        timeout=app_settings.http_timeout,
+        max_connections=app_settings.http_max_connections,
+    )
+    return Fast_path_scrape_engine(api_client, browser_engine)
+
+
+def _create_browser_engine(app_settings: App_settings) -> Async_scrape_engine | Sync_scrape_engine:
+    """Motor de Playwright según OPTCG_SCRAPE_ENGINE: "async" por defecto o "sync" como opción."""
+    blocking_profile = Blocking_profile(
+        enabled=app_settings.block_resources,
+        blocked_resource_types=app_settings.blocked_resource_types,
+        blocked_domains=DEFAULT_BLOCKED_DOMAINS + app_settings.blocked_domains,
+        allowed_domains=app_settings.allowed_domains,
+    )
+    if app_settings.scrape_engine == "sync":
+        return Sync_scrape_engine(
+            Browser_pool(
+                size=app_settings.browser_pool_size,
+                max_pages=app_settings.browser_max_pages,
+                health_check_interval=app_settings.browser_health_check_interval,
+                blocking_profile=blocking_profile,
+                memory=_create_memory_governor(app_settings),
+                page_deadline=app_settings.page_deadline,
+            )
+        )
+    if app_settings.scrape_engine != "async":
+        raise ValueError(f"OPTCG_SCRAPE_ENGINE desconocido: '{app_settings.scrape_engine}' (usa 'async' o 'sync')")
+    return Async_scrape_engine(
+        Async_browser_pool(
+            size=app_settings.browser_pool_size,
+            max_pages=app_settings.browser_max_pages,
+            health_check_interval=app_settings.browser_health_check_interval,
+            blocking_profile=blocking_profile,
+            memory=_create_memory_governor(app_settings),
+            page_deadline=app_settings.page_deadline,
+        ),
+        concurrency=app_settings.scrape_concurrency,
+    )
+
+
+def _create_memory_governor(app_settings: App_settings) -> Memory_governor | None:
+    """
+    Regulador de memoria del pool, salvo que el límite por navegador y el presupuesto sean 0. Sin
+    presupuesto explícito se usa el tamaño del pool por el límite por navegador. En modo multiproceso
+    cada worker tiene el suyo: el presupuesto es por proceso.
+    """
+    if app_settings.browser_max_rss_mb <= 0 and app_settings.browser_memory_budget_mb <= 0:
+        return None
+    budget_mb = app_settings.browser_memory_budget_mb or app_settings.browser_pool_size * app_settings.browser_max_rss_mb
+    return Memory_governor(
+        max_browser_bytes=app_settings.browser_max_rss_mb * MIB,
+        budget_bytes=budget_mb * MIB,
+        sample_interval=app_settings.memory_sample_interval,
+        max_wait=app_settings.memory_max_wait,
+    )
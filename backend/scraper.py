@@ -0,0 +1,681 @@
+"""
+Comentario: lógica de scraping de TCGplayer. Cada flujo existe en versión síncrona (sufijo `_sync`,
+usada por el pool de hilos en Windows) y asíncrona (usada por el motor nativo sobre el event loop).
+Ambas versiones comparten el análisis en Python puro de los textos extraídos, así que solo difieren
+en cómo se habla con el navegador.
+"""
+import logging
+import math
+import re
+import time
+from typing import Any, AsyncIterator, Iterator
+from urllib.parse import quote_plus
+
+from card_parser import Card_text_parser
+from metrics import price_extraction_seconds, price_source_total
+from models import Card_price, Card_query, Search_results_response, Search_suggestion
+from readiness import (
+    CARDS_FALLBACK_TIMEOUT_MS,
+    LAZY_LOAD_QUIET_MS,
+    LAZY_LOAD_TIMEOUT_MS,
+    Search_response_watch,
+    Stage_timer,
+    wait_for_cards_stable,
+    wait_for_cards_stable_sync,
+    wait_for_price,
+    wait_for_price_sync,
+)
+from settings import settings
+from upstream_governor import raise_if_throttled
+
+logger = logging.getLogger(__name__)
+
+# Selector principal descubierto con MCP de Playwright para Monkey.D.Luffy OP05-119
+# Confirmado: existe y funciona, formato: <span class="product-card__market-price--value">$3.78</span>
+PRIMARY_PRICE_SELECTOR = ".product-card__market-price--value"
+# Fallback: selector alternativo con contexto completo
+FALLBACK_PRICE_SELECTOR = "section.product-card__market-price span.product-card__market-price--value"
+# Fallback adicional: cualquier span con la clase (hay múltiples resultados)
+ALL_PRICES_SELECTOR = "span.product-card__market-price--value"
+PRODUCT_CARD_SELECTOR = '[class*="product-card"]'
+PRODUCT_LINK_SELECTOR = 'a[href*="/product/"]'
+COOKIE_BUTTON_SELECTOR = 'button:has-text("Allow All"), button:has-text("Accept")'
+# Página de producto: el primer valor de la tabla de precios es el precio de mercado
+PRODUCT_PAGE_PRICE_SELECTOR = ".price-points__upper__price"
+PRODUCT_PAGE_TITLE_SELECTOR = "h1.product-details__name, h1"
+PRODUCT_PAGE_SET_SELECTOR = '[data-testid="lnkProductDetailsSetName"], .product-details__name__sub-header__links a'
+# Precio, nombre y set de la página de producto en un solo viaje al navegador
+EXTRACT_PRODUCT_PAGE_SCRIPT = """
+    ([priceSelector, titleSelector, setSelector]) => {
+        const text = (selector) => {
+            const element = document.querySelector(selector);
+            return element ? element.innerText.trim() : null;
+        };
+        return { price_text: text(priceSelector), title_text: text(titleSelector), set_text: text(setSelector) };
+    }
+"""
+PRODUCT_PAGE_SELECTORS = [PRODUCT_PAGE_PRICE_SELECTOR, PRODUCT_PAGE_TITLE_SELECTOR, PRODUCT_PAGE_SET_SELECTOR]
+
+BODY_PRICE_PATTERNS = [
+    r"\$(\d+\.?\d*)",  # $12.50
+    r"(\d+\.?\d*)\s*USD",  # 12.50 USD
+]
+
+# Scroll para cargar contenido dinámico (lazy loading) y volver arriba
+SCROLL_TO_BOTTOM_SCRIPT = """
+    () => {
+        window.scrollTo(0, document.body.scrollHeight);
+    }
+"""
+SCROLL_TO_TOP_SCRIPT = """
+    () => {
+        window.scrollTo(0, 0);
+    }
+"""
+
+# Extracción de la página de resultados en bloques de `EXTRACT_CHUNK_SIZE` enlaces de producto: por
+# cada enlace, los mismos textos crudos que consume `card_parser`, y en el primer bloque el heading
+# (total de resultados). Un viaje al navegador por bloque evita las 6-10 llamadas IPC por tarjeta
+# (get_attribute, inner_text, query_selector...) y, a la vez, permite emitir las primeras tarjetas
+# sin esperar a que se extraiga la página entera.
+EXTRACT_SEARCH_PAGE_SCRIPT = """
+    ([productLinkSelector, start, count]) => {
+        const text = (element) => element ? element.innerText : null;
+        const links = Array.from(document.querySelectorAll(productLinkSelector));
+        const cards = links.slice(start, start + count).map((card) => {
+            const title = card.querySelector('h4, h3, .product-card__title, [class*="title"]');
+            const img = card.querySelector('img');
+            return {
+                href: card.getAttribute('href') || '',
+                text: card.innerText,
+                title_text: text(title) || '',
+                img_src: img ? img.getAttribute('src') : null,
+                img_alt: img ? (img.getAttribute('alt') || img.getAttribute('title') || '') : null,
+                price_text: text(card.querySelector('.product-card__market-price--value')),
+                heading_text: text(card.querySelector('h4')),
+            };
+        });
+        const heading = start === 0 ? document.querySelector('h1') : null;
+        return { heading_text: text(heading), link_count: links.length, cards };
+    }
+"""
+# Tarjetas por bloque: la grilla muestra 24, así que son tres viajes al navegador por página
+EXTRACT_CHUNK_SIZE = 8
+
+
+def build_price_search_url(query: Card_query) -> str:
+    """Construye la URL de búsqueda general de TCGplayer para una consulta de precio."""
+    # Comentario: usamos la búsqueda general de TCGplayer que es más efectiva
+    # basado en la exploración con MCP de Playwright para Monkey.D.Luffy OP05-119
+    base_url = f"{settings.tcgplayer_site_url}/search/all/product"
+
+    # Construir términos de búsqueda: si hay set_name, incluirlo; si no, solo el nombre
+    if query.set_name and query.set_name.strip():
+        search_terms = f"{query.card_name} {query.set_name}"
+    else:
+        search_terms = query.card_name
+
+    if query.is_foil:
+        search_terms += " foil"
+
+    # Formato de URL descubierto con MCP: ?q=nombre+set&view=grid
+    return f"{base_url}?q={quote_plus(search_terms)}&view=grid"
+
+
+def build_product_page_url(product_id: int) -> str:
+    """URL de la página de un producto de TCGplayer (redirige a la URL con el nombre del producto)."""
+    return f"{settings.tcgplayer_site_url}/product/{product_id}"
+
+
+def build_suggestions_search_url(query_text: str, page: int) -> str:
+    """Construye la URL de la vista de grid de One Piece Card Game para una página de resultados."""
+    # Usar la URL específica de One Piece Card Game para obtener los mismos resultados que TCGplayer
+    base_url = f"{settings.tcgplayer_site_url}/search/one-piece-card-game/product"
+    # TCGplayer usa parámetro ?page=N para paginación
+    return f"{base_url}?q={quote_plus(query_text)}&view=grid&page={page}"
+
+
+def parse_market_price_text(text: str) -> float | None:
+    """Convierte un texto como '$1,234.56' en float si está dentro del rango de precios válido."""
+    if "$" not in text:
+        return None
+    cleaned = text.replace("$", "").replace(",", "").strip()
+    price_match = re.search(r"(\d+\.?\d*)", cleaned)
+    if not price_match:
+        return None
+    try:
+        price_val = float(price_match.group(1))
+    except ValueError as e:
+        logger.warning(f"Error al convertir precio '{cleaned}': {e}")
+        return None
+    if 0.01 <= price_val <= 100000:  # Rango ampliado para cartas raras
+        return price_val
+    return None
+
+
+def parse_price_from_body_text(page_text: str) -> float | None:
+    """Último recurso: busca patrones de precio en todo el texto de la página."""
+    for pattern in BODY_PRICE_PATTERNS:
+        matches = re.findall(pattern, page_text)
+        logger.info(f"Patrón '{pattern}' encontró {len(matches)} coincidencias")
+        for match in matches:
+            try:
+                price_val = float(match)
+                if 0.01 <= price_val <= 100000:
+                    logger.info(f"Precio extraído con patrón regex: ${price_val}")
+                    return price_val
+            except (ValueError, IndexError) as e:
+                logger.warning(f"Error al procesar match '{match}': {e}")
+                continue
+    return None
+
+
+# Niveles de la cascada de selectores, en orden: (etiqueta de métricas, nombre en los logs, selector)
+PRICE_SELECTOR_TIERS = (
+    ("primary", "principal", PRIMARY_PRICE_SELECTOR),
+    ("fallback", "fallback", FALLBACK_PRICE_SELECTOR),
+)
+
+
+def _record_price_tier(tier: str, started: float) -> None:
+    """Publica en `/metrics` qué nivel de la cascada encontró el precio y cuánto tardó la extracción."""
+    price_extraction_seconds.observe(time.perf_counter() - started, tier)
+    price_source_total.inc(tier)
+
+
+def _price_not_found_error() -> ValueError:
+    # Si llegamos aquí, no encontramos ningún precio válido
+    logger.error("No se pudo extraer ningún precio de la página")
+    return ValueError(
+        "No se encontró un precio de mercado reconocible en la página de resultados."
+    )
+
+
+def extract_market_price_from_page_sync(page) -> float:
+    """
+    Comentario: esta función encapsula la lógica de scraping para facilitar ajustes
+    cuando cambie la estructura de TCGplayer. Primero intentamos leer el precio de mercado
+    directamente desde la tarjeta de producto en la vista de grid.
+    Basado en pruebas con MCP de Playwright que confirmaron el selector exacto.
+    """
+    # La espera a que la página esté lista la hace quien llama (ver `readiness`); aquí solo leemos
+    started = time.perf_counter()
+    for tier, label, selector in PRICE_SELECTOR_TIERS:
+        price_element = page.query_selector(selector)
+        if price_element:
+            text = price_element.inner_text() or ""
+            logger.info(f"Texto encontrado con selector {label}: '{text}'")
+            price_val = parse_market_price_text(text)
+            if price_val is not None:
+                logger.info(f"Precio extraído con selector {label}: ${price_val}")
+                _record_price_tier(tier, started)
+                return price_val
+
+    price_elements = page.query_selector_all(ALL_PRICES_SELECTOR)
+    logger.info(f"Encontrados {len(price_elements)} elementos de precio en la página")
+    for idx, element in enumerate(price_elements):
+        price_val = parse_market_price_text(element.inner_text() or "")
+        if price_val is not None:
+            logger.info(f"Precio extraído del elemento #{idx + 1}: ${price_val}")
+            _record_price_tier("all_prices", started)
+            return price_val
+
+    price_val = parse_price_from_body_text(page.inner_text("body"))
+    if price_val is not None:
+        _record_price_tier("body_text", started)
+        return price_val
+    _record_price_tier("not_found", started)
+    raise _price_not_found_error()
+
+
+async def extract_market_price_from_page(page) -> float:
+    """Versión asíncrona de `extract_market_price_from_page_sync` con la misma cascada de selectores."""
+    started = time.perf_counter()
+    for tier, label, selector in PRICE_SELECTOR_TIERS:
+        price_element = await page.query_selector(selector)
+        if price_element:
+            text = await price_element.inner_text() or ""
+            logger.info(f"Texto encontrado con selector {label}: '{text}'")
+            price_val = parse_market_price_text(text)
+            if price_val is not None:
+                logger.info(f"Precio extraído con selector {label}: ${price_val}")
+                _record_price_tier(tier, started)
+                return price_val
+
+    price_elements = await page.query_selector_all(ALL_PRICES_SELECTOR)
+    logger.info(f"Encontrados {len(price_elements)} elementos de precio en la página")
+    for idx, element in enumerate(price_elements):
+        price_val = parse_market_price_text(await element.inner_text() or "")
+        if price_val is not None:
+            logger.info(f"Precio extraído del elemento #{idx + 1}: ${price_val}")
+            _record_price_tier("all_prices", started)
+            return price_val
+
+    price_val = parse_price_from_body_text(await page.inner_text("body"))
+    if price_val is not None:
+        _record_price_tier("body_text", started)
+        return price_val
+    _record_price_tier("not_found", started)
+    raise _price_not_found_error()
+
+
+def fetch_card_price_from_tcgplayer_sync(browser_page, query: Card_query) -> Card_price:
+    """
+    Comentario: esta función abre la vista de grid de productos de One Piece TCG en TCGplayer
+    y extrae el precio de mercado directamente de la primera tarjeta de producto que coincida
+    con el criterio de búsqueda. Recibe una página ya creada por el pool de navegadores.
+    Con `product_id` va directo a la página de ese producto.
+    """
+    if query.product_id is not None:
+        return fetch_product_price_sync(browser_page, query)
+    search_url = build_price_search_url(query)
+    logger.info(f"Buscando carta: {query.card_name} - {query.set_name or '(sin set)'} (foil: {query.is_foil})")
+    logger.info(f"URL de búsqueda: {search_url}")
+
+    timer = Stage_timer("price")
+    search_response = Search_response_watch(browser_page)
+
+    logger.info("Navegando a TCGplayer...")
+    with timer.stage("goto"):
+        raise_if_throttled(browser_page.goto(search_url, wait_until="domcontentloaded", timeout=30000))
+
+    # Esperar señales concretas en lugar de tiempos fijos: primero el XHR de productos y luego
+    # que el selector de precio muestre un precio. Si no aparece, esperamos a que las tarjetas
+    # se estabilicen y la cascada de selectores decide con lo que haya.
+    with timer.stage("search_xhr"):
+        search_response.wait_sync(browser_page)
+    with timer.stage("price_ready"):
+        price_ready = wait_for_price_sync(browser_page, PRIMARY_PRICE_SELECTOR)
+    if not price_ready:
+        with timer.stage("cards_stable"):
+            wait_for_cards_stable_sync(browser_page, PRODUCT_CARD_SELECTOR, "price", timeout=CARDS_FALLBACK_TIMEOUT_MS)
+
+    # Intentar cerrar banner de cookies si aparece (no tapa el texto que leemos, no hace falta esperar)
+    with timer.stage("cookie_banner"):
+        try:
+            cookie_button = browser_page.query_selector(COOKIE_BUTTON_SELECTOR)
+            if cookie_button:
+                logger.info("Cerrando banner de cookies...")
+                cookie_button.click()
+        except Exception:
+            pass  # Si no hay banner, continuar
+
+    logger.info("Extrayendo precio...")
+    with timer.stage("extract"):
+        market_price = extract_market_price_from_page_sync(browser_page)
+    timer.finish()
+
+    logger.info(f"Precio encontrado: ${market_price}")
+    return Card_price(
+        card_name=query.card_name,
+        set_name=query.set_name,
+        is_foil=query.is_foil,
+        market_price=market_price,
+        source_url=search_url,
+    )
+
+
+async def fetch_card_price_from_page(browser_page, query: Card_query) -> Card_price:
+    """Versión asíncrona de `fetch_card_price_from_tcgplayer_sync` para el motor nativo."""
+    if query.product_id is not None:
+        return await fetch_product_price_from_page(browser_page, query)
+    search_url = build_price_search_url(query)
+    logger.info(f"Buscando carta: {query.card_name} - {query.set_name or '(sin set)'} (foil: {query.is_foil})")
+    logger.info(f"URL de búsqueda: {search_url}")
+
+    timer = Stage_timer("price")
+    search_response = Search_response_watch(browser_page)
+
+    with timer.stage("goto"):
+        raise_if_throttled(await browser_page.goto(search_url, wait_until="domcontentloaded", timeout=30000))
+    with timer.stage("search_xhr"):
+        await search_response.wait(browser_page)
+    with timer.stage("price_ready"):
+        price_ready = await wait_for_price(browser_page, PRIMARY_PRICE_SELECTOR)
+    if not price_ready:
+        with timer.stage("cards_stable"):
+            await wait_for_cards_stable(browser_page, PRODUCT_CARD_SELECTOR, "price", timeout=CARDS_FALLBACK_TIMEOUT_MS)
+
+    with timer.stage("cookie_banner"):
+        try:
+            cookie_button = await browser_page.query_selector(COOKIE_BUTTON_SELECTOR)
+            if cookie_button:
+                logger.info("Cerrando banner de cookies...")
+                await cookie_button.click()
+        except Exception:
+            pass
+
+    with timer.stage("extract"):
+        market_price = await extract_market_price_from_page(browser_page)
+    timer.finish()
+
+    logger.info(f"Precio encontrado: ${market_price}")
+    return Card_price(
+        card_name=query.card_name,
+        set_name=query.set_name,
+        is_foil=query.is_foil,
+        market_price=market_price,
+        source_url=search_url,
+    )
+
+
+def reject_foil_product_query(query: Card_query) -> None:
+    """La página de producto muestra el precio de mercado sin indicar el acabado: no sirve para pedir el foil."""
+    if query.is_foil:
+        raise ValueError(
+            f"La página del producto {query.product_id} no indica su acabado; "
+            "el precio foil de un producto solo se confirma con el API JSON."
+        )
+
+
+def _product_price_from_details(query: Card_query, product_url: str, details: dict[str, Any], started: float) -> Card_price:
+    price_val = parse_market_price_text(details.get("price_text") or "")
+    if price_val is None:
+        _record_price_tier("not_found", started)
+        raise ValueError(f"El producto {query.product_id} no tiene precio de mercado en TCGplayer.")
+    _record_price_tier("product_page", started)
+    return Card_price(
+        card_name=query.card_name or details.get("title_text") or "",
+        set_name=query.set_name or details.get("set_text") or "",
+        is_foil=False,
+        market_price=price_val,
+        source_url=product_url,
+        product_id=query.product_id,
+    )
+
+
+def fetch_product_price_sync(browser_page, query: Card_query) -> Card_price:
+    """
+    Comentario: precio de un producto concreto (`query.product_id`) leído de su propia página, con
+    un solo selector: sin la cascada de la vista de grid ni el barrido del texto de la página, que
+    pueden devolver el precio de otra carta. Nombre y set salen de la misma página cuando la consulta
+    no los trae.
+    """
+    reject_foil_product_query(query)
+    product_url = build_product_page_url(query.product_id)
+    logger.info(f"Buscando producto {query.product_id} (foil: {query.is_foil}): {product_url}")
+    timer = Stage_timer("product_price")
+    with timer.stage("goto"):
+        raise_if_throttled(browser_page.goto(product_url, wait_until="domcontentloaded", timeout=30000))
+    with timer.stage("price_ready"):
+        wait_for_price_sync(browser_page, PRODUCT_PAGE_PRICE_SELECTOR)
+    with timer.stage("extract"):
+        started = time.perf_counter()
+        details = browser_page.evaluate(EXTRACT_PRODUCT_PAGE_SCRIPT, PRODUCT_PAGE_SELECTORS)
+    timer.finish()
+    return _product_price_from_details(query, browser_page.url or product_url, details, started)
+
+
+async def fetch_product_price_from_page(browser_page, query: Card_query) -> Card_price:
+    """Versión asíncrona de `fetch_product_price_sync`."""
+    reject_foil_product_query(query)
+    product_url = build_product_page_url(query.product_id)
+    logger.info(f"Buscando producto {query.product_id} (foil: {query.is_foil}): {product_url}")
+    timer = Stage_timer("product_price")
+    with timer.stage("goto"):
+        raise_if_throttled(await browser_page.goto(product_url, wait_until="domcontentloaded", timeout=30000))
+    with timer.stage("price_ready"):
+        await wait_for_price(browser_page, PRODUCT_PAGE_PRICE_SELECTOR)
+    with timer.stage("extract"):
+        started = time.perf_counter()
+        details = await browser_page.evaluate(EXTRACT_PRODUCT_PAGE_SCRIPT, PRODUCT_PAGE_SELECTORS)
+    timer.finish()
+    return _product_price_from_details(query, browser_page.url or product_url, details, started)
+
+
+def empty_search_results(page: int, page_size: int) -> Search_results_response:
+    """Respuesta vacía con la forma estándar de paginación."""
+    return Search_results_response(
+        results=[],
+        total_results=0,
+        page=page,
+        page_size=page_size,
+        total_pages=0,
+        has_next_page=False,
+        has_previous_page=False
+    )
+
+
+def parse_total_results(heading_text: str) -> int | None:
+    """Extrae el total del heading, p. ej. '111 results for: "law" in One Piece Card Game'."""
+    match = re.search(r'(\d+)\s+results', heading_text)
+    if match:
+        return int(match.group(1))
+    return None
+
+
+def build_search_results_response(
+    suggestions: list[Search_suggestion],
+    total_results_from_page: int | None,
+    page: int,
+    page_size: int,
+) -> Search_results_response:
+    """Aplica la paginación y la estimación del total sobre las sugerencias de una página."""
+    # Limitar resultados al tamaño de página solicitado
+    paginated_results = suggestions[:page_size]
+
+    # Intentar obtener el total de resultados desde TCGplayer
+    # Si extrajimos el total desde el heading de la página, usarlo
+    if total_results_from_page is not None:
+        total_results_estimated = total_results_from_page
+    elif page == 1 and len(suggestions) > 0:
+        # Si encontramos 18-24 resultados, probablemente hay más páginas
+        # Estimamos conservadoramente que hay al menos 2-3 veces más resultados
+        if len(suggestions) >= 18:
+            total_results_estimated = len(suggestions) * 3  # Estimación conservadora
+        else:
+            total_results_estimated = len(suggestions)
+    elif page > 1:
+        # Para páginas siguientes, estimamos basándonos en la página actual
+        total_results_estimated = (page - 1) * page_size + len(suggestions)
+    else:
+        total_results_estimated = len(suggestions)
+
+    # Calcular total de páginas estimado
+    total_pages = math.ceil(total_results_estimated / page_size) if total_results_estimated > 0 else 0
+
+    # Determinar si hay más páginas disponibles
+    # Si encontramos menos resultados que el page_size, probablemente es la última página
+    has_next_page = len(suggestions) >= page_size
+    has_previous_page = page > 1
+
+    logger.info(f"Página {page}: Devolviendo {len(paginated_results)} resultados de {len(suggestions)} encontrados (estimado total: {total_results_estimated})")
+
+    return Search_results_response(
+        results=paginated_results,
+        total_results=total_results_estimated,
+        page=page,
+        page_size=page_size,
+        total_pages=total_pages,
+        has_next_page=has_next_page,
+        has_previous_page=has_previous_page
+    )
+
+
+class Product_card_parser:
+    """Analiza tarjetas una a una descartando hrefs repetidos, para poder emitirlas apenas se extraen."""
+
+    def __init__(self, query_text: str) -> None:
+        self.query_text = query_text
+        self.suggestions: list[Search_suggestion] = []
+        self._seen_products: set[str] = set()
+        self._card_parser = Card_text_parser(query_text)
+
+    def feed(self, raw: dict[str, Any]) -> Search_suggestion | None:
+        product_href = raw.get("href")
+        if not product_href or product_href in self._seen_products:
+            return None
+        self._seen_products.add(product_href)
+        try:
+            suggestion = self._card_parser.parse(raw)
+        except Exception as e:
+            logger.warning(f"Error procesando tarjeta de producto: {e}")
+            return None
+        if suggestion is not None:
+            self.suggestions.append(suggestion)
+        return suggestion
+
+
+def _extracted_total_results(extracted: dict[str, Any]) -> int | None:
+    """Total de resultados del heading devuelto por `EXTRACT_SEARCH_PAGE_SCRIPT`."""
+    total_results = parse_total_results(extracted.get("heading_text") or "")
+    if total_results is not None:
+        logger.info(f"Total de resultados encontrado en la página: {total_results}")
+    return total_results
+
+
+def _iter_extracted_cards(extracted: dict[str, Any], parser: Product_card_parser, page: int) -> Iterator[Search_suggestion]:
+    """Clasifica en Python puro un bloque de tarjetas extraídas y emite las de One Piece Card Game."""
+    raw_cards = extracted.get("cards") or []
+    one_piece_cards = 0
+    for raw in raw_cards:
+        # Filtrar solo las de One Piece Card Game
+        if 'one-piece' not in (raw.get("href") or "").lower():
+            continue
+        one_piece_cards += 1
+        suggestion = parser.feed(raw)
+        if suggestion is not None:
+            yield suggestion
+
+    logger.debug(f"Bloque de la página {page}: {one_piece_cards} tarjetas de One Piece de {len(raw_cards)} extraídas")
+
+
+def _log_extracted_page(parser: Product_card_parser, page: int, link_count: int) -> None:
+    logger.info(f"Encontradas {len(parser.suggestions)} tarjetas de One Piece en la página {page} (de {link_count} totales)")
+
+
+def iter_search_suggestions_sync(
+    browser_page, query_text: str, page: int = 1, page_size: int = 24
+) -> Iterator[Search_suggestion | Search_results_response]:
+    """
+    Obtiene sugerencias de búsqueda de TCGplayer extrayendo información completa
+    de las tarjetas de producto incluyendo imágenes, precios y detalles.
+    Implementa paginación para devolver siempre la misma cantidad de resultados.
+    Recibe una página ya creada por el pool de navegadores.
+    Emite cada `Search_suggestion` apenas se extrae y, al final, la respuesta paginada completa.
+    """
+    if not query_text or len(query_text.strip()) < 2:
+        yield empty_search_results(page, page_size)
+        return
+
+    search_url = build_suggestions_search_url(query_text, page)
+
+    timer = Stage_timer("search")
+    search_response = Search_response_watch(browser_page)
+
+    with timer.stage("goto"):
+        raise_if_throttled(browser_page.goto(search_url, wait_until="domcontentloaded", timeout=20000))
+
+    # Esperar a que lleguen los productos y a que las tarjetas dejen de cambiar
+    with timer.stage("search_xhr"):
+        search_response.wait_sync(browser_page)
+    with timer.stage("cards_stable"):
+        wait_for_cards_stable_sync(browser_page, PRODUCT_LINK_SELECTOR, "search")
+
+    # Intentar cerrar banner de cookies
+    with timer.stage("cookie_banner"):
+        try:
+            cookie_button = browser_page.query_selector(COOKIE_BUTTON_SELECTOR)
+            if cookie_button:
+                cookie_button.click()
+        except Exception:
+            pass
+
+    # Hacer scroll para cargar más contenido dinámico (lazy loading)
+    # TCGplayer carga contenido mientras haces scroll; esperamos solo si aparecen tarjetas nuevas
+    with timer.stage("lazy_load"):
+        browser_page.evaluate(SCROLL_TO_BOTTOM_SCRIPT)
+        wait_for_cards_stable_sync(
+            browser_page, PRODUCT_LINK_SELECTOR, "lazy_load", quiet_ms=LAZY_LOAD_QUIET_MS, timeout=LAZY_LOAD_TIMEOUT_MS
+        )
+        browser_page.evaluate(SCROLL_TO_TOP_SCRIPT)
+
+    # Buscar tarjetas de producto (no sugerencias del autocompletado, sino resultados reales)
+    # Cada bloque sale en una sola llamada y se emite antes de pedir el siguiente; la clasificación
+    # corre en Python. La etapa `extract` mide el primer bloque, o sea, el tiempo hasta la primera tarjeta
+    parser = Product_card_parser(query_text)
+    with timer.stage("extract"):
+        extracted = browser_page.evaluate(EXTRACT_SEARCH_PAGE_SCRIPT, [PRODUCT_LINK_SELECTOR, 0, EXTRACT_CHUNK_SIZE])
+    total_results_from_page = _extracted_total_results(extracted)
+    link_count = extracted.get("link_count") or 0
+    start = 0
+    while True:
+        yield from _iter_extracted_cards(extracted, parser, page)
+        start += EXTRACT_CHUNK_SIZE
+        if start >= link_count:
+            break
+        extracted = browser_page.evaluate(EXTRACT_SEARCH_PAGE_SCRIPT, [PRODUCT_LINK_SELECTOR, start, EXTRACT_CHUNK_SIZE])
+    timer.finish()
+    _log_extracted_page(parser, page, link_count)
+
+    yield build_search_results_response(parser.suggestions, total_results_from_page, page, page_size)
+
+
+def get_search_suggestions_sync(browser_page, query_text: str, page: int = 1, page_size: int = 24) -> Search_results_response:
+    """Obtiene la página completa de sugerencias consumiendo `iter_search_suggestions_sync`."""
+    *_, response = iter_search_suggestions_sync(browser_page, query_text, page, page_size)
+    return response
+
+
+async def iter_search_suggestions_from_page(
+    browser_page, query_text: str, page: int = 1, page_size: int = 24
+) -> AsyncIterator[Search_suggestion | Search_results_response]:
+    """Versión asíncrona de `iter_search_suggestions_sync` para el motor nativo."""
+    if not query_text or len(query_text.strip()) < 2:
+        yield empty_search_results(page, page_size)
+        return
+
+    search_url = build_suggestions_search_url(query_text, page)
+
+    timer = Stage_timer("search")
+    search_response = Search_response_watch(browser_page)
+
+    with timer.stage("goto"):
+        raise_if_throttled(await browser_page.goto(search_url, wait_until="domcontentloaded", timeout=20000))
+    with timer.stage("search_xhr"):
+        await search_response.wait(browser_page)
+    with timer.stage("cards_stable"):
+        await wait_for_cards_stable(browser_page, PRODUCT_LINK_SELECTOR, "search")
+
+    with timer.stage("cookie_banner"):
+        try:
+            cookie_button = await browser_page.query_selector(COOKIE_BUTTON_SELECTOR)
+            if cookie_button:
+                await cookie_button.click()
+        except Exception:
+            pass
+
+    with timer.stage("lazy_load"):
+        await browser_page.evaluate(SCROLL_TO_BOTTOM_SCRIPT)
+        await wait_for_cards_stable(
+            browser_page, PRODUCT_LINK_SELECTOR, "lazy_load", quiet_ms=LAZY_LOAD_QUIET_MS, timeout=LAZY_LOAD_TIMEOUT_MS
+        )
+        await browser_page.evaluate(SCROLL_TO_TOP_SCRIPT)
+
+    parser = Product_card_parser(query_text)
+    with timer.stage("extract"):
+        extracted = await browser_page.evaluate(EXTRACT_SEARCH_PAGE_SCRIPT, [PRODUCT_LINK_SELECTOR, 0, EXTRACT_CHUNK_SIZE])
+    total_results_from_page = _extracted_total_results(extracted)
+    link_count = extracted.get("link_count") or 0
+    start = 0
+    while True:
+        for suggestion in _iter_extracted_cards(extracted, parser, page):
+            yield suggestion
+        start += EXTRACT_CHUNK_SIZE
+        if start >= link_count:
+            break
+        extracted = await browser_page.evaluate(
+            EXTRACT_SEARCH_PAGE_SCRIPT, [PRODUCT_LINK_SELECTOR, start, EXTRACT_CHUNK_SIZE]
+        )
+    timer.finish()
+    _log_extracted_page(parser, page, link_count)
+
+    yield build_search_results_response(parser.suggestions, total_results_from_page, page, page_size)
+
+
+async def get_search_suggestions_from_page(browser_page, query_text: str, page: int = 1, page_size: int = 24) -> Search_results_response:
+    """Obtiene la página completa de sugerencias consumiendo `iter_search_suggestions_from_page`."""
+    response = None
+    async for item in iter_search_suggestions_from_page(browser_page, query_text, page, page_size):
+        response = item
+    return response
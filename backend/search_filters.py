@@ -0,0 +1,102 @@
+"""
+Comentario: filtros y facetas de /api/suggestions. El catálogo (`catalog.py`) los aplica sobre las
+columnas indexadas de todas las cartas de una consulta, no solo sobre la página recibida, así que
+una página filtrada sale llena; sin catálogo se aplican sobre una página en vivo con
+`filter_results`.
+
+Las facetas son disyuntivas: el conteo de cada campo se calcula con los filtros de los demás campos,
+para que al elegir una rareza sigan apareciendo las otras con su cantidad.
+"""
+import math
+from collections import Counter
+from typing import Iterable
+
+from models import Facet_count, Search_facets, Search_filters, Search_results_response, Search_suggestion
+
+FACET_FIELDS = ("rarity", "set_name", "card_type", "color")
+
+# Valores de una carta en el orden de FACET_FIELDS, seguidos del precio de mercado
+Facet_row = tuple[str | None, str | None, str | None, str | None, float | None]
+
+
+def facet_row(suggestion: Search_suggestion) -> Facet_row:
+    return (suggestion.rarity, suggestion.set_name, suggestion.card_type, suggestion.color, suggestion.market_price)
+
+
+class Compiled_filters:
+    """`Search_filters` preparados una vez por solicitud para evaluarlos sobre muchas filas."""
+
+    def __init__(self, filters: Search_filters) -> None:
+        self.filters = filters
+        self.wanted = [
+            frozenset(value.casefold() for value in getattr(filters, field)) for field in FACET_FIELDS
+        ]
+        self.has_price_bounds = filters.min_price is not None or filters.max_price is not None
+
+    def matches(self, row: Facet_row, skip: int | None = None) -> bool:
+        """Si la fila cumple todos los filtros; `skip` omite el de un campo (índice en FACET_FIELDS)."""
+        for index, wanted in enumerate(self.wanted):
+            if wanted and index != skip and (row[index] is None or row[index].casefold() not in wanted):
+                return False
+        return skip == len(FACET_FIELDS) or self.matches_price(row[len(FACET_FIELDS)])
+
+    def matches_price(self, price: float | None) -> bool:
+        if not self.has_price_bounds:
+            return True
+        if price is None:
+            return False
+        if self.filters.min_price is not None and price < self.filters.min_price:
+            return False
+        return self.filters.max_price is None or price <= self.filters.max_price
+
+
+def compute_facets(rows: Iterable[Facet_row], filters: Search_filters | None = None) -> Search_facets:
+    """Conteos por valor de cada campo y rango de precios, en una sola pasada sobre las filas."""
+    compiled = Compiled_filters(filters or Search_filters())
+    price_index = len(FACET_FIELDS)
+    counters = [Counter() for _ in FACET_FIELDS]
+    prices: list[float] = []
+    for row in rows:
+        for index, counter in enumerate(counters):
+            if row[index] and compiled.matches(row, skip=index):
+                counter[row[index]] += 1
+        # El rango de precios se calcula sin el propio filtro de precio, igual que los demás campos
+        if row[price_index] is not None and compiled.matches(row, skip=price_index):
+            prices.append(row[price_index])
+    return Search_facets(
+        **{
+            field: [Facet_count(value=value, count=count) for value, count in _sorted_counts(counter)]
+            for field, counter in zip(FACET_FIELDS, counters)
+        },
+        min_price=min(prices, default=None),
+        max_price=max(prices, default=None),
+    )
+
+
+def _sorted_counts(counter: Counter) -> list[tuple[str, int]]:
+    # Más frecuentes primero; a igual cantidad, por orden alfabético para que la respuesta sea estable
+    return sorted(counter.items(), key=lambda item: (-item[1], item[0]))
+
+
+def filter_results(
+    results: list[Search_suggestion],
+    filters: Search_filters,
+    page: int,
+    page_size: int,
+    with_facets: bool,
+) -> Search_results_response:
+    """Filtra y pagina en memoria una lista de resultados (sin catálogo: solo lo que trajo la búsqueda en vivo)."""
+    compiled = Compiled_filters(filters)
+    rows = [facet_row(suggestion) for suggestion in results]
+    matching = [suggestion for suggestion, row in zip(results, rows) if compiled.matches(row)]
+    total_pages = math.ceil(len(matching) / page_size) if matching else 0
+    return Search_results_response(
+        results=matching[(page - 1) * page_size:page * page_size],
+        total_results=len(matching),
+        page=page,
+        page_size=page_size,
+        total_pages=total_pages,
+        has_next_page=page < total_pages,
+        has_previous_page=page > 1,
+        facets=compute_facets(rows, filters) if with_facets else None,
+    )
@@ -0,0 +1,216 @@
+"""
+Comentario: configuración del backend leída desde variables de entorno (prefijo OPTCG_).
+Centralizamos aquí los valores ajustables para poder dimensionar cada despliegue sin tocar código.
+"""
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from resource_blocking import DEFAULT_BLOCKED_RESOURCE_TYPES
+
+# Directorio por defecto para datos locales (cachés, índices, históricos)
+DEFAULT_DATA_DIR = Path(__file__).resolve().parent / "data"
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    return int(value)
+
+
+def _env_str(name: str, default: str) -> str:
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    return value.strip()
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_list(name: str, default: tuple[str, ...]) -> tuple[str, ...]:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return tuple(item.strip().lower() for item in value.split(",") if item.strip())
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    return float(value)
+
+
+@dataclass(frozen=True)
+class App_settings:
+    # Pool de navegadores: cantidad de Chromium calientes y páginas servidas antes de reciclar cada uno
+    browser_pool_size: int = 2
+    browser_max_pages: int = 200
+    browser_health_check_interval: float = 30.0
+    # Regulador de memoria de Chromium: RSS máximo por navegador (0 no recicla por memoria), presupuesto
+    # total del proceso (0: tamaño del pool por el máximo por navegador), cada cuánto se mide y cuánto
+    # espera una página nueva con el presupuesto agotado; y plazo máximo de una página (0 sin plazo)
+    browser_max_rss_mb: int = 1536
+    browser_memory_budget_mb: int = 0
+    memory_sample_interval: float = 5.0
+    memory_max_wait: float = 30.0
+    page_deadline: float = 60.0
+    # Perfil liviano: tipos de recurso abortados, dominios extra a bloquear y dominios siempre permitidos
+    block_resources: bool = True
+    blocked_resource_types: tuple[str, ...] = DEFAULT_BLOCKED_RESOURCE_TYPES
+    blocked_domains: tuple[str, ...] = ()
+    allowed_domains: tuple[str, ...] = ()
+    # Motor de scraping: "async" (nativo sobre el event loop) o "sync" (pool de hilos, opción para Windows)
+    scrape_engine: str = "async"
+    scrape_concurrency: int = 8
+    # Procesos worker de scraping (cada uno con su motor y su pool de navegadores); 0 scrapea en el proceso de uvicorn
+    worker_processes: int = 0
+    # Camino rápido: API JSON de búsqueda de TCGplayer por HTTP, con Playwright como respaldo
+    fast_path_enabled: bool = True
+    tcgplayer_api_url: str = "https://mp-search-api.tcgplayer.com"
+    # Sitio que abre Playwright (el benchmark lo apunta al stub local con las páginas grabadas)
+    tcgplayer_site_url: str = "https://www.tcgplayer.com"
+    http_timeout: float = 10.0
+    # Regulador del tráfico hacia TCGplayer: solicitudes por segundo y ráfaga, latencia por encima de la
+    # cual se reduce la concurrencia, y espera máxima por un turno antes de rendirse
+    governor_enabled: bool = True
+    governor_rate_per_second: float = 2.0
+    governor_burst: int = 10
+    governor_latency_target: float = 10.0
+    governor_max_queue_wait: float = 30.0
+    # Circuit breaker: proporción de fallos en las últimas `breaker_window` solicitudes que lo abre, y
+    # segundos que queda abierto antes de probar de nuevo
+    breaker_failure_ratio: float = 0.5
+    breaker_window: int = 20
+    breaker_open_seconds: float = 30.0
+    http_max_connections: int = 20
+    data_dir: Path = field(default=DEFAULT_DATA_DIR)
+    # Caché de precios: TTL fresco, ventana extra en la que se sirve viejo mientras se refresca, y tamaño LRU
+    price_cache_backend: str = "memory"
+    price_cache_ttl: float = 900.0
+    price_cache_stale_ttl: float = 3600.0
+    price_cache_max_entries: int = 2000
+    # Si TCGplayer falla o el circuito está abierto, se sirve lo cacheado hasta esta edad extra
+    stale_if_error: float = 86400.0
+    # Caché de páginas de búsqueda en vivo y prefetch de las páginas siguientes (0 lo desactiva, máximo 2)
+    search_cache_ttl: float = 600.0
+    search_cache_max_entries: int = 500
+    prefetch_depth: int = 1
+    prefetch_concurrency: int = 2
+    # Catálogo local (SQLite FTS5) que responde /api/suggestions; edad máxima de una consulta y de sus precios
+    catalog_enabled: bool = True
+    catalog_ttl: float = 86400.0
+    catalog_price_ttl: float = 3600.0
+    # Páginas de 50 resultados con las que se completa en segundo plano una consulta filtrada (0 lo desactiva)
+    catalog_fill_pages: int = 4
+    # Histórico de precios: un precio igual al último de la serie no se guarda hasta pasados estos segundos
+    price_history_enabled: bool = True
+    price_history_min_interval: float = 3600.0
+    # Refresco proactivo: workers, refrescos por minuto hacia TCGplayer, ciclo de planificación,
+    # tamaño de la lista de seguimiento y vida media de la popularidad de cada carta
+    scheduler_enabled: bool = True
+    scheduler_workers: int = 2
+    scheduler_rate_per_minute: float = 20.0
+    scheduler_interval: float = 15.0
+    scheduler_max_entries: int = 500
+    scheduler_half_life: float = 3600.0
+    # Búsquedas simultáneas que puede lanzar una valoración por lotes (POST /api/prices)
+    batch_concurrency: int = 4
+    # Compresión de las respuestas del API (brotli si está instalado, si no gzip) a partir de este tamaño en bytes
+    compression_enabled: bool = True
+    compression_min_size: int = 1000
+    # Proxy local de las imágenes de las cartas (/api/images): tamaño máximo en disco y CDN de origen
+    image_cache_enabled: bool = True
+    image_cache_max_mb: int = 200
+    image_cdn_url: str = "https://tcgplayer-cdn.tcgplayer.com"
+
+
+def load_settings() -> App_settings:
+    """Construye la configuración a partir del entorno, usando los valores por defecto si faltan."""
+    return App_settings(
+        browser_pool_size=max(1, _env_int("OPTCG_BROWSER_POOL_SIZE", App_settings.browser_pool_size)),
+        browser_max_pages=max(1, _env_int("OPTCG_BROWSER_MAX_PAGES", App_settings.browser_max_pages)),
+        browser_health_check_interval=_env_float(
+            "OPTCG_BROWSER_HEALTH_CHECK_INTERVAL", App_settings.browser_health_check_interval
+        ),
+        browser_max_rss_mb=max(0, _env_int("OPTCG_BROWSER_MAX_RSS_MB", App_settings.browser_max_rss_mb)),
+        browser_memory_budget_mb=max(
+            0, _env_int("OPTCG_BROWSER_MEMORY_BUDGET_MB", App_settings.browser_memory_budget_mb)
+        ),
+        memory_sample_interval=max(
+            0.5, _env_float("OPTCG_MEMORY_SAMPLE_INTERVAL", App_settings.memory_sample_interval)
+        ),
+        memory_max_wait=max(0.0, _env_float("OPTCG_MEMORY_MAX_WAIT", App_settings.memory_max_wait)),
+        page_deadline=max(0.0, _env_float("OPTCG_PAGE_DEADLINE", App_settings.page_deadline)),
+        block_resources=_env_bool("OPTCG_BLOCK_RESOURCES", App_settings.block_resources),
+        blocked_resource_types=_env_list("OPTCG_BLOCKED_RESOURCE_TYPES", App_settings.blocked_resource_types),
+        blocked_domains=_env_list("OPTCG_BLOCKED_DOMAINS", App_settings.blocked_domains),
+        allowed_domains=_env_list("OPTCG_ALLOWED_DOMAINS", App_settings.allowed_domains),
+        scrape_engine=_env_str("OPTCG_SCRAPE_ENGINE", App_settings.scrape_engine).lower(),
+        scrape_concurrency=max(1, _env_int("OPTCG_SCRAPE_CONCURRENCY", App_settings.scrape_concurrency)),
+        worker_processes=max(0, _env_int("OPTCG_WORKER_PROCESSES", App_settings.worker_processes)),
+        fast_path_enabled=_env_bool("OPTCG_FAST_PATH", App_settings.fast_path_enabled),
+        tcgplayer_api_url=_env_str("OPTCG_TCGPLAYER_API_URL", App_settings.tcgplayer_api_url),
+        tcgplayer_site_url=_env_str("OPTCG_TCGPLAYER_SITE_URL", App_settings.tcgplayer_site_url).rstrip("/"),
+        http_timeout=_env_float("OPTCG_HTTP_TIMEOUT", App_settings.http_timeout),
+        http_max_connections=max(1, _env_int("OPTCG_HTTP_MAX_CONNECTIONS", App_settings.http_max_connections)),
+        governor_enabled=_env_bool("OPTCG_GOVERNOR", App_settings.governor_enabled),
+        governor_rate_per_second=max(
+            0.01, _env_float("OPTCG_GOVERNOR_RATE_PER_SECOND", App_settings.governor_rate_per_second)
+        ),
+        governor_burst=max(1, _env_int("OPTCG_GOVERNOR_BURST", App_settings.governor_burst)),
+        governor_latency_target=max(
+            0.1, _env_float("OPTCG_GOVERNOR_LATENCY_TARGET", App_settings.governor_latency_target)
+        ),
+        governor_max_queue_wait=max(
+            0.1, _env_float("OPTCG_GOVERNOR_MAX_QUEUE_WAIT", App_settings.governor_max_queue_wait)
+        ),
+        breaker_failure_ratio=max(
+            0.01, min(1.0, _env_float("OPTCG_BREAKER_FAILURE_RATIO", App_settings.breaker_failure_ratio))
+        ),
+        breaker_window=max(2, _env_int("OPTCG_BREAKER_WINDOW", App_settings.breaker_window)),
+        breaker_open_seconds=max(1.0, _env_float("OPTCG_BREAKER_OPEN_SECONDS", App_settings.breaker_open_seconds)),
+        data_dir=Path(_env_str("OPTCG_DATA_DIR", str(DEFAULT_DATA_DIR))),
+        price_cache_backend=_env_str("OPTCG_PRICE_CACHE_BACKEND", App_settings.price_cache_backend).lower(),
+        price_cache_ttl=_env_float("OPTCG_PRICE_CACHE_TTL", App_settings.price_cache_ttl),
+        price_cache_stale_ttl=_env_float("OPTCG_PRICE_CACHE_STALE_TTL", App_settings.price_cache_stale_ttl),
+        price_cache_max_entries=max(1, _env_int("OPTCG_PRICE_CACHE_MAX_ENTRIES", App_settings.price_cache_max_entries)),
+        stale_if_error=max(0.0, _env_float("OPTCG_STALE_IF_ERROR", App_settings.stale_if_error)),
+        search_cache_ttl=_env_float("OPTCG_SEARCH_CACHE_TTL", App_settings.search_cache_ttl),
+        search_cache_max_entries=max(
+            1, _env_int("OPTCG_SEARCH_CACHE_MAX_ENTRIES", App_settings.search_cache_max_entries)
+        ),
+        prefetch_depth=max(0, min(2, _env_int("OPTCG_PREFETCH_DEPTH", App_settings.prefetch_depth))),
+        prefetch_concurrency=max(1, _env_int("OPTCG_PREFETCH_CONCURRENCY", App_settings.prefetch_concurrency)),
+        catalog_enabled=_env_bool("OPTCG_CATALOG", App_settings.catalog_enabled),
+        catalog_ttl=_env_float("OPTCG_CATALOG_TTL", App_settings.catalog_ttl),
+        catalog_price_ttl=_env_float("OPTCG_CATALOG_PRICE_TTL", App_settings.catalog_price_ttl),
+        catalog_fill_pages=max(0, _env_int("OPTCG_CATALOG_FILL_PAGES", App_settings.catalog_fill_pages)),
+        price_history_enabled=_env_bool("OPTCG_PRICE_HISTORY", App_settings.price_history_enabled),
+        price_history_min_interval=_env_float(
+            "OPTCG_PRICE_HISTORY_MIN_INTERVAL", App_settings.price_history_min_interval
+        ),
+        scheduler_enabled=_env_bool("OPTCG_SCHEDULER", App_settings.scheduler_enabled),
+        scheduler_workers=max(1, _env_int("OPTCG_SCHEDULER_WORKERS", App_settings.scheduler_workers)),
+        scheduler_rate_per_minute=max(
+            0.1, _env_float("OPTCG_SCHEDULER_RATE_PER_MINUTE", App_settings.scheduler_rate_per_minute)
+        ),
+        scheduler_interval=max(1.0, _env_float("OPTCG_SCHEDULER_INTERVAL", App_settings.scheduler_interval)),
+        scheduler_max_entries=max(1, _env_int("OPTCG_SCHEDULER_MAX_ENTRIES", App_settings.scheduler_max_entries)),
+        scheduler_half_life=max(1.0, _env_float("OPTCG_SCHEDULER_HALF_LIFE", App_settings.scheduler_half_life)),
+        batch_concurrency=max(1, _env_int("OPTCG_BATCH_CONCURRENCY", App_settings.batch_concurrency)),
+        compression_enabled=_env_bool("OPTCG_COMPRESSION", App_settings.compression_enabled),
+        compression_min_size=max(0, _env_int("OPTCG_COMPRESSION_MIN_SIZE", App_settings.compression_min_size)),
+        image_cache_enabled=_env_bool("OPTCG_IMAGE_CACHE", App_settings.image_cache_enabled),
+        image_cache_max_mb=max(1, _env_int("OPTCG_IMAGE_CACHE_MAX_MB", App_settings.image_cache_max_mb)),
+        image_cdn_url=_env_str("OPTCG_IMAGE_CDN_URL", App_settings.image_cdn_url).rstrip("/"),
+    )
+
+
+settings = load_settings()
@@ -0,0 +1,48 @@
+"""
+Comentario: coalescencia de solicitudes (single-flight). Si llegan varias solicitudes con la misma
+clave mientras ya hay un scrape en curso para ella, todas esperan ese mismo scrape y comparten su
+resultado o su error en vez de abrir una sesión de navegador cada una.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+Result_type = TypeVar("Result_type")
+
+
+class Single_flight:
+    """Agrupa llamadas concurrentes por clave; solo la primera (el líder) ejecuta la función."""
+
+    def __init__(self) -> None:
+        self.leaders = 0
+        self.coalesced = 0
+        self._in_flight: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Result_type]]) -> Result_type:
+        task = self._in_flight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.create_task(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+            logger.debug(f"Solicitud coalescida con el scrape en curso para '{key}'")
+        # shield: si un cliente cancela, el scrape sigue para los demás que lo esperan
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Marca la excepción como recuperada aunque todos los clientes se hayan ido
+            task.exception()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "in_flight": len(self._in_flight),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
@@ -12,6 +12,11 @@ if (-not (Test-Path $venvPath)) {
 Write-Host "Activando entorno virtual con Python 3.12..." -ForegroundColor Green
 & "$venvPath\Scripts\Activate.ps1"
 
+# Con --reload en Windows el event loop no admite subprocesos: usamos el motor síncrono salvo que ya esté configurado
+if (-not $env:OPTCG_SCRAPE_ENGINE) {
+    $env:OPTCG_SCRAPE_ENGINE = "sync"
+}
+
 Write-Host "Iniciando servidor FastAPI en http://127.0.0.1:8001..." -ForegroundColor Green
 uvicorn main:app --reload --host 127.0.0.1 --port 8001
 
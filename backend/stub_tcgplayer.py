@@ -0,0 +1,210 @@
+"""
+Comentario: servidor local que imita el API JSON de búsqueda de TCGplayer reproduciendo respuestas
+grabadas en `fixtures/tcgplayer/`. Sirve para probar el camino rápido sin tocar el sitio real:
+
+    python stub_tcgplayer.py --port 8765
+    OPTCG_TCGPLAYER_API_URL=http://127.0.0.1:8765 uvicorn main:app --port 8001
+
+Para `POST /v1/search/request?q=...` se usa `search_<slug>.json` si existe; si no, la primera fixture
+cuyo slug esté contenido en la consulta (p. ej. `search_luffy.json` para "Monkey.D.Luffy OP05-119"),
+luego los registros grabados cuyo número de carta sea la consulta ("OP05-119") y como último recurso
+`search_default.json`. Los campos `from` y `size` del cuerpo se aplican sobre
+los resultados grabados para poder probar la paginación.
+
+Una búsqueda vacía (`q=`) lista todos los productos grabados, filtrados por el `setName` del cuerpo si
+viene, con la agregación `setName` que usa `bulk_export.py` para descubrir los sets.
+
+`GET /v1/product/<id>/details` devuelve el registro de ese producto tal como aparece en cualquiera de
+las fixtures de búsqueda (el detalle real trae los mismos campos y algunos más).
+
+`GET /product/<id>_in_200x200.jpg` imita el CDN de imágenes (`OPTCG_IMAGE_CDN_URL`): para los productos
+grabados devuelve una imagen de relleno de unos KB, distinta por producto.
+
+`GET /search/<línea>/product?q=...&page=N` devuelve `search_grid.html`, una vista de grid que pinta las
+tarjetas a partir de ese mismo XHR. Con `OPTCG_TCGPLAYER_SITE_URL` apuntando al stub, los flujos de
+Playwright recorren páginas reales sin salir de la máquina (ver `benchmark.py`).
+
+Con `server.throttle_status = 429` (o 403, 503) todas las rutas responden ese estado, como cuando
+TCGplayer limita o desafía al cliente; `None` vuelve a las respuestas grabadas.
+"""
+import argparse
+import copy
+import json
+import logging
+import re
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures" / "tcgplayer"
+
+
+def _slugify(value: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", value.lower()).strip("-")
+
+
+class Fixture_store:
+    """Carga las fixtures de búsqueda una sola vez y resuelve cuál corresponde a cada consulta."""
+
+    def __init__(self, fixtures_dir: Path) -> None:
+        self.fixtures_dir = fixtures_dir
+        self._search: dict[str, dict] = {}
+        self._products: dict[int, dict] = {}
+        for path in sorted(fixtures_dir.glob("search_*.json")):
+            payload = json.loads(path.read_text(encoding="utf-8"))
+            self._search[path.stem.removeprefix("search_")] = payload
+            for block in payload.get("results", []):
+                for record in block.get("results", []):
+                    self._products.setdefault(int(record["productId"]), record)
+        grid_path = fixtures_dir / "search_grid.html"
+        self.grid_html = grid_path.read_bytes() if grid_path.exists() else None
+
+    def search(self, query_text: str) -> dict:
+        slug = _slugify(query_text)
+        if slug in self._search:
+            return self._search[slug]
+        for name, payload in self._search.items():
+            if name != "default" and name in slug:
+                return payload
+        by_number = [
+            record for record in self._products.values()
+            if _slugify(str((record.get("customAttributes") or {}).get("number") or "")) == slug
+        ]
+        if by_number:
+            return {"errors": [], "results": [{"totalResults": len(by_number), "results": by_number}]}
+        return self._search.get("default", {"errors": [], "results": [{"totalResults": 0, "results": []}]})
+
+    def browse(self, set_names: list[str] | None, sort: dict | None = None) -> dict:
+        """Todos los productos grabados (o los de esos sets), con la agregación de sets de la búsqueda vacía."""
+        records = sorted(self._products.values(), key=lambda record: int(record["productId"]))
+        if (sort or {}).get("field") == "product-sorting-name":
+            records.sort(key=lambda record: str(record.get("productName") or ""))
+        set_counts = Counter(record.get("setName") for record in records if record.get("setName"))
+        if set_names:
+            records = [record for record in records if record.get("setName") in set_names]
+        aggregations = {"setName": [{"value": name, "count": float(count)} for name, count in sorted(set_counts.items())]}
+        return {
+            "errors": [],
+            "results": [{"aggregations": aggregations, "totalResults": len(records), "results": copy.deepcopy(records)}],
+        }
+
+    def product(self, product_id: int) -> dict | None:
+        return self._products.get(product_id)
+
+
+def placeholder_image(product_id: int) -> bytes:
+    """Bytes con marcadores de inicio y fin de JPEG, suficientes para probar el proxy de imágenes."""
+    return b"\xff\xd8\xff\xe0" + str(product_id).encode("ascii") * 512 + b"\xff\xd9"
+
+
+class Stub_handler(BaseHTTPRequestHandler):
+    store: Fixture_store
+
+    def _send_json(self, status: int, payload: object) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_throttled(self) -> bool:
+        status = getattr(self.server, "throttle_status", None)
+        if status is None:
+            return False
+        self._send_json(status, {"errors": ["Demasiadas solicitudes"]})
+        return True
+
+    def do_GET(self) -> None:
+        if self._send_throttled():
+            return
+        parsed = urlparse(self.path)
+        product_match = re.fullmatch(r"/v1/product/(\d+)/details", parsed.path)
+        if product_match is not None:
+            record = self.store.product(int(product_match.group(1)))
+            if record is None:
+                self._send_json(404, {"errors": [f"Producto no grabado: {product_match.group(1)}"]})
+            else:
+                self._send_json(200, record)
+            return
+        image_match = re.fullmatch(r"/product/(\d+)_in_200x200\.jpg", parsed.path)
+        if image_match is not None:
+            product_id = int(image_match.group(1))
+            if self.store.product(product_id) is None:
+                self._send_json(404, {"errors": [f"Imagen no grabada: {product_id}"]})
+                return
+            body = placeholder_image(product_id)
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.store.grid_html is None or not re.fullmatch(r"/search/[^/]+/product", parsed.path):
+            self._send_json(404, {"errors": [f"Ruta no grabada: {parsed.path}"]})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(self.store.grid_html)))
+        self.end_headers()
+        self.wfile.write(self.store.grid_html)
+
+    def do_POST(self) -> None:
+        if self._send_throttled():
+            return
+        parsed = urlparse(self.path)
+        if parsed.path != "/v1/search/request":
+            self._send_json(404, {"errors": [f"Ruta no grabada: {parsed.path}"]})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        request_body = json.loads(self.rfile.read(length) or b"{}")
+        query_text = parse_qs(parsed.query).get("q", [""])[0]
+
+        if query_text.strip():
+            payload = copy.deepcopy(self.store.search(query_text))
+        else:
+            term_filters = (request_body.get("filters") or {}).get("term") or {}
+            payload = self.store.browse(term_filters.get("setName"), request_body.get("sort"))
+        start = int(request_body.get("from", 0))
+        size = int(request_body.get("size", 24))
+        for block in payload.get("results", []):
+            block["results"] = block.get("results", [])[start:start + size]
+        self._send_json(200, payload)
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(format % args)
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, fixtures_dir: Path = DEFAULT_FIXTURES_DIR) -> ThreadingHTTPServer:
+    """Arranca el stub en un hilo de fondo y devuelve el servidor (el puerto real está en `server_address`)."""
+    handler = type("Bound_stub_handler", (Stub_handler,), {"store": Fixture_store(fixtures_dir)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.throttle_status = None
+    threading.Thread(target=server.serve_forever, name="stub-tcgplayer", daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stub local del API JSON de TCGplayer con fixtures grabadas.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixtures", type=Path, default=DEFAULT_FIXTURES_DIR)
+    args = parser.parse_args()
+
+    handler = type("Bound_stub_handler", (Stub_handler,), {"store": Fixture_store(args.fixtures)})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"Stub de TCGplayer escuchando en http://{args.host}:{args.port} (fixtures: {args.fixtures})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
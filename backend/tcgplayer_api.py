@@ -0,0 +1,297 @@
+"""
+Comentario: camino rápido hacia los endpoints JSON que usa la propia vista de grid de TCGplayer
+(mp-search-api). En lugar de renderizar la página, esperar selectores y hacer scroll, pedimos el
+JSON de búsqueda con un `httpx.AsyncClient` con conexiones keep-alive y lo mapeamos directamente
+a `Search_suggestion` / `Card_price`. Si este camino falla, el motor de Playwright sigue disponible
+como respaldo.
+
+La URL base es configurable (OPTCG_TCGPLAYER_API_URL) para poder probarlo contra `stub_tcgplayer.py`,
+que reproduce respuestas grabadas en `fixtures/tcgplayer/`.
+"""
+import logging
+import math
+import re
+from typing import Any
+
+import httpx
+
+from metrics import price_source_total
+from models import Card_price, Card_query, Search_results_response, Search_suggestion
+from scraper import build_price_search_url, empty_search_results
+from upstream_governor import THROTTLE_STATUSES, Upstream_throttled
+
+logger = logging.getLogger(__name__)
+
+ONE_PIECE_PRODUCT_LINE = "one-piece-card-game"
+# Orden de "Name: A-Z" del grid. El orden por relevancia (`sort: {}`) no es estable entre páginas,
+# así que recorrer un set con él puede repetir unas cartas y saltarse otras
+SET_CRAWL_SORT = {"field": "product-sorting-name", "order": "asc"}
+
+# Los colores llegan como "Red" o ["Red", "Green"]; los normalizamos a los valores que usa el frontend
+KNOWN_COLORS = ["RED", "BLUE", "GREEN", "PURPLE", "YELLOW", "BLACK"]
+
+
+class Tcgplayer_api_error(RuntimeError):
+    """El API JSON respondió con un error o con una forma inesperada; conviene usar Playwright."""
+
+
+def _raise_for_status(response: httpx.Response) -> None:
+    # Un 403/429/503 es TCGplayer limitándonos: repetirlo con Playwright sería otra solicitud al mismo
+    # host, así que sube como `Upstream_throttled` para que el regulador lo vea y no haya respaldo
+    if response.status_code in THROTTLE_STATUSES:
+        raise Upstream_throttled(f"TCGplayer respondió {response.status_code} a {response.url}")
+    response.raise_for_status()
+
+
+def _slugify(value: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", value.lower()).strip("-")
+
+
+def _first(value: Any) -> Any:
+    if isinstance(value, list):
+        return value[0] if value else None
+    return value
+
+
+def build_search_request_body(
+    page: int,
+    page_size: int,
+    product_line: str | None,
+    set_name: str | None = None,
+    sort: dict[str, str] | None = None,
+) -> dict[str, Any]:
+    """Cuerpo de la búsqueda tal como lo envía la vista de grid de TCGplayer (con el filtro de set del grid)."""
+    term_filters: dict[str, Any] = {}
+    if product_line:
+        term_filters["productLineName"] = [product_line]
+    if set_name:
+        term_filters["setName"] = [set_name]
+    return {
+        "algorithm": "sales_dismax",
+        "from": (page - 1) * page_size,
+        "size": page_size,
+        "filters": {"term": term_filters, "range": {}, "match": {}},
+        "listingSearch": {
+            "context": {"cart": {}},
+            "filters": {
+                "term": {"sellerStatus": "Live", "channelId": 0},
+                "range": {"quantity": {"gte": 1}},
+                "exclude": {"channelExclusion": 0},
+            },
+        },
+        "context": {"cart": {}, "shippingCountry": "US", "userProfile": {}},
+        "settings": {"useFuzzySearch": True, "didYouMean": {}},
+        "sort": sort or {},
+    }
+
+
+def build_product_url(record: dict[str, Any]) -> str:
+    """Reconstruye la URL pública del producto igual que los enlaces de la vista de grid."""
+    product_id = int(record["productId"])
+    slug = "-".join(
+        part for part in (
+            _slugify(record.get("productLineUrlName") or record.get("productLineName") or ""),
+            _slugify(record.get("setUrlName") or record.get("setName") or ""),
+            _slugify(record.get("productUrlName") or record.get("productName") or ""),
+        )
+        if part
+    )
+    return f"https://www.tcgplayer.com/product/{product_id}/{slug}"
+
+
+def map_search_record(record: dict[str, Any]) -> Search_suggestion:
+    """Convierte un resultado del JSON de búsqueda en un `Search_suggestion`."""
+    product_id = int(record["productId"])
+    attributes = record.get("customAttributes") or {}
+
+    card_number = _first(attributes.get("number"))
+    card_type = _first(attributes.get("cardType"))
+    color = None
+    raw_color = _first(attributes.get("color"))
+    if raw_color and raw_color.upper() in KNOWN_COLORS:
+        color = raw_color.upper()
+
+    market_price = record.get("marketPrice")
+    card_name = record.get("productName") or ""
+    set_name = record.get("setName")
+    rarity = record.get("rarityName")
+    text_parts = [set_name, f"{rarity}, #{card_number}" if rarity and card_number else rarity, card_name]
+
+    return Search_suggestion(
+        text="\n".join(part for part in text_parts if part)[:100],
+        card_name=card_name,
+        set_name=set_name,
+        product_line=record.get("productLineName") or "One Piece Card Game",
+        image_url=f"https://tcgplayer-cdn.tcgplayer.com/product/{product_id}_in_200x200.jpg",
+        product_url=build_product_url(record),
+        market_price=float(market_price) if market_price is not None else None,
+        rarity=rarity,
+        card_number=card_number,
+        card_type=card_type,
+        color=color,
+    )
+
+
+def _unwrap_search_payload(payload: Any) -> tuple[list[dict[str, Any]], int]:
+    try:
+        result_block = payload["results"][0]
+        return list(result_block.get("results") or []), int(result_block.get("totalResults") or 0)
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        raise Tcgplayer_api_error(f"Respuesta de búsqueda con forma inesperada: {e}") from e
+
+
+def parse_set_aggregation(payload: Any) -> list[tuple[str, int]]:
+    """Sets de la búsqueda con su cantidad de productos, según las agregaciones que trae la respuesta."""
+    try:
+        buckets = payload["results"][0]["aggregations"]["setName"]
+        return [(str(bucket["value"]), int(bucket["count"])) for bucket in buckets if bucket.get("value")]
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        raise Tcgplayer_api_error(f"Respuesta sin agregación de sets: {e}") from e
+
+
+def parse_search_response(payload: Any, page: int, page_size: int) -> Search_results_response:
+    """Convierte la respuesta completa de búsqueda en la respuesta paginada del API."""
+    records, total_results = _unwrap_search_payload(payload)
+    suggestions = []
+    for record in records:
+        try:
+            suggestions.append(map_search_record(record))
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Resultado JSON de TCGplayer ignorado: {e}")
+
+    total_pages = math.ceil(total_results / page_size) if total_results > 0 else 0
+    return Search_results_response(
+        results=suggestions[:page_size],
+        total_results=total_results,
+        page=page,
+        page_size=page_size,
+        total_pages=total_pages,
+        has_next_page=page < total_pages,
+        has_previous_page=page > 1,
+    )
+
+
+class Tcgplayer_api_client:
+    """Cliente del API JSON de búsqueda con un pool de conexiones keep-alive compartido."""
+
+    def __init__(self, base_url: str, timeout: float = 10.0, max_connections: int = 20) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client: httpx.AsyncClient | None = None
+
+    async def start(self) -> None:
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+            ),
+            headers={
+                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+                "Accept": "application/json",
+                "Origin": "https://www.tcgplayer.com",
+                "Referer": "https://www.tcgplayer.com/",
+            },
+        )
+
+    async def stop(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _search_payload(
+        self,
+        query_text: str,
+        page: int,
+        page_size: int,
+        product_line: str | None,
+        set_name: str | None = None,
+        sort: dict[str, str] | None = None,
+    ) -> Any:
+        if self._client is None:
+            raise Tcgplayer_api_error("El cliente del API JSON no está iniciado.")
+        try:
+            response = await self._client.post(
+                f"{self.base_url}/v1/search/request",
+                params={"q": query_text, "isList": "false"},
+                json=build_search_request_body(page, page_size, product_line, set_name, sort),
+            )
+            _raise_for_status(response)
+            return response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise Tcgplayer_api_error(f"Error consultando el API JSON de TCGplayer: {e}") from e
+
+    async def search(self, query_text: str, page: int = 1, page_size: int = 24) -> Search_results_response:
+        """Página de resultados de One Piece Card Game para `query_text`."""
+        if not query_text or len(query_text.strip()) < 2:
+            return empty_search_results(page, page_size)
+        payload = await self._search_payload(query_text, page, page_size, ONE_PIECE_PRODUCT_LINE)
+        return parse_search_response(payload, page, page_size)
+
+    async def list_sets(self) -> list[tuple[str, int]]:
+        """Todos los sets de One Piece Card Game con su cantidad de productos (búsqueda vacía, sin resultados)."""
+        payload = await self._search_payload("", 1, 1, ONE_PIECE_PRODUCT_LINE)
+        return parse_set_aggregation(payload)
+
+    async def search_set(self, set_name: str, page: int = 1, page_size: int = 50) -> Search_results_response:
+        """Página `page` de todos los productos de un set, como el filtro de set de la vista de grid."""
+        payload = await self._search_payload("", page, page_size, ONE_PIECE_PRODUCT_LINE, set_name, SET_CRAWL_SORT)
+        return parse_search_response(payload, page, page_size)
+
+    async def _product_details(self, product_id: int) -> dict[str, Any]:
+        if self._client is None:
+            raise Tcgplayer_api_error("El cliente del API JSON no está iniciado.")
+        try:
+            response = await self._client.get(f"{self.base_url}/v1/product/{product_id}/details")
+            _raise_for_status(response)
+            record = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise Tcgplayer_api_error(f"Error consultando el producto {product_id} en el API JSON: {e}") from e
+        if not isinstance(record, dict) or record.get("productId") is None:
+            raise Tcgplayer_api_error(f"Detalle del producto {product_id} con forma inesperada.")
+        return record
+
+    async def fetch_product_price(self, query: Card_query) -> Card_price:
+        """Precio de mercado de exactamente el producto `query.product_id`, en una sola solicitud."""
+        record = await self._product_details(query.product_id)
+        # El precio de mercado del detalle es el del acabado del producto: foil solo si es `foilOnly`
+        is_foil = bool(record.get("foilOnly"))
+        if query.is_foil and not is_foil:
+            raise ValueError(f"El producto {query.product_id} no es foil.")
+        market_price = record.get("marketPrice")
+        if market_price is None or not 0.01 <= float(market_price) <= 100000:
+            raise Tcgplayer_api_error(f"El producto {query.product_id} no tiene precio de mercado en el API JSON.")
+        price_source_total.inc("product_api")
+        return Card_price(
+            card_name=query.card_name or record.get("productName") or "",
+            set_name=query.set_name or record.get("setName") or "",
+            is_foil=is_foil,
+            market_price=float(market_price),
+            source_url=build_product_url(record),
+            product_id=query.product_id,
+        )
+
+    async def fetch_card_price(self, query: Card_query) -> Card_price:
+        """Precio de mercado del primer resultado con precio, igual que la búsqueda general del grid."""
+        if query.product_id is not None:
+            return await self.fetch_product_price(query)
+        search_terms = f"{query.card_name} {query.set_name}".strip() if query.set_name.strip() else query.card_name
+        if query.is_foil:
+            search_terms += " foil"
+        payload = await self._search_payload(search_terms, 1, 24, None)
+        records, _ = _unwrap_search_payload(payload)
+        for record in records:
+            market_price = record.get("marketPrice")
+            if market_price is not None and 0.01 <= float(market_price) <= 100000:
+                price_source_total.inc("json_api")
+                return Card_price(
+                    card_name=query.card_name,
+                    set_name=query.set_name,
+                    is_foil=query.is_foil,
+                    market_price=float(market_price),
+                    source_url=build_price_search_url(query),
+                    product_id=int(record["productId"]) if record.get("productId") is not None else None,
+                )
+        # Sin precio en el JSON: dejamos que Playwright lo intente con su cascada de selectores
+        raise Tcgplayer_api_error("El API JSON no devolvió ningún precio de mercado para la consulta.")
@@ -0,0 +1,47 @@
+"""
+Comentario: fixtures compartidas de las pruebas. La app se prueba contra `stub_tcgplayer.py` (el API
+JSON de TCGplayer con respuestas grabadas), así que las pruebas de endpoints recorren el camino rápido
+sin salir de la máquina. Se corren desde `backend/` con `python -m pytest`.
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from stub_tcgplayer import start_stub_server  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def stub_server():
+    server = start_stub_server()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture(scope="session")
+def app_client(stub_server, tmp_path_factory):
+    """
+    Cliente de la app apuntando al stub. `settings` se lee al importar `main`, así que el entorno se
+    arma antes de importarlo; el planificador y el prefetch se apagan para que los conteos sean exactos.
+    """
+    stub_url = f"http://127.0.0.1:{stub_server.server_address[1]}"
+    os.environ.update(
+        OPTCG_TCGPLAYER_API_URL=stub_url,
+        OPTCG_IMAGE_CDN_URL=stub_url,
+        OPTCG_DATA_DIR=str(tmp_path_factory.mktemp("data")),
+        OPTCG_SCHEDULER="0",
+        OPTCG_PREFETCH_DEPTH="0",
+        # Circuito chico y corto para poder abrirlo (y que se cierre) dentro de una prueba
+        OPTCG_BREAKER_WINDOW="4",
+        OPTCG_BREAKER_OPEN_SECONDS="1",
+    )
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as client:
+        yield client
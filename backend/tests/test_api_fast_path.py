@@ -0,0 +1,99 @@
+"""Endpoints contra el stub de TCGplayer: todo se resuelve por el camino rápido JSON, sin navegador."""
+import time
+
+import pytest
+
+LUFFY_119_PRODUCT_ID = 594325
+LUFFY_001_PRODUCT_ID = 515123
+
+
+def test_suggestions_from_stub(app_client):
+    response = app_client.get("/api/suggestions", params={"q": "luffy", "page_size": 2})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["total_results"] == 4
+    assert body["total_pages"] == 2
+    assert body["has_next_page"] is True
+    assert [result["card_number"] for result in body["results"]] == ["OP05-119", "OP01-003"]
+    assert body["results"][0]["market_price"] == 3.78
+
+
+def test_suggestions_revalidate_with_etag(app_client):
+    first = app_client.get("/api/suggestions", params={"q": "luffy"})
+    etag = first.headers["etag"]
+
+    second = app_client.get("/api/suggestions", params={"q": "luffy"}, headers={"If-None-Match": etag})
+
+    assert second.status_code == 304
+    assert second.headers["etag"] == etag
+
+
+def test_price_by_card_number(app_client):
+    response = app_client.post("/api/price", json={"card_number": " op05-119 "})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["product_id"] == LUFFY_119_PRODUCT_ID
+    assert body["market_price"] == 3.78
+    assert "max-age" in response.headers["cache-control"]
+
+
+def test_price_by_product_id(app_client):
+    response = app_client.post("/api/price", json={"product_id": LUFFY_001_PRODUCT_ID})
+
+    assert response.status_code == 200
+    assert response.json()["market_price"] == 0.42
+
+
+def test_unknown_card_number_is_404(app_client):
+    response = app_client.post("/api/price", json={"card_number": "OP99-999"})
+
+    assert response.status_code == 404
+    assert response.headers["cache-control"] == "no-store"
+
+
+def test_batch_prices(app_client):
+    items = [
+        {"card_number": "OP02-024"},
+        {"card_number": "op02-024"},
+        {"card_number": "OP99-999"},
+    ]
+
+    first = app_client.post("/api/prices", json={"items": items}).json()
+
+    assert [result["status"] for result in first["results"]] == [200, 200, 404]
+    assert first["results"][0]["price"] == first["results"][1]["price"]
+    assert first["results"][0]["price"]["market_price"] == 12.95
+    assert first["unique_queries"] == 2
+    assert first["cache_hits"] == 0
+
+    second = app_client.post("/api/prices", json={"items": items}).json()
+
+    assert [result["status"] for result in second["results"]] == [200, 200, 404]
+    assert second["cache_hits"] == 1
+
+
+@pytest.fixture
+def throttled_stub(stub_server, app_client):
+    stub_server.throttle_status = 429
+    yield stub_server
+    stub_server.throttle_status = None
+    # El circuito se abrió por un segundo: pasado el plazo, una solicitud correcta lo vuelve a cerrar
+    time.sleep(1.1)
+    assert app_client.post("/api/price", json={"product_id": LUFFY_119_PRODUCT_ID}).status_code == 200
+
+
+def test_throttled_upstream_is_502_then_503(app_client, throttled_stub):
+    # Product IDs sin caché: cada solicitud llega a TCGplayer hasta que se abre el circuito
+    statuses = []
+    for product_id in range(1, 9):
+        response = app_client.post("/api/price", json={"product_id": product_id})
+        statuses.append(response.status_code)
+        if response.status_code == 503:
+            break
+
+    assert statuses[0] == 502
+    assert statuses[-1] == 503
+    assert int(response.headers["retry-after"]) >= 1
+    assert response.headers["cache-control"] == "no-store"
@@ -0,0 +1,12 @@
+import pytest
+
+from card_parser import load_golden_cases, parse_product_card
+
+GOLDEN_CASES = load_golden_cases()
+
+
+@pytest.mark.parametrize("case", GOLDEN_CASES, ids=[case["name"] for case in GOLDEN_CASES])
+def test_golden_case(case):
+    suggestion = parse_product_card(case["raw"], case["query_text"])
+    actual = suggestion.model_dump() if suggestion is not None else None
+    assert actual == case["expected"]
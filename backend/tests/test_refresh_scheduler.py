@@ -0,0 +1,41 @@
+import time
+
+from refresh_scheduler import MIN_REFRESH_AFTER, Refresh_scheduler
+
+
+async def refresh() -> float:
+    return 1.0
+
+
+def test_new_entry_does_not_evict_itself_when_full():
+    scheduler = Refresh_scheduler(max_entries=3)
+    for key in ("a", "b", "c"):
+        scheduler.observe(key, refresh, refresh_after=60.0)
+
+    scheduler.observe("d", refresh, refresh_after=60.0)
+    scheduler.observe("d", refresh, refresh_after=60.0)
+
+    assert "d" in scheduler._entries
+    assert len(scheduler._entries) == 3
+    assert scheduler.evicted == 1
+
+
+def test_eviction_drops_the_coldest_entry():
+    scheduler = Refresh_scheduler(max_entries=2)
+    scheduler.observe("hot", refresh, refresh_after=60.0)
+    scheduler.observe("hot", refresh, refresh_after=60.0)
+    scheduler.observe("cold", refresh, refresh_after=60.0)
+
+    scheduler.observe("new", refresh, refresh_after=60.0)
+
+    assert sorted(scheduler._entries) == ["hot", "new"]
+
+
+def test_zero_refresh_after_is_clamped():
+    scheduler = Refresh_scheduler()
+    scheduler.observe("price|x", refresh, refresh_after=0.0)
+    entry = scheduler._entries["price|x"]
+    assert entry.refresh_after == MIN_REFRESH_AFTER
+
+    entry.last_refreshed = time.time() - 2 * MIN_REFRESH_AFTER
+    assert scheduler.plan() == 1
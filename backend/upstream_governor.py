@@ -0,0 +1,307 @@
+"""
+Comentario: regulador del tráfico saliente hacia TCGplayer, compartido por todos los caminos de
+scraping (precios, búsquedas, streaming, lotes, refrescos y prefetch pasan por el mismo motor).
+Cuando TCGplayer nos limita o nos desafía, seguir mandando solicitudes solo quema timeouts de 30 s;
+el regulador combina tres mecanismos:
+
+- `Token_bucket`: como mucho `rate_per_second` solicitudes por segundo, con ráfagas de `burst`.
+- `Aimd_limiter`: límite de solicitudes simultáneas que crece de a poco (+1 por cada `limit` éxitos
+  rápidos) y se reduce a la mitad ante errores, bloqueos o latencias por encima del objetivo.
+- `Circuit_breaker`: si falla más de `failure_ratio` de las últimas solicitudes, deja de llamar a
+  TCGplayer durante `open_seconds` (duplicándolo si la prueba siguiente vuelve a fallar). Mientras
+  está abierto las solicitudes fallan al instante con `Upstream_unavailable` y los endpoints
+  sirven lo que tengan en caché aunque esté vencido.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+logger = logging.getLogger(__name__)
+
+# Respuestas de TCGplayer que indican que nos están limitando o desafiando
+THROTTLE_STATUSES = frozenset({403, 429, 503})
+# Factor de reducción del límite de concurrencia ante un error o una solicitud lenta
+AIMD_DECREASE_FACTOR = 0.5
+# Tope de la espera del circuito abierto al duplicarse tras pruebas fallidas
+MAX_OPEN_SECONDS = 300.0
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+
+class Upstream_unavailable(Exception):
+    """No se llamó a TCGplayer: circuito abierto o demasiada espera para obtener turno."""
+
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Upstream_throttled(Exception):
+    """TCGplayer respondió con un estado de límite o desafío (403, 429, 503)."""
+
+
+def raise_if_throttled(response) -> None:
+    """Revisa la respuesta de `page.goto`; una página de desafío no trae precios, mejor fallar ya."""
+    if response is not None and response.status in THROTTLE_STATUSES:
+        raise Upstream_throttled(f"TCGplayer respondió {response.status} a {response.url}")
+
+
+class Token_bucket:
+    """Cubeta de fichas por reserva: cada solicitud toma una ficha y espera si la dejó en negativo."""
+
+    def __init__(self, rate_per_second: float, burst: int) -> None:
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self.waited_seconds = 0.0
+
+    def reserve(self) -> float:
+        """Toma una ficha y devuelve cuántos segundos hay que esperar antes de usarla."""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate_per_second)
+        self._updated_at = now
+        self._tokens -= 1
+        return max(0.0, -self._tokens / self.rate_per_second)
+
+    def refund(self) -> None:
+        """Devuelve la ficha de una solicitud que finalmente no se hizo."""
+        self._tokens = min(self.burst, self._tokens + 1)
+
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            self.waited_seconds += delay
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.refund()
+                raise
+
+
+class Aimd_limiter:
+    """Límite de concurrencia con aumento aditivo y reducción multiplicativa (como TCP)."""
+
+    def __init__(self, initial: int, min_limit: int, max_limit: int, latency_target: float) -> None:
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.limit = float(max(min_limit, min(max_limit, initial)))
+        self.increases = 0
+        self.decreases = 0
+        self._last_decrease = 0.0
+
+    @property
+    def current(self) -> int:
+        return int(self.limit)
+
+    def on_success(self, latency: float) -> None:
+        if latency > self.latency_target:
+            self.on_congestion()
+            return
+        if self.limit < self.max_limit:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.increases += 1
+
+    def on_congestion(self) -> None:
+        # Una sola reducción por ventana: una ráfaga de errores simultáneos cuenta como una señal
+        now = time.monotonic()
+        if now - self._last_decrease < self.latency_target:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * AIMD_DECREASE_FACTOR)
+        self.decreases += 1
+        logger.warning(f"TCGplayer congestionado: límite de concurrencia reducido a {self.current}")
+
+
+class Circuit_breaker:
+    def __init__(self, failure_ratio: float, window: int, min_calls: int, open_seconds: float) -> None:
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.base_open_seconds = open_seconds
+        self.open_seconds = open_seconds
+        self.state = BREAKER_CLOSED
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._probe_in_flight = False
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        """Si se puede llamar a TCGplayer ahora. En semiabierto deja pasar una sola prueba."""
+        if self.state == BREAKER_OPEN and self.retry_after() <= 0:
+            self.state = BREAKER_HALF_OPEN
+            logger.info("Circuito hacia TCGplayer semiabierto: probando con una solicitud")
+        if self.state == BREAKER_CLOSED:
+            return True
+        if self.state == BREAKER_HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def abandon_probe(self) -> None:
+        """La prueba se canceló sin llegar a TCGplayer: la siguiente solicitud podrá probar."""
+        self._probe_in_flight = False
+
+    def record(self, ok: bool) -> None:
+        if self.state == BREAKER_HALF_OPEN:
+            self._probe_in_flight = False
+            if ok:
+                self.state = BREAKER_CLOSED
+                self.open_seconds = self.base_open_seconds
+                self._outcomes.clear()
+                logger.info("Circuito hacia TCGplayer cerrado: la prueba respondió bien")
+            else:
+                self._open(min(MAX_OPEN_SECONDS, self.open_seconds * 2))
+            return
+        self._outcomes.append(ok)
+        if self.state == BREAKER_CLOSED and len(self._outcomes) >= self.min_calls:
+            failures = self._outcomes.count(False)
+            if failures / len(self._outcomes) >= self.failure_ratio:
+                self._open(self.base_open_seconds)
+
+    def _open(self, open_seconds: float) -> None:
+        self.state = BREAKER_OPEN
+        self.open_seconds = open_seconds
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+        self._outcomes.clear()
+        logger.warning(f"Circuito hacia TCGplayer abierto durante {open_seconds:.0f}s")
+
+
+class Upstream_governor:
+    """
+    Comentario: `async with governor.permit():` envuelve cada operación contra TCGplayer. Un
+    `ValueError` (p. ej. carta sin precio) cuenta como respuesta correcta de TCGplayer; un
+    `Upstream_unavailable` del motor (memoria agotada) solo reduce la concurrencia; cualquier otra
+    excepción, incluidos los timeouts y `Upstream_throttled`, cuenta como fallo.
+    """
+
+    def __init__(
+        self,
+        rate_per_second: float,
+        burst: int,
+        max_concurrency: int,
+        latency_target: float,
+        max_queue_wait: float,
+        failure_ratio: float,
+        window: int,
+        open_seconds: float,
+    ) -> None:
+        self.bucket = Token_bucket(rate_per_second, burst)
+        self.limiter = Aimd_limiter(max_concurrency, 1, max_concurrency, latency_target)
+        self.breaker = Circuit_breaker(failure_ratio, window, max(1, window // 2), open_seconds)
+        self.max_queue_wait = max_queue_wait
+        self.in_flight = 0
+        self.waiting = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.throttled = 0
+        self.rejected: dict[str, int] = {"circuit_open": 0, "queue_timeout": 0}
+        self._slot_freed = asyncio.Condition()
+
+    def is_degraded(self) -> bool:
+        """Verdadero si el circuito no está cerrado: conviene no generar tráfico especulativo."""
+        return self.breaker.state != BREAKER_CLOSED
+
+    def _reject(self, reason: str, message: str) -> Upstream_unavailable:
+        self.rejected[reason] += 1
+        return Upstream_unavailable(message, retry_after=max(1.0, self.breaker.retry_after()))
+
+    async def _acquire_slot(self) -> None:
+        async def wait_for_slot() -> None:
+            async with self._slot_freed:
+                await self._slot_freed.wait_for(lambda: self.in_flight < self.limiter.current)
+                self.in_flight += 1
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(wait_for_slot(), timeout=self.max_queue_wait)
+        except asyncio.TimeoutError:
+            raise self._reject(
+                "queue_timeout", f"Sin turno para llamar a TCGplayer tras {self.max_queue_wait:.0f}s"
+            ) from None
+        finally:
+            self.waiting -= 1
+
+    async def _release_slot(self) -> None:
+        async with self._slot_freed:
+            self.in_flight -= 1
+            self._slot_freed.notify_all()
+
+    @asynccontextmanager
+    async def permit(self) -> AsyncIterator[None]:
+        if not self.breaker.allow():
+            raise self._reject("circuit_open", "Circuito hacia TCGplayer abierto: no se hacen solicitudes")
+        probing = self.breaker.state == BREAKER_HALF_OPEN
+        try:
+            await self._acquire_slot()
+        except BaseException:
+            if probing:
+                self.breaker.abandon_probe()
+            raise
+        started = time.monotonic()
+        try:
+            await self.bucket.acquire()
+            yield
+        except ValueError:
+            self._record(True, time.monotonic() - started)
+            raise
+        except Upstream_unavailable:
+            # Sobrecarga local (presupuesto de memoria de los navegadores agotado): no dice nada de
+            # TCGplayer, pero sí conviene bajar la concurrencia
+            if probing:
+                self.breaker.abandon_probe()
+            self.limiter.on_congestion()
+            raise
+        except Exception as e:
+            if isinstance(e, Upstream_throttled):
+                self.throttled += 1
+            self._record(False, time.monotonic() - started)
+            raise
+        except BaseException:
+            # Cancelada por quien esperaba (p. ej. un prefetch descartado o un stream que el cliente
+            # cerró): no dice nada de TCGplayer
+            if probing:
+                self.breaker.abandon_probe()
+            raise
+        else:
+            self._record(True, time.monotonic() - started)
+        finally:
+            await self._release_slot()
+
+    def _record(self, ok: bool, latency: float) -> None:
+        self.breaker.record(ok)
+        if ok:
+            self.succeeded += 1
+            self.limiter.on_success(latency)
+        else:
+            self.failed += 1
+            self.limiter.on_congestion()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "breaker_state": self.breaker.state,
+            "breaker_retry_after_seconds": round(self.breaker.retry_after(), 1),
+            "breaker_times_opened": self.breaker.times_opened,
+            "concurrency_limit": self.limiter.current,
+            "concurrency_max": self.limiter.max_limit,
+            "limit_increases": self.limiter.increases,
+            "limit_decreases": self.limiter.decreases,
+            "rate_per_second": self.bucket.rate_per_second,
+            "burst": self.bucket.burst,
+            "rate_limit_wait_seconds": round(self.bucket.waited_seconds, 3),
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "throttled": self.throttled,
+            "rejected": dict(self.rejected),
+        }
@@ -0,0 +1,420 @@
+"""
+Comentario: modo multiproceso (OPTCG_WORKER_PROCESSES=N). Un solo proceso de uvicorn queda limitado
+por el GIL (análisis de tarjetas, serialización) y por la memoria de sus Chromium; en este modo el
+proceso de FastAPI solo atiende HTTP, cachés, catálogo, coalescencia y el regulador de tráfico, y
+los scrapes corren en N procesos worker, cada uno con su propio motor (camino rápido + pool de
+navegadores, igual que en modo de un solo proceso).
+
+- Cada worker tiene su propio par de pipes (trabajos de ida, resultados de vuelta): sin locks
+  compartidos entre procesos, un worker que muere a mitad de un envío no bloquea a los demás.
+  El proceso principal manda cada trabajo al worker con menos trabajos pendientes.
+- Un hilo del proceso principal recibe los resultados de todos los pipes y los entrega al event
+  loop. En streaming, el worker envía cada resultado apenas lo extrae. Solo ese hilo cierra los
+  pipes de resultados, así ninguno se cierra mientras está esperando en ellos.
+- Como las cachés, el catálogo y el histórico viven en el proceso principal, todos los workers los
+  comparten sin más. Para varios procesos de uvicorn (`--workers`) se usan los backends SQLite.
+- Si un worker muere, sus trabajos en curso fallan y se lanza otro en su lugar.
+"""
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from multiprocessing.connection import Connection, wait
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable
+
+from models import Card_price, Card_query, Search_results_response, Search_suggestion
+from settings import App_settings
+from memory_governor import MEMORY_RETRY_AFTER_SECONDS, Memory_budget_exhausted
+from upstream_governor import Upstream_throttled
+
+logger = logging.getLogger(__name__)
+
+# Cada cuánto envía cada worker las estadísticas de su motor y revisa el principal que sigan vivos
+STATS_INTERVAL_SECONDS = 1.0
+# Espera máxima a que los workers arranquen su motor al iniciar, y a que terminen sus scrapes al apagar
+START_TIMEOUT_SECONDS = 60.0
+STOP_TIMEOUT_SECONDS = 30.0
+
+# Mensajes de los workers: (tipo, id de trabajo o índice de worker, contenido)
+MSG_STARTED = "started"
+MSG_ITEM = "item"
+MSG_DONE = "done"
+MSG_ERROR = "error"
+MSG_STATS = "stats"
+
+# Clases de error que cruzan de proceso: las excepciones de Playwright no siempre se pueden serializar
+ERROR_NOT_FOUND = "not_found"
+ERROR_THROTTLED = "throttled"
+ERROR_OUT_OF_MEMORY = "out_of_memory"
+ERROR_FAILED = "failed"
+
+
+class Worker_error(Exception):
+    """Un scrape falló dentro de un proceso worker, o el worker murió mientras lo hacía."""
+
+
+def _error_class(exc: Exception) -> str:
+    if isinstance(exc, ValueError):
+        return ERROR_NOT_FOUND
+    if isinstance(exc, Upstream_throttled):
+        return ERROR_THROTTLED
+    if isinstance(exc, Memory_budget_exhausted):
+        return ERROR_OUT_OF_MEMORY
+    return ERROR_FAILED
+
+
+def _rebuild_error(error_class: str, message: str) -> Exception:
+    """Reconstruye el error del worker con la clase que los endpoints y el regulador distinguen."""
+    if error_class == ERROR_NOT_FOUND:
+        return ValueError(message)
+    if error_class == ERROR_THROTTLED:
+        return Upstream_throttled(message)
+    if error_class == ERROR_OUT_OF_MEMORY:
+        return Memory_budget_exhausted(message, retry_after=MEMORY_RETRY_AFTER_SECONDS)
+    return Worker_error(message)
+
+
+def pool_launches(pool_stats: dict[str, Any]) -> int:
+    """Lanzamientos de Chromium de un pool: el asíncrono los cuenta en total, el síncrono por slot."""
+    if "launches" in pool_stats:
+        return pool_stats["launches"]
+    return sum(slot.get("launches", 0) for slot in pool_stats.get("slots", []))
+
+
+def worker_main(
+    worker_index: int,
+    app_settings: App_settings,
+    engine_factory: Callable[[App_settings], Any],
+    jobs: Connection,
+    results: Connection,
+) -> None:
+    """Punto de entrada de cada proceso worker (contexto spawn: no hereda el event loop ni Playwright)."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s - worker{worker_index} - %(name)s - %(levelname)s - %(message)s",
+    )
+    asyncio.run(_serve_jobs(worker_index, engine_factory(app_settings), jobs, results))
+
+
+async def _serve_jobs(worker_index: int, engine: Any, jobs: Connection, results: Connection) -> None:
+    """
+    Ejecuta los trabajos que llegan por `jobs`; el propio motor limita cuántos scrapes corren a la
+    vez. Todos los envíos por `results` se hacen desde el event loop, así no se intercalan.
+    """
+    loop = asyncio.get_running_loop()
+    stopping = asyncio.Event()
+    running: set[asyncio.Task] = set()
+
+    async def run_job(job_id: int, kind: str, args: tuple) -> None:
+        results.send((MSG_STARTED, job_id, worker_index))
+        try:
+            if kind == "stream":
+                async for item in engine.stream_search(*args):
+                    results.send((MSG_ITEM, job_id, item))
+                results.send((MSG_DONE, job_id, None))
+            elif kind == "price":
+                results.send((MSG_DONE, job_id, await engine.fetch_card_price(*args)))
+            else:
+                results.send((MSG_DONE, job_id, await engine.search(*args)))
+        except Exception as e:
+            results.send((MSG_ERROR, job_id, (_error_class(e), str(e) or type(e).__name__)))
+
+    def start_job(job: tuple) -> None:
+        task = loop.create_task(run_job(*job))
+        running.add(task)
+        task.add_done_callback(running.discard)
+
+    def read_jobs() -> None:
+        # Hilo aparte porque `recv` bloquea; None (o el pipe cerrado) indica que hay que apagar
+        while True:
+            try:
+                job = jobs.recv()
+            except (EOFError, OSError):
+                job = None
+            if job is None:
+                loop.call_soon_threadsafe(stopping.set)
+                return
+            loop.call_soon_threadsafe(start_job, job)
+
+    async def report_stats() -> None:
+        while True:
+            results.send((MSG_STATS, worker_index, {**engine.stats(), "pid": os.getpid()}))
+            await asyncio.sleep(STATS_INTERVAL_SECONDS)
+
+    await engine.start()
+    threading.Thread(target=read_jobs, name=f"worker{worker_index}-jobs", daemon=True).start()
+    reporter = asyncio.create_task(report_stats())
+    try:
+        await stopping.wait()
+        await asyncio.gather(*running, return_exceptions=True)
+    finally:
+        reporter.cancel()
+        await engine.stop()
+
+
+@dataclass
+class Pending_job:
+    ticket: Any
+    worker_index: int
+    future: asyncio.Future | None = None
+    items: asyncio.Queue | None = None
+    abandoned: bool = False
+
+
+@dataclass
+class Worker_process:
+    index: int
+    process: Any
+    jobs: Connection
+    results: Connection
+    pending: int = 0
+    restarts: int = 0
+    engine_stats: dict[str, Any] = field(default_factory=dict)
+    # Se marca con las primeras estadísticas, que el worker envía después de arrancar su motor
+    ready: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class Process_scrape_engine:
+    """
+    Comentario: misma interfaz que los motores de `scrape_engine.py`, pero cada scrape se envía a un
+    proceso worker. Las métricas de cola (`metrics`, un `Scrape_metrics`) se miden desde el proceso
+    principal e incluyen el paso por las colas entre procesos.
+    """
+
+    mode = "workers"
+
+    def __init__(
+        self,
+        app_settings: App_settings,
+        engine_factory: Callable[[App_settings], Any],
+        worker_concurrency: int,
+        metrics: Any,
+    ) -> None:
+        self.app_settings = app_settings
+        self.engine_factory = engine_factory
+        self.worker_count = app_settings.worker_processes
+        self.worker_concurrency = worker_concurrency
+        self.concurrency = self.worker_count * worker_concurrency
+        self.metrics = metrics
+        self._context = multiprocessing.get_context("spawn")
+        self._workers: list[Worker_process] = []
+        self._pending: dict[int, Pending_job] = {}
+        self._job_ids = itertools.count(1)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._monitor: asyncio.Task | None = None
+        self._reader: threading.Thread | None = None
+        # Pipes de resultados de workers relanzados, que el hilo lector cierra en su próxima vuelta
+        self._retired_results: queue.SimpleQueue[Connection] = queue.SimpleQueue()
+        self._running = False
+
+    def _spawn(self, index: int) -> Worker_process:
+        worker_jobs, jobs = self._context.Pipe(duplex=False)
+        results, worker_results = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=worker_main,
+            args=(index, self.app_settings, self.engine_factory, worker_jobs, worker_results),
+            name=f"optcg-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        # Los extremos del worker solo deben quedar abiertos en su proceso, así su muerte se ve como EOF
+        worker_jobs.close()
+        worker_results.close()
+        return Worker_process(index, process, jobs, results)
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._running = True
+        self._workers = [self._spawn(index) for index in range(self.worker_count)]
+        self._reader = threading.Thread(target=self._read_results, name="worker-results", daemon=True)
+        self._reader.start()
+        self._monitor = asyncio.create_task(self._watch_workers())
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(worker.ready.wait() for worker in self._workers)), timeout=START_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"No todos los workers arrancaron en {START_TIMEOUT_SECONDS:.0f}s; se siguen esperando en segundo plano")
+        logger.info(f"{self.worker_count} procesos worker de scraping iniciados ({self.worker_concurrency} scrapes cada uno)")
+
+    async def stop(self) -> None:
+        self._running = False
+        if self._monitor is not None:
+            self._monitor.cancel()
+            await asyncio.gather(self._monitor, return_exceptions=True)
+        for worker in self._workers:
+            try:
+                worker.jobs.send(None)
+            except OSError:
+                pass
+
+        def join_workers() -> None:
+            for worker in self._workers:
+                worker.process.join(STOP_TIMEOUT_SECONDS)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+                    worker.process.join()
+            if self._reader is not None:
+                self._reader.join(STOP_TIMEOUT_SECONDS)
+
+        await asyncio.to_thread(join_workers)
+        for worker in self._workers:
+            worker.jobs.close()
+            worker.results.close()
+        while not self._retired_results.empty():
+            self._retired_results.get_nowait().close()
+        for job_id in list(self._pending):
+            self._fail(job_id, Worker_error("El motor de workers se apagó antes de terminar el scrape."))
+
+    def _read_results(self) -> None:
+        """Hilo lector: espera en los pipes de resultados de todos los workers (se relee la lista en cada vuelta)."""
+        while self._running:
+            while not self._retired_results.empty():
+                self._retired_results.get_nowait().close()
+            connections = {worker.results: worker for worker in self._workers if not worker.results.closed}
+            for connection in wait(list(connections), timeout=STATS_INTERVAL_SECONDS):
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    # El worker terminó: `_watch_workers` lo relanza con pipes nuevos
+                    connection.close()
+                    continue
+                self._loop.call_soon_threadsafe(self._dispatch, message)
+
+    def _dispatch(self, message: tuple) -> None:
+        kind, key, payload = message
+        if kind == MSG_STATS:
+            self._workers[key].engine_stats = payload
+            self._workers[key].ready.set()
+            return
+        pending = self._pending.get(key)
+        if pending is None:
+            return
+        if kind == MSG_STARTED:
+            self.metrics.start(pending.ticket)
+        elif kind == MSG_ITEM:
+            if not pending.abandoned:
+                pending.items.put_nowait(payload)
+        elif kind == MSG_DONE:
+            self._finish(key, ok=True)
+            if pending.future is not None:
+                if not pending.future.done():
+                    pending.future.set_result(payload)
+            elif not pending.abandoned:
+                pending.items.put_nowait(None)
+        elif kind == MSG_ERROR:
+            self._fail(key, _rebuild_error(*payload))
+
+    def _finish(self, job_id: int, ok: bool) -> Pending_job:
+        pending = self._pending.pop(job_id)
+        self._workers[pending.worker_index].pending -= 1
+        self.metrics.finish(pending.ticket, ok)
+        return pending
+
+    def _fail(self, job_id: int, exc: Exception) -> None:
+        pending = self._finish(job_id, ok=False)
+        if pending.future is not None:
+            if not pending.future.done():
+                pending.future.set_exception(exc)
+        elif not pending.abandoned:
+            pending.items.put_nowait(exc)
+
+    async def _watch_workers(self) -> None:
+        """Relanza los workers que murieron (p. ej. por falta de memoria) y falla sus scrapes en curso."""
+        while True:
+            await asyncio.sleep(STATS_INTERVAL_SECONDS)
+            for worker in list(self._workers):
+                if worker.process.is_alive() or not self._running:
+                    continue
+                logger.error(f"El worker {worker.index} terminó con código {worker.process.exitcode}; relanzándolo")
+                for job_id, pending in list(self._pending.items()):
+                    if pending.worker_index == worker.index:
+                        self._fail(job_id, Worker_error(f"El worker {worker.index} murió durante el scrape."))
+                worker.jobs.close()
+                # El hilo lector puede estar esperando en este pipe: se lo pasa para que lo cierre él
+                self._retired_results.put(worker.results)
+                replacement = self._spawn(worker.index)
+                replacement.restarts = worker.restarts + 1
+                self._workers[worker.index] = replacement
+
+    def _submit(self, kind: str, args: tuple, streaming: bool = False) -> Pending_job:
+        if not self._running:
+            raise Worker_error("El motor de workers no está iniciado.")
+        worker = min(self._workers, key=lambda candidate: candidate.pending)
+        job_id = next(self._job_ids)
+        pending = Pending_job(
+            ticket=self.metrics.enqueue("suggestions" if kind == "stream" else kind), worker_index=worker.index
+        )
+        if streaming:
+            pending.items = asyncio.Queue()
+        else:
+            pending.future = self._loop.create_future()
+        self._pending[job_id] = pending
+        worker.pending += 1
+        try:
+            worker.jobs.send((job_id, kind, args))
+        except OSError as e:
+            self._fail(job_id, Worker_error(f"No se pudo enviar el scrape al worker {worker.index}: {e}"))
+        return pending
+
+    async def fetch_card_price(self, query: Card_query) -> Card_price:
+        pending = self._submit("price", (query,))
+        return await pending.future
+
+    async def search(self, query_text: str, page: int = 1, page_size: int = 24) -> Search_results_response:
+        pending = self._submit("suggestions", (query_text, page, page_size))
+        return await pending.future
+
+    async def stream_search(
+        self, query_text: str, page: int = 1, page_size: int = 24
+    ) -> AsyncIterator[Search_suggestion | Search_results_response]:
+        pending = self._submit("stream", (query_text, page, page_size), streaming=True)
+        try:
+            while True:
+                item = await pending.items.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Si el cliente se va antes, el worker termina igual y el resto de los resultados se descarta
+            pending.abandoned = True
+
+    def stats(self) -> dict[str, Any]:
+        workers = []
+        fast_path_hits = fast_path_fallbacks = fast_path_throttled = None
+        launches = 0
+        for worker in self._workers:
+            engine_stats = worker.engine_stats
+            launches += pool_launches(engine_stats.get("pool") or {})
+            if "fast_path_hits" in engine_stats:
+                fast_path_hits = (fast_path_hits or 0) + engine_stats["fast_path_hits"]
+                fast_path_fallbacks = (fast_path_fallbacks or 0) + engine_stats["fast_path_fallbacks"]
+                fast_path_throttled = (fast_path_throttled or 0) + engine_stats.get("fast_path_throttled", 0)
+            workers.append(
+                {
+                    "index": worker.index,
+                    "pid": worker.process.pid,
+                    "alive": worker.process.is_alive(),
+                    "pending": worker.pending,
+                    "restarts": worker.restarts,
+                    "engine": {key: value for key, value in engine_stats.items() if key != "recent"},
+                }
+            )
+        stats = {
+            "mode": self.mode,
+            "concurrency": self.concurrency,
+            **self.metrics.stats(),
+            "pool": {"workers": self.worker_count, "launches": launches},
+            "workers": workers,
+        }
+        if fast_path_hits is not None:
+            stats["fast_path_hits"] = fast_path_hits
+            stats["fast_path_fallbacks"] = fast_path_fallbacks
+            stats["fast_path_throttled"] = fast_path_throttled
+        return stats
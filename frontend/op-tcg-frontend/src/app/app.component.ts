@@ -1,8 +1,9 @@
 import { ChangeDetectionStrategy, Component, inject, signal, computed } from '@angular/core';
+import { Subscription } from 'rxjs';
 import { RouterOutlet } from '@angular/router';
 import { FormBuilder, FormGroup, ReactiveFormsModule, Validators } from '@angular/forms';
 import { AsyncPipe, DecimalPipe, NgFor, NgIf } from '@angular/common';
-import { CardPriceService, Search_suggestion } from './card-price.service';
+import { CardPriceService, product_id_from, Search_facets, Search_filters, Search_suggestion } from './card-price.service';
 
 @Component({
     selector: 'app-root',
@@ -26,6 +27,12 @@ export class AppComponent {
     private form_builder = inject(FormBuilder);
     private card_price_service = inject(CardPriceService);
 
+    private search_subscription: Subscription | null = null;
+
+    // Comentario: carta elegida en los resultados; mientras el formulario conserve su nombre y set,
+    // el precio se pide por su ID de producto y número en lugar de buscar por texto.
+    private selected_card: Search_suggestion | null = null;
+
     search_results = signal<Search_suggestion[]>([]);
     search_response = signal<any>(null); // Search_results_response
     is_searching = signal(false);
@@ -38,58 +45,28 @@ export class AppComponent {
     filter_card_type = signal<string>('all');
     filter_color = signal<string>('all');
     
-    // Resultados filtrados computados
-    filtered_results = computed(() => {
-        let results = this.search_results();
-        
-        // Filtrar por rareza
-        if (this.filter_rarity() !== 'all') {
-            results = results.filter(r => r.rarity === this.filter_rarity());
-        }
-        
-        // Filtrar por set
-        if (this.filter_set() !== 'all') {
-            results = results.filter(r => r.set_name && r.set_name.startsWith(this.filter_set()));
-        }
-        
-        // Filtrar por card_type
-        if (this.filter_card_type() !== 'all') {
-            results = results.filter(r => r.card_type === this.filter_card_type());
-        }
-        
-        // Filtrar por color
-        if (this.filter_color() !== 'all') {
-            results = results.filter(r => r.color === this.filter_color());
-        }
-        
-        return results;
-    });
+    // Comentario: facetas calculadas por el backend sobre todas las cartas de la búsqueda (no solo
+    // sobre la página recibida). Solo llegan en las búsquedas filtradas; el streaming no las trae.
+    search_facets = signal<Search_facets | null>(null);
+
+    has_active_filters = computed(() =>
+        this.filter_rarity() !== 'all' ||
+        this.filter_set() !== 'all' ||
+        this.filter_card_type() !== 'all' ||
+        this.filter_color() !== 'all'
+    );
     
     // Obtener rarezas únicas para el filtro
-    unique_rarities = computed(() => {
-        const rarities = new Set(this.search_results().map(r => r.rarity).filter(r => r !== null));
-        return Array.from(rarities).sort();
-    });
+    unique_rarities = computed(() => this.facet_values('rarity', r => r.rarity));
     
-    // Obtener sets únicos para el filtro (formateados con código)
-    unique_sets = computed(() => {
-        const sets = new Set(this.search_results()
-            .filter(r => r.set_name !== null)
-            .map(r => this.format_set_name(r)));
-        return Array.from(sets).sort();
-    });
+    // Obtener sets únicos para el filtro
+    unique_sets = computed(() => this.facet_values('set_name', r => r.set_name));
     
-    // Obtener card_types únicos basados en los resultados disponibles para filtrar
-    unique_card_types = computed(() => {
-        const card_types = new Set(this.available_for_filtering().map(r => r.card_type).filter(ct => ct !== null && ct !== undefined && ct !== ''));
-        return Array.from(card_types).sort();
-    });
+    // Obtener card_types únicos para el filtro
+    unique_card_types = computed(() => this.facet_values('card_type', r => r.card_type));
     
-    // Obtener colores únicos basados en los resultados disponibles para filtrar
-    unique_colors = computed(() => {
-        const colors = new Set(this.available_for_filtering().map(r => r.color).filter(c => c !== null && c !== undefined && c !== ''));
-        return Array.from(colors).sort();
-    });
+    // Obtener colores únicos para el filtro
+    unique_colors = computed(() => this.facet_values('color', r => r.color));
 
     constructor() {
         this.card_form = this.form_builder.group({
@@ -103,7 +80,7 @@ export class AppComponent {
         });
     }
 
-    on_search(page: number = 1): void {
+    on_search(page: number = 1, reset_filters: boolean = page === 1): void {
         if (this.search_form.invalid) {
             this.search_form.markAllAsTouched();
             return;
@@ -116,19 +93,27 @@ export class AppComponent {
         
         this.is_searching.set(true);
         this.search_results.set([]);
+        this.search_response.set(null);
+        this.search_facets.set(null);
         this.current_page.set(page);
-        
-        this.card_price_service.get_suggestions(query, page, this.page_size()).subscribe({
-            next: (response) => {
-                this.search_response.set(response);
-                this.search_results.set(response.results);
-                this.is_searching.set(false);
-                // Resetear filtros solo si es la primera página
-                if (page === 1) {
-                    this.filter_rarity.set('all');
-                    this.filter_set.set('all');
-                    this.filter_card_type.set('all');
-                    this.filter_color.set('all');
+        // Resetear filtros solo en una búsqueda nueva
+        if (reset_filters) {
+            this.clear_filters();
+        }
+
+        // Comentario: usamos el endpoint en streaming para pintar cada carta apenas llega;
+        // una búsqueda nueva cancela la anterior.
+        this.search_subscription?.unsubscribe();
+        this.search_subscription = this.card_price_service.stream_suggestions(query, page, this.page_size()).subscribe({
+            next: (event) => {
+                if (event.type === 'result') {
+                    this.search_results.update(results => [...results, event.data]);
+                } else if (event.type === 'summary') {
+                    this.search_response.set({ ...event.data, results: this.search_results() });
+                    this.is_searching.set(false);
+                } else {
+                    this.is_searching.set(false);
+                    this.error_message.set('Error al buscar cartas. Intenta nuevamente.');
                 }
             },
             error: () => {
@@ -136,13 +121,20 @@ export class AppComponent {
                 this.search_response.set(null);
                 this.is_searching.set(false);
                 this.error_message.set('Error al buscar cartas. Intenta nuevamente.');
+            },
+            complete: () => {
+                this.is_searching.set(false);
             }
         });
     }
     
     go_to_page(page: number): void {
         if (page >= 1 && page <= (this.search_response()?.total_pages || 1)) {
-            this.on_search(page);
+            if (this.has_active_filters()) {
+                this.load_filtered_page(page);
+            } else {
+                this.on_search(page);
+            }
         }
     }
     
@@ -191,12 +183,17 @@ export class AppComponent {
     }
 
     select_card(card: Search_suggestion): void {
+        this.selected_card = card;
         this.card_form.patchValue({
             card_name: card.card_name,
             set_name: card.set_name || ''
         });
     }
 
+    image_src(card: Search_suggestion): string | null {
+        return this.card_price_service.proxied_image_url(card.image_url);
+    }
+
     on_image_error(event: Event): void {
         const img = event.target as HTMLImageElement;
         if (img) {
@@ -210,6 +207,14 @@ export class AppComponent {
         this.filter_card_type.set('all');
         this.filter_color.set('all');
     }
+
+    on_clear_filters(): void {
+        const was_filtered = this.has_active_filters();
+        this.clear_filters();
+        if (was_filtered) {
+            this.on_search(1, false);
+        }
+    }
     
     // Formatear el set con nombre y código (ej: "Romance Dawn-OP01")
     format_set_name(card: Search_suggestion): string {
@@ -229,28 +234,71 @@ export class AppComponent {
         return card.set_name;
     }
     
-    // Obtener resultados filtrados sin aplicar los filtros de color y card_type
-    // Esto permite que los dropdowns muestren todas las opciones disponibles
-    // basadas en los otros filtros aplicados
-    available_for_filtering = computed(() => {
-        let results = this.search_results();
-        
-        // Aplicar solo los filtros de rarity y set (sin color y card_type)
-        if (this.filter_rarity() !== 'all') {
-            results = results.filter(r => r.rarity === this.filter_rarity());
+    // Comentario: valores de un campo para su desplegable: los de las facetas del backend si las
+    // tenemos y, si no, los de la página recibida.
+    private facet_values(
+        field: 'rarity' | 'set_name' | 'card_type' | 'color',
+        value_of: (card: Search_suggestion) => string | null
+    ): string[] {
+        const facets = this.search_facets();
+        if (facets) {
+            return facets[field].map(facet => facet.value);
         }
-        
-        if (this.filter_set() !== 'all') {
-            results = results.filter(r => {
-                if (!r.set_name) return false;
-                const formatted = this.format_set_name(r);
-                return formatted === this.filter_set() || formatted.startsWith(this.filter_set());
+        const values = new Set(this.search_results().map(value_of).filter((v): v is string => !!v));
+        return Array.from(values).sort();
+    }
+
+    private current_filters(): Search_filters {
+        const selected = (value: string) => (value === 'all' ? [] : [value]);
+        return {
+            rarity: selected(this.filter_rarity()),
+            set_name: selected(this.filter_set()),
+            card_type: selected(this.filter_card_type()),
+            color: selected(this.filter_color())
+        };
+    }
+
+    on_filter_change(): void {
+        // Comentario: los filtros se aplican en el backend; cualquier cambio vuelve a la primera página.
+        if (this.has_active_filters()) {
+            this.load_filtered_page(1);
+        } else {
+            this.on_search(1, false);
+        }
+    }
+
+    private load_filtered_page(page: number): void {
+        const query = this.search_form.get('search_query')?.value?.trim();
+        if (!query || query.length < 2) {
+            return;
+        }
+
+        this.is_searching.set(true);
+        this.current_page.set(page);
+        this.search_subscription?.unsubscribe();
+        this.search_subscription = this.card_price_service
+            .get_suggestions(query, page, this.page_size(), this.current_filters())
+            .subscribe({
+                next: (response) => {
+                    this.search_results.set(response.results);
+                    this.search_response.set(response);
+                    this.search_facets.set(response.facets ?? null);
+                    this.is_searching.set(false);
+                },
+                error: () => {
+                    this.is_searching.set(false);
+                    this.error_message.set('Error al buscar cartas. Intenta nuevamente.');
+                }
             });
+    }
+
+    private selected_card_matching(card_name: string, set_name: string): Search_suggestion | null {
+        const card = this.selected_card;
+        if (!card || card.card_name !== card_name || (card.set_name || '') !== set_name) {
+            return null;
         }
-        
-        return results;
-    });
-    
+        return card;
+    }
 
     get is_submit_disabled(): boolean {
         // Comentario: centralizamos la lógica de deshabilitar el botón para mantener el template sencillo.
@@ -269,12 +317,15 @@ export class AppComponent {
         this.market_price.set(null);
 
         const form_value = this.card_form.value;
+        const card = this.selected_card_matching(form_value.card_name, form_value.set_name);
 
         this.card_price_service
             .get_market_price({
                 card_name: form_value.card_name,
                 set_name: form_value.set_name,
-                is_foil: !!form_value.is_foil
+                is_foil: !!form_value.is_foil,
+                card_number: card?.card_number ?? undefined,
+                product_id: card ? product_id_from(card.product_url) : undefined
             })
             .subscribe({
                 next: (response) => {
@@ -6,6 +6,10 @@ export interface Card_price_request {
     card_name: string;
     set_name?: string;
     is_foil: boolean;
+    // Comentario: carta exacta; si vienen, el backend consulta ese producto y no el primer resultado.
+    card_number?: string;
+    variant?: string;
+    product_id?: number;
 }
 
 export interface Search_suggestion {
@@ -22,6 +26,30 @@ export interface Search_suggestion {
     color: string | null;
 }
 
+// Comentario: filtros que aplica el backend sobre todas las cartas conocidas de la búsqueda.
+export interface Search_filters {
+    rarity?: string[];
+    set_name?: string[];
+    card_type?: string[];
+    color?: string[];
+    min_price?: number | null;
+    max_price?: number | null;
+}
+
+export interface Facet_count {
+    value: string;
+    count: number;
+}
+
+export interface Search_facets {
+    rarity: Facet_count[];
+    set_name: Facet_count[];
+    card_type: Facet_count[];
+    color: Facet_count[];
+    min_price: number | null;
+    max_price: number | null;
+}
+
 export interface Search_results_response {
     results: Search_suggestion[];
     total_results: number;
@@ -30,8 +58,17 @@ export interface Search_results_response {
     total_pages: number;
     has_next_page: boolean;
     has_previous_page: boolean;
+    facets?: Search_facets | null;
 }
 
+// Comentario: paginación que llega como último evento del streaming, sin repetir los resultados.
+export type Search_stream_summary = Omit<Search_results_response, 'results' | 'facets'>;
+
+export type Search_stream_event =
+    | { type: 'result'; data: Search_suggestion }
+    | { type: 'summary'; data: Search_stream_summary }
+    | { type: 'error'; data: { detail: string } };
+
 export interface Card_price_response {
     card_name: string;
     set_name: string;
@@ -39,6 +76,13 @@ export interface Card_price_response {
     market_price: number;
     currency: string;
     source_url: string;
+    product_id?: number | null;
+}
+
+// Comentario: ID de producto de TCGplayer a partir de la URL de un resultado ('/product/594325/...').
+export function product_id_from(product_url: string | null): number | undefined {
+    const match = product_url?.match(/\/product\/(\d+)/);
+    return match ? Number(match[1]) : undefined;
 }
 
 @Injectable({
@@ -52,14 +96,38 @@ export class CardPriceService {
 
     get_market_price(request: Card_price_request): Observable<Card_price_response> {
         // Comentario: esta llamada HTTP encapsula el contrato entre el frontend y el backend para consultas de precio.
-        return this.http_client.post<Card_price_response>(
-            `${this.api_base_url}/api/price`,
-            request
-        );
+        // Usamos GET para que el navegador cachee la respuesta según su Cache-Control y la revalide con ETag.
+        const params: Record<string, string> = {
+            card_name: request.card_name,
+            set_name: request.set_name ?? '',
+            is_foil: String(request.is_foil)
+        };
+        if (request.card_number) {
+            params['card_number'] = request.card_number;
+        }
+        if (request.variant) {
+            params['variant'] = request.variant;
+        }
+        if (request.product_id != null) {
+            params['product_id'] = request.product_id.toString();
+        }
+        return this.http_client.get<Card_price_response>(`${this.api_base_url}/api/price`, { params });
+    }
+
+    proxied_image_url(image_url: string | null): string | null {
+        // Comentario: las miniaturas del CDN de TCGplayer se piden al proxy del backend, que las guarda en disco.
+        const match = image_url?.match(/\/product\/(\d+)_/);
+        return match ? `${this.api_base_url}/api/images/${match[1]}` : image_url;
     }
 
-    get_suggestions(query: string, page: number = 1, page_size: number = 24): Observable<Search_results_response> {
-        // Comentario: obtiene resultados de búsqueda desde TCGplayer con paginación.
+    get_suggestions(
+        query: string,
+        page: number = 1,
+        page_size: number = 24,
+        filters: Search_filters = {}
+    ): Observable<Search_results_response> {
+        // Comentario: obtiene resultados de búsqueda con paginación; los filtros y las facetas
+        // se calculan en el backend, así cada página filtrada llega completa.
         if (!query || query.length < 2) {
             return new Observable(observer => {
                 observer.next({
@@ -74,10 +142,71 @@ export class CardPriceService {
                 observer.complete();
             });
         }
-        return this.http_client.get<Search_results_response>(
-            `${this.api_base_url}/api/suggestions`,
-            { params: { q: query, page: page.toString(), page_size: page_size.toString() } }
-        );
+        const params: Record<string, string | string[]> = {
+            q: query,
+            page: page.toString(),
+            page_size: page_size.toString()
+        };
+        for (const field of ['rarity', 'set_name', 'card_type', 'color'] as const) {
+            const values = filters[field];
+            if (values && values.length > 0) {
+                params[field] = values;
+            }
+        }
+        if (filters.min_price != null) {
+            params['min_price'] = filters.min_price.toString();
+        }
+        if (filters.max_price != null) {
+            params['max_price'] = filters.max_price.toString();
+        }
+        return this.http_client.get<Search_results_response>(`${this.api_base_url}/api/suggestions`, { params });
+    }
+
+    stream_suggestions(query: string, page: number = 1, page_size: number = 24): Observable<Search_stream_event> {
+        // Comentario: consume /api/suggestions/stream (NDJSON) con fetch para emitir cada resultado apenas
+        // llega, en lugar de esperar a que el backend termine de procesar toda la página.
+        return new Observable<Search_stream_event>(observer => {
+            const abort_controller = new AbortController();
+            const params = new URLSearchParams({ q: query, page: page.toString(), page_size: page_size.toString() });
+
+            fetch(`${this.api_base_url}/api/suggestions/stream?${params}`, { signal: abort_controller.signal })
+                .then(async response => {
+                    if (!response.ok || !response.body) {
+                        throw new Error(`HTTP ${response.status}`);
+                    }
+                    const reader = response.body.getReader();
+                    const decoder = new TextDecoder();
+                    let buffer = '';
+
+                    while (true) {
+                        const { done, value } = await reader.read();
+                        if (done) {
+                            break;
+                        }
+                        buffer += decoder.decode(value, { stream: true });
+                        const lines = buffer.split('\n');
+                        // La última línea puede estar incompleta: la guardamos para el siguiente bloque
+                        buffer = lines.pop() ?? '';
+                        for (const line of lines) {
+                            if (line.trim()) {
+                                observer.next(JSON.parse(line) as Search_stream_event);
+                            }
+                        }
+                    }
+                    if (buffer.trim()) {
+                        observer.next(JSON.parse(buffer) as Search_stream_event);
+                    }
+                    observer.complete();
+                })
+                .catch(error => {
+                    if (!abort_controller.signal.aborted) {
+                        observer.error(error);
+                    }
+                });
+
+            // Cancelar la suscripción (p. ej. una nueva búsqueda) corta la descarga en curso
+            return () => abort_controller.abort();
+        });
     }
 }
 